@@ -0,0 +1,88 @@
+"""
+API latency and throughput benchmarks.
+
+Not collected by a plain `pytest` run; run them explicitly:
+
+    pytest benchmarks/api_benchmarks.py --benchmark-size 1k
+    pytest benchmarks/api_benchmarks.py --benchmark-size 100k --benchmark-save
+"""
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from benchmarks.datasets import PASSWORD
+
+pytestmark = pytest.mark.django_db
+
+READ_ITERATIONS = 100
+LOGIN_ITERATIONS = 20
+
+TRUCK_LIST_QUERIES = {
+    'truck-list': {},
+    'truck-list:year': {'year': 2020},
+    'truck-list:model': {'model': 'Scania R450'},
+    'truck-list:user': None,  # Filled with a seeded owner
+    'truck-list:search': {'search': 'BCA'},
+    'truck-list:ordering-year': {'ordering': '-year'},
+    'truck-list:ordering-owner': {'ordering': 'user__first_name'},
+}
+
+
+@pytest.fixture
+def client(fleet):
+    client = APIClient()
+    refresh = RefreshToken.for_user(fleet['admin'])
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+    return client
+
+
+def get_ok(client, url, params=None):
+    def request():
+        response = client.get(url, params)
+        assert response.status_code == 200, response.content
+    return request
+
+
+@pytest.mark.parametrize('name', TRUCK_LIST_QUERIES)
+def test_truck_list(benchmark, client, fleet, name):
+    params = TRUCK_LIST_QUERIES[name]
+    if params is None:
+        params = {'user': fleet['user_ids'][len(fleet['user_ids']) // 2]}
+    benchmark(name, get_ok(client, reverse('truck-list'), params), READ_ITERATIONS)
+
+
+def test_by_user(benchmark, client, fleet):
+    params = {'user_id': fleet['user_ids'][len(fleet['user_ids']) // 2]}
+    benchmark('truck-by-user', get_ok(client, reverse('truck-by-user'), params), READ_ITERATIONS)
+
+
+def test_by_year(benchmark, client):
+    benchmark('truck-by-year', get_ok(client, reverse('truck-by-year'), {'year': 2015}), READ_ITERATIONS)
+
+
+def test_users_me(benchmark, client):
+    benchmark('user-me', get_ok(client, reverse('user-me')), READ_ITERATIONS)
+
+
+def test_login(benchmark, fleet):
+    client = APIClient()
+    credentials = {'username': fleet['member'].username, 'password': PASSWORD}
+
+    def login():
+        response = client.post(reverse('token_obtain_pair'), credentials, format='json')
+        assert response.status_code == 200, response.content
+
+    benchmark('login', login, LOGIN_ITERATIONS)
+
+
+def test_refresh(benchmark, fleet):
+    client = APIClient()
+    token = {'refresh': str(RefreshToken.for_user(fleet['admin']))}
+
+    def refresh():
+        # Rotation blacklists the used token, so chain the returned one
+        response = client.post(reverse('token_refresh'), token, format='json')
+        assert response.status_code == 200, response.content
+        token['refresh'] = response.data['refresh']
+
+    benchmark('token-refresh', refresh, READ_ITERATIONS)
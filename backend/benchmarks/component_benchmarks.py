@@ -0,0 +1,186 @@
+"""
+Benchmarks of single components, outside of a full request: JSON
+rendering, the truck list serializer, signups, blacklist lookups after
+pruning and the change feed fan-out. Each one checks its speedup or
+growth against a floor, and the usual baselines. Run explicitly:
+
+    pytest benchmarks/component_benchmarks.py --benchmark-size 1k -s
+"""
+import asyncio
+import io
+import itertools
+import time
+import tracemalloc
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from fleetsecure.asgi import application
+from fleetsecure.events import broker
+from fleetsecure.renderers import ORJSONRenderer
+from trucks.models import Truck
+from trucks.serializers import TruckListSerializer, TruckSerializer
+from users.models import User
+from users.serializers import UserCreateSerializer
+
+RENDERED_TRUCKS = 10_000
+SERIALIZED_TRUCKS = 300
+SIGNUPS = 20
+BLACKLIST_HISTORIES = (1_000, 10_000, 30_000)
+BLACKLIST_LOOKUPS = 100
+IDLE_STREAMS = 2_000
+
+# Floors of the optimizations these components exist for
+ORJSON_SPEEDUP = 1.5
+TRUCK_LIST_SPEEDUP = 5
+BLACKLIST_GROWTH = 3
+STREAM_MEMORY_KIB = 64
+
+
+def test_render_trucks(benchmark):
+    owner = {
+        'id': 1, 'username': 'driver', 'email': 'driver@example.com', 'first_name': 'João',
+        'last_name': 'Silva', 'full_name': 'João Silva', 'cpf': '123.456.789-00',
+        'phone_number': '11999990000', 'date_of_birth': date(1985, 3, 9),
+        'profile_picture': None, 'is_active': True, 'is_admin': False, 'is_driver': True,
+        'license_number': 'DRV-001',
+    }
+    payload = {
+        'next': None,
+        'previous': None,
+        'results': [
+            {'id': i, 'plate_number': f'ABC-{i:04d}', 'model': 'Volvo FH16', 'year': 2020, 'user_details': owner}
+            for i in range(RENDERED_TRUCKS)
+        ],
+    }
+
+    drf = benchmark('render:json', lambda: JSONRenderer().render(payload), 10, warmup=1)
+    fast = benchmark('render:orjson', lambda: ORJSONRenderer().render(payload), 10, warmup=1)
+    assert drf['p50'] / fast['p50'] > ORJSON_SPEEDUP
+
+
+@pytest.mark.django_db
+def test_truck_list_serializer(benchmark, fleet):
+    context = {'request': Request(APIRequestFactory().get('/api/v1/trucks/'))}
+    trucks = list(Truck.objects.select_related('user').order_by('id')[:SERIALIZED_TRUCKS])
+    rows = list(Truck.objects.order_by('id').values(*TruckListSerializer.values_fields)[:SERIALIZED_TRUCKS])
+
+    model_serializer = benchmark(
+        'serialize:TruckSerializer', lambda: TruckSerializer(trucks, many=True, context=context).data, 10,
+    )
+    fast_serializer = benchmark(
+        'serialize:TruckListSerializer', lambda: TruckListSerializer(rows, many=True, context=context).data, 10,
+    )
+    assert model_serializer['p50'] / fast_serializer['p50'] >= TRUCK_LIST_SPEEDUP
+
+
+@pytest.mark.django_db
+def test_signup(benchmark):
+    numbers = itertools.count()
+
+    def signup():
+        username = f'bench-signup{next(numbers)}'
+        serializer = UserCreateSerializer(data={
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': 'S3cure-pass!',
+            'password_confirm': 'S3cure-pass!',
+            'first_name': 'New',
+            'last_name': 'User',
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    # Hashing is CPU bound: the rate is what each core adds
+    benchmark(f'signup:{settings.PASSWORD_HASHERS[0].rsplit(".", 1)[-1]}', signup, SIGNUPS, warmup=1)
+
+
+def test_blacklist_lookup_after_pruning(benchmark, django_db_setup, django_db_blocker):
+    # VACUUM cannot run in the transaction of a django_db test: commit, then clean up
+    with django_db_blocker.unblock():
+        user = User.objects.create_user(username='bench-blacklist', email='bench-blacklist@example.com')
+        refresh = RefreshToken.for_user(user)
+        try:
+            results = []
+            for history in BLACKLIST_HISTORIES:
+                expires_at = timezone.now() - timedelta(days=1)
+                tokens = OutstandingToken.objects.bulk_create([
+                    OutstandingToken(user=user, jti=uuid.uuid4().hex, token='', expires_at=expires_at)
+                    for _ in range(history)
+                ])
+                BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[::2]])
+                call_command('prune_tokens', vacuum=True, stdout=io.StringIO())
+                results.append(benchmark(
+                    f'blacklist-lookup:{history}', refresh.check_blacklist, BLACKLIST_LOOKUPS,
+                ))
+        finally:
+            user.delete()
+
+    assert results[-1]['p50'] < results[0]['p50'] * BLACKLIST_GROWTH
+
+
+class Stream:
+    """One event stream request driven through the ASGI app, as a server would"""
+
+    def __init__(self, token):
+        self.scope = {
+            'type': 'http', 'method': 'GET', 'path': settings.EVENTS_PATH,
+            'query_string': f'token={token}'.encode(), 'headers': [],
+        }
+        self.received = asyncio.Queue()
+        self.bodies = asyncio.Queue()
+        self.task = asyncio.ensure_future(application(self.scope, self.received.get, self.send))
+
+    async def send(self, message):
+        if message['type'] == 'http.response.body' and not message['body'].startswith(b': keepalive'):
+            await self.bodies.put(message['body'])
+
+
+@pytest.mark.django_db
+def test_event_fan_out(benchmark, fleet):
+    token = str(AccessToken.for_user(fleet['admin']))
+
+    async def scenario():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        streams = [Stream(token) for _ in range(IDLE_STREAMS)]
+        for stream in streams:
+            await asyncio.wait_for(stream.bodies.get(), 30)  # ': connected'
+        per_stream = (tracemalloc.get_traced_memory()[0] - before) / IDLE_STREAMS
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        broker.dispatch({'type': 'truck.created', 'ids': [1]})
+        timings = []
+        for stream in streams:
+            assert b'truck.created' in await asyncio.wait_for(stream.bodies.get(), 10)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        for stream in streams:
+            await stream.received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(asyncio.gather(*(stream.task for stream in streams)), 10)
+        await broker.close()
+        return per_stream, timings
+
+    with override_settings(EVENTS_HEARTBEAT=60):
+        per_stream, timings = async_to_sync(scenario)()
+
+    timings.sort()
+    benchmark.record('events:fan-out', {
+        'rps': round(IDLE_STREAMS / timings[-1] * 1000, 1),
+        'p50': round(timings[len(timings) // 2], 3),
+        'p95': round(timings[len(timings) * 95 // 100], 3),
+        'p99': round(timings[len(timings) * 99 // 100], 3),
+        'kib_per_stream': round(per_stream / 1024, 1),
+    })
+    assert per_stream < STREAM_MEMORY_KIB * 1024
@@ -0,0 +1,110 @@
+import json
+import statistics
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+BASELINES_PATH = Path(__file__).with_name('baselines.json')
+
+
+class Benchmark:
+    """Times callables and checks the results against the stored baselines"""
+
+    def __init__(self, size, threshold, save):
+        self.size = size
+        self.threshold = threshold
+        self.save = save
+        self.results = {}
+        baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+        self.baselines = baselines.get(size, {})
+
+    def __call__(self, name, func, iterations, warmup=5, rounds=3):
+        """
+        Call `func` `iterations` times per round and record throughput and p50/p95/p99 (ms).
+
+        The best round is kept, as with timeit: slower rounds measure noise
+        from the rest of the machine, not the code.
+        """
+        for _ in range(warmup):
+            func()
+
+        result = None
+        for _ in range(rounds):
+            timings = []
+            start = time.perf_counter()
+            for _ in range(iterations):
+                call_start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - call_start) * 1000)
+            elapsed = time.perf_counter() - start
+
+            percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+            measured = {
+                'rps': round(iterations / elapsed, 1),
+                'p50': round(percentiles[49], 3),
+                'p95': round(percentiles[94], 3),
+                'p99': round(percentiles[98], 3),
+            }
+            if result is None or measured['p50'] < result['p50']:
+                result = measured
+        return self.record(name, result)
+
+    def record(self, name, result):
+        """Store a result measured elsewhere and check it against its baseline"""
+        self.results[name] = result
+        extra = ''.join(f', {key} {value}' for key, value in result.items() if key not in ('rps', 'p50', 'p95', 'p99'))
+        print(f"\n{name} [{self.size}]: {result['rps']} req/s, p50 {result['p50']} ms, "
+              f"p95 {result['p95']} ms, p99 {result['p99']} ms{extra}")
+
+        baseline = self.baselines.get(name)
+        if baseline and not self.save:
+            for metric in ('p50', 'p95'):
+                limit = baseline[metric] * (1 + self.threshold)
+                assert result[metric] <= limit, (
+                    f'{name} {metric} regressed: {result[metric]} ms > {limit:.3f} ms '
+                    f'(baseline {baseline[metric]} ms + {self.threshold:.0%})'
+                )
+        return result
+
+    def write_baselines(self):
+        baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+        baselines.setdefault(self.size, {}).update(self.results)
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+
+
+@pytest.fixture(scope='session')
+def benchmark(request):
+    bench = Benchmark(
+        size=request.config.getoption('--benchmark-size'),
+        threshold=request.config.getoption('--benchmark-threshold'),
+        save=request.config.getoption('--benchmark-save'),
+    )
+    yield bench
+    if bench.save and bench.results:
+        bench.write_baselines()
+
+
+@pytest.fixture(scope='session')
+def fleet(django_db_setup, django_db_blocker, request):
+    """Seed the test database once per session; the data is committed"""
+    from benchmarks.datasets import seed
+    from users.models import User
+
+    with django_db_blocker.unblock():
+        user_ids = seed(request.config.getoption('--benchmark-size'))
+        admin = User.objects.create_user(username='bench-admin', email='bench-admin@example.com', is_admin=True)
+        member = User.objects.filter(id__in=user_ids[:100], is_active=True).order_by('id').first()
+    return {'user_ids': user_ids, 'admin': admin, 'member': member}
+
+
+@pytest.fixture(autouse=True)
+def uncached_and_unthrottled():
+    """Measure the full request path: no response cache hits, no rate limits"""
+    def fresh_versions(namespaces):
+        return [time.time_ns()] * len(namespaces), time.time()
+
+    with mock.patch('utils.cache.get_versions', side_effect=fresh_versions), \
+            mock.patch('fleetsecure.throttling.GCRAThrottle.allow_request', return_value=True):
+        yield
@@ -0,0 +1,23 @@
+"""
+Seeded datasets for the API benchmarks
+"""
+from trucks.seeding import seed_fleet
+
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1M': 1_000_000,
+}
+
+SEED = 20240101
+PASSWORD = 'bench-pass-123'
+
+
+def seed(size):
+    """
+    Insert `size` users and `size` trucks, the same ones on every run.
+
+    Returns the ids of the users.
+    """
+    count = SIZES[size]
+    return seed_fleet(count, count, seed=SEED, password=PASSWORD, prefix='bench')
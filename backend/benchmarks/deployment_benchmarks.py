@@ -0,0 +1,127 @@
+"""
+Sync (WSGI) against async (ASGI) deployment benchmark, both with gunicorn.conf.py.
+
+Both deployments run DEPLOYMENT_WORKERS processes, so they use about the
+same memory, and get the same concurrent load of truck detail, by_user
+and users/me reads. A proxy in front of Postgres adds DB_LATENCY_MS to
+every round trip, as with a database in another region: a sync worker
+sits idle through it, while an ASGI worker serves other requests.
+
+Each deployment is also measured serving users/me while clients flood it
+with logins, hashing limited to one CPU less than the machine has: the
+limit and the waiting cap keep the storm from taking the request threads
+and cores the cheap reads need. Run explicitly:
+
+    pytest benchmarks/deployment_benchmarks.py --benchmark-size 1k -s
+"""
+import http.client
+import json
+import threading
+from collections import Counter
+
+import pytest
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+from benchmarks.datasets import PASSWORD
+from benchmarks.servers import free_port, latency_proxy, read_paths, rss_mb, run_load, running_server
+from fleetsecure.server import cpu_count
+
+pytestmark = pytest.mark.django_db
+
+DEPLOYMENT_WORKERS = 2
+CONCURRENCY = 32
+REQUESTS = 2000
+DB_LATENCY_MS = 20
+
+# Clients sending logins nonstop, users/me reads measured meanwhile, and the
+# most the storm may add to their p50
+STORM_CLIENTS = 32
+STORM_READS = 500
+STORM_SLOWDOWN_MS = 50
+STORM_THREADS = 8
+
+# Worker classes that serve requests concurrently: a sync worker is taken
+# by any one request, login or not
+STORM_DEPLOYMENTS = {
+    'gthread': 'gthread',
+    'asgi': 'uvicorn',
+}
+
+# Worker classes of gunicorn.conf.py
+DEPLOYMENTS = {
+    'wsgi': 'sync',
+    'asgi': 'uvicorn',
+}
+
+
+@pytest.fixture(scope='module')
+def paths(fleet, django_db_blocker):
+    with django_db_blocker.unblock():
+        return read_paths(fleet, REQUESTS)
+
+
+@pytest.mark.parametrize('name', DEPLOYMENTS)
+def test_deployment(benchmark, fleet, paths, name):
+    token = AccessToken.for_user(fleet['admin'])
+    database = connection.settings_dict
+    port = free_port()
+    with latency_proxy(database['HOST'], int(database['PORT']), DB_LATENCY_MS / 1000) as db_port, \
+            running_server(['gunicorn'], port, db_port=db_port,
+                           GUNICORN_WORKER_CLASS=DEPLOYMENTS[name], GUNICORN_WORKERS=str(DEPLOYMENT_WORKERS),
+                           GUNICORN_BIND=f'127.0.0.1:{port}',
+                           # One connection per request in flight, for both deployments
+                           DB_POOL_MAX_SIZE=str(CONCURRENCY), ASGI_THREADS=str(CONCURRENCY)) as process:
+        result = run_load(port, paths, token, CONCURRENCY)
+        result['rss_mb'] = rss_mb(process)
+    benchmark.record(f'deployment:{name}', result)
+
+
+def storm_logins(port, username, stop, statuses):
+    """Send logins on one keep-alive connection until `stop` is set, counting the statuses"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = json.dumps({'username': username, 'password': PASSWORD})
+    headers = {'Content-Type': 'application/json', 'X-Forwarded-Proto': 'https'}
+    while not stop.is_set():
+        connection.request('POST', '/api/token/', body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        statuses[response.status] += 1
+        if response.status == 503:
+            # As a well-behaved client would
+            stop.wait(float(response.getheader('Retry-After')))
+    connection.close()
+
+
+@pytest.mark.parametrize('name', STORM_DEPLOYMENTS)
+def test_reads_during_login_storm(benchmark, fleet, name):
+    if cpu_count() < 2:
+        pytest.skip('Needs a CPU left free of password hashing')
+    token = AccessToken.for_user(fleet['admin'])
+    paths = ['/api/v1/users/me/'] * STORM_READS
+    port = free_port()
+    with running_server(['gunicorn'], port,
+                        GUNICORN_WORKER_CLASS=STORM_DEPLOYMENTS[name], GUNICORN_WORKERS=str(DEPLOYMENT_WORKERS),
+                        GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_THREADS=str(STORM_THREADS),
+                        ASGI_THREADS=str(STORM_THREADS), THROTTLE_RATE_LOGIN='1000000/second',
+                        PASSWORD_HASHING_CONCURRENCY=str(cpu_count() - 1)):
+        idle = run_load(port, paths, token, 4)
+
+        stop, statuses = threading.Event(), Counter()
+        clients = [
+            threading.Thread(target=storm_logins, args=(port, fleet['member'].username, stop, statuses))
+            for _ in range(STORM_CLIENTS)
+        ]
+        for client in clients:
+            client.start()
+        try:
+            during_storm = run_load(port, paths, token, 4)
+        finally:
+            stop.set()
+            for client in clients:
+                client.join()
+
+    benchmark.record(f'user-me:{name}:idle', idle)
+    benchmark.record(f'user-me:{name}:login-storm', during_storm)
+    # Logins went through, and the excess was turned away rather than queued
+    assert statuses[200] > 0 and set(statuses) <= {200, 503}, statuses
+    assert during_storm['p50'] < idle['p50'] + STORM_SLOWDOWN_MS
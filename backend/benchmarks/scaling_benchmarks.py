@@ -0,0 +1,59 @@
+"""
+Throughput of the production server (gunicorn.conf.py) as workers are added.
+
+Each worker class serves the same read mix with 1, 2, ... workers up to
+the CPU count, and the rate with one worker per CPU must reach
+SCALING_EFFICIENCY of linear scaling. The load generator runs on the
+same machine and takes CPU from the server: run it elsewhere, or read
+the gate as a floor. Run explicitly:
+
+    pytest benchmarks/scaling_benchmarks.py --benchmark-size 1k -s
+"""
+import pytest
+from rest_framework_simplejwt.tokens import AccessToken
+from benchmarks.servers import free_port, read_paths, run_load, running_server
+from fleetsecure.server import cpu_count
+
+pytestmark = pytest.mark.django_db
+
+CONCURRENCY = 64
+REQUESTS = 4000
+SCALING_EFFICIENCY = 0.5
+
+WORKER_CLASSES = ('uvicorn', 'sync')
+
+CPUS = cpu_count()
+WORKER_COUNTS = sorted({1, *(n for n in (2, 4, 8, 16) if n < CPUS), CPUS})
+
+throughput = {}
+
+
+@pytest.fixture(scope='module')
+def paths(fleet, django_db_blocker):
+    with django_db_blocker.unblock():
+        return read_paths(fleet, REQUESTS)
+
+
+@pytest.mark.parametrize('workers', WORKER_COUNTS)
+@pytest.mark.parametrize('worker_class', WORKER_CLASSES)
+def test_workers(benchmark, fleet, paths, worker_class, workers):
+    token = AccessToken.for_user(fleet['admin'])
+    port = free_port()
+    with running_server(['gunicorn'], port,
+                        GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(workers),
+                        GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_MAX_REQUESTS='0'):
+        result = run_load(port, paths, token, CONCURRENCY, processes=CPUS)
+    throughput[worker_class, workers] = result['rps']
+    benchmark.record(f'gunicorn:{worker_class}:{workers}', result)
+
+
+@pytest.mark.skipif(CPUS == 1, reason='Scaling needs more than one CPU')
+@pytest.mark.parametrize('worker_class', WORKER_CLASSES)
+def test_scaling(worker_class):
+    single, full = throughput.get((worker_class, 1)), throughput.get((worker_class, CPUS))
+    if single is None or full is None:
+        pytest.skip('Run with test_workers')
+    assert full >= single * CPUS * SCALING_EFFICIENCY, (
+        f'{worker_class}: {full} req/s with {CPUS} workers, {single} req/s with 1 '
+        f'(below {SCALING_EFFICIENCY:.0%} of linear scaling)'
+    )
@@ -0,0 +1,188 @@
+"""
+Real servers for the load benchmarks: start one against the seeded test
+database, send it concurrent keep-alive requests and measure it.
+"""
+import asyncio
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from pathlib import Path
+
+import psutil
+from django.db import connection
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STARTUP_TIMEOUT = 30
+
+# Every read goes to the database and none is rate limited
+SERVER_ENV = {
+    'DEBUG': 'False',
+    'API_CACHE_TIMEOUT': '0',
+    'THROTTLE_RATE_READS': '1000000/second',
+    'REQUEST_METRICS_SAMPLE_RATE': '0',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def latency_proxy(host, port, latency):
+    """Forward a local port to `host:port`, delaying every response chunk by `latency` seconds"""
+    loop = asyncio.new_event_loop()
+    listen_port = free_port()
+
+    async def pipe(reader, writer, delay):
+        try:
+            while data := await reader.read(65536):
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(
+            pipe(client_reader, server_writer, 0),
+            pipe(server_reader, client_writer, latency),
+        )
+
+    server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', listen_port))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield listen_port
+    finally:
+        loop.call_soon_threadsafe(server.close)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+@contextmanager
+def running_server(command, port, db_port=None, **env):
+    """Run `command` against the seeded test database until it accepts connections on `port`"""
+    settings = connection.settings_dict
+    env = {
+        **os.environ,
+        **SERVER_ENV,
+        'DB_NAME': settings['NAME'],
+        'DB_HOST': '127.0.0.1' if db_port else settings['HOST'],
+        'DB_PORT': str(db_port or settings['PORT']),
+        **env,
+    }
+    # A file rather than a pipe: a server logging errors must not block on a full pipe
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            assert process.poll() is None, f'{command[0]} exited'
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                assert time.monotonic() < deadline, f'{command[0]} did not start'
+                time.sleep(0.2)
+        yield process
+    except BaseException:
+        log.seek(0)
+        print(log.read().decode(errors='replace')[-5000:])
+        raise
+    finally:
+        process.terminate()
+        process.wait(timeout=STARTUP_TIMEOUT)
+        log.close()
+
+
+def rss_mb(process):
+    """Resident memory of a server and its workers"""
+    parent = psutil.Process(process.pid)
+    processes = [parent, *parent.children(recursive=True)]
+    return round(sum(p.memory_info().rss for p in processes) / 2 ** 20, 1)
+
+
+def _send(port, paths, token, concurrency):
+    """Send `paths` with `concurrency` keep-alive clients; return the timings (ms) and the wall clock span"""
+    local = threading.local()
+    # As sent by the TLS-terminating proxy, or DEBUG=False redirects to https
+    headers = {'Authorization': f'Bearer {token}', 'X-Forwarded-Proto': 'https'}
+
+    def get(path):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        start = time.perf_counter()
+        local.connection.request('GET', path, headers=headers)
+        response = local.connection.getresponse()
+        response.read()
+        assert response.status == 200, (path, response.status)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        # Warm up every worker's connections and caches
+        list(executor.map(get, paths[:concurrency * 4]))
+        start = time.time()
+        timings = list(executor.map(get, paths))
+        end = time.time()
+    return timings, start, end
+
+
+def run_load(port, paths, token, concurrency, processes=1):
+    """
+    Send `paths` with `concurrency` clients spread over `processes` load
+    generator processes; return req/s and p50/p95/p99 (ms).
+
+    A single process is enough for slow responses. Throughput tests need
+    several, or the client's GIL caps the rate before the server does.
+    """
+    if processes == 1:
+        timings, start, end = _send(port, paths, token, concurrency)
+    else:
+        chunks = [paths[i::processes] for i in range(processes)]
+        with ProcessPoolExecutor(processes, mp_context=get_context('spawn')) as executor:
+            results = list(executor.map(
+                _send, [port] * processes, chunks, [str(token)] * processes, [concurrency // processes] * processes,
+            ))
+        timings = [timing for result in results for timing in result[0]]
+        start = min(result[1] for result in results)
+        end = max(result[2] for result in results)
+
+    percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'rps': round(len(timings) / (end - start), 1),
+        'p50': round(percentiles[49], 3),
+        'p95': round(percentiles[94], 3),
+        'p99': round(percentiles[98], 3),
+    }
+
+
+def read_paths(fleet, count):
+    """`count` requests mixing truck detail, by_user and users/me reads over the seeded fleet"""
+    from trucks.models import Truck
+
+    truck_ids = list(Truck.objects.order_by('id').values_list('id', flat=True)[:count])
+    user_ids = fleet['user_ids']
+    paths = []
+    for i in range(count):
+        if i % 3 == 0:
+            paths.append(f'/api/v1/trucks/{truck_ids[i % len(truck_ids)]}/')
+        elif i % 3 == 1:
+            paths.append(f'/api/v1/trucks/by_user/?user_id={user_ids[i % len(user_ids)]}')
+        else:
+            paths.append('/api/v1/users/me/')
+    return paths
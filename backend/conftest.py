@@ -0,0 +1,24 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks', 'API benchmarks (benchmarks/api_benchmarks.py)')
+    group.addoption(
+        '--benchmark-size', default='1k', choices=['1k', '100k', '1M'],
+        help='Number of users and trucks seeded for the benchmarks',
+    )
+    group.addoption(
+        '--benchmark-threshold', type=float, default=0.5,
+        help='Allowed p50/p95 slowdown against the stored baseline (0.5 = 50%%)',
+    )
+    group.addoption(
+        '--benchmark-save', action='store_true',
+        help='Store the measured results as the new baselines instead of comparing',
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Give every test fresh throttle budgets"""
+    from fleetsecure.throttling import reset_throttles
+    reset_throttles()
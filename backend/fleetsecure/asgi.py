@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fleetsecure.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up: it reads the settings and the models
+from fleetsecure.events import EventRouter  # noqa: E402
+
+# Serves the change feed (EVENTS_PATH) itself and hands everything else to Django
+application = EventRouter(django_application)
@@ -0,0 +1,32 @@
+"""
+URLconf of the ASGI deployment, selected by ASGIURLConfMiddleware.
+
+The routes of `fleetsecure.urls`, with the reads named in
+ASYNC_READ_ROUTES served by the async actions of their viewsets.
+"""
+from django.urls import URLPattern, URLResolver
+from .async_views import async_read_view
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_READ_ROUTES = {'user-me', 'truck-detail', 'truck-by-user'}
+
+
+def _with_async_reads(patterns):
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern, _with_async_reads(pattern.url_patterns),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace,
+            )
+        elif pattern.name in ASYNC_READ_ROUTES:
+            view = pattern.callback
+            pattern = URLPattern(
+                pattern.pattern, async_read_view(view.cls, view.actions, **view.initkwargs),
+                pattern.default_args, pattern.name,
+            )
+        result.append(pattern)
+    return result
+
+
+urlpatterns = _with_async_reads(sync_urlpatterns)
@@ -0,0 +1,118 @@
+"""
+Async read actions for the viewsets, served by the ASGI deployment.
+
+A viewset mixing in `AsyncViewSetMixin` implements a read action twice:
+`by_user` for WSGI and `aby_user` with the async ORM. `async_read_view`
+routes GET/HEAD to the async one, so a request waiting on Postgres or
+Redis leaves the event loop free for the others instead of holding a
+worker. Authentication, permissions, throttles, content negotiation and
+error responses are the viewset's own, so both produce the same output.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.template.response import SimpleTemplateResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+
+READ_METHODS = ('get', 'head')
+
+
+class AsyncViewSetMixin:
+    """Async counterparts of the `APIView`/`GenericAPIView` steps that do I/O"""
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        # One Redis call; the cache API has no native async client
+        await sync_to_async(self.check_throttles)(request)
+
+    async def aperform_authentication(self, request):
+        """Authenticate like `Request._authenticate`, with the authenticators' `aauthenticate`"""
+        for authenticator in request.authenticators:
+            try:
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            except exceptions.APIException:
+                self._set_user(request, None, (AnonymousUser(), None))
+                raise
+            if user_auth_tuple is not None:
+                self._set_user(request, authenticator, user_auth_tuple)
+                return
+        self._set_user(request, None, (AnonymousUser(), None))
+
+    @staticmethod
+    def _set_user(request, authenticator, user_auth_tuple):
+        # Request resolves these lazily with the sync authenticators otherwise
+        request._authenticator = authenticator
+        request.user, request.auth = user_auth_tuple
+
+    async def aget_object(self):
+        queryset = self.get_queryset()
+        if self.request.query_params:
+            # Filter backends may validate choices against the database
+            queryset = await sync_to_async(self.filter_queryset)(queryset)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+
+def _rendered(response):
+    """Render a DRF response here rather than in a thread, as Django does for template responses"""
+    if not isinstance(response, SimpleTemplateResponse):
+        return response
+    response.render()
+    return HttpResponse(response.content, status=response.status_code, headers=dict(response.items()))
+
+
+def async_read_view(viewset, actions, **initkwargs):
+    """
+    Return the view of `viewset.as_view(actions, **initkwargs)` for the ASGI URLconf.
+
+    GET and HEAD run the viewset's `a<action>` coroutine; every other
+    method is handed to the sync view.
+    """
+    actions = dict(actions)
+    actions.setdefault('head', actions['get'])
+    sync_view = viewset.as_view(actions, **initkwargs)
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method.lower() not in READ_METHODS:
+            return await sync_view(request, *args, **kwargs)
+        self = viewset(**initkwargs)
+        self.action_map = actions
+        return _rendered(await self.adispatch(request, *args, **kwargs))
+
+    view.cls = viewset
+    view.initkwargs = initkwargs
+    view.actions = actions
+    return csrf_exempt(view)
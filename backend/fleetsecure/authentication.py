@@ -0,0 +1,245 @@
+"""
+JWT authentication that resolves the token's user from a cache, and a
+login backend that verifies passwords off the request thread.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from utils.hashing import hash_password, verify_user_password
+from utils.metrics import AUTH_FAILURES
+
+# Shared entries are keyed by the user's version, moved on every change: a
+# row read before a change can only be stored under a version already gone.
+USER_CACHE_KEY = 'auth:user:{}:{}'
+USER_VERSION_KEY = 'auth:user-version:{}'
+
+# What the caches keep of a user: enough for authentication and permission
+# checks, never the password hash or personal data
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'is_admin')
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.timeout <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_user_cache = LocalLRUCache(
+    maxsize=settings.AUTH_USER_LOCAL_CACHE_SIZE,
+    timeout=settings.AUTH_USER_LOCAL_CACHE_TIMEOUT,
+)
+
+
+def _fresh_version():
+    # Time based, so a version evicted from the cache never restarts at a
+    # value that older entries were stored under
+    return time.time_ns() // 1000
+
+
+def get_user_version(user_id):
+    """Return the current version of a user's cache entries"""
+    key = USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_user_version(user_id):
+    key = USER_VERSION_KEY.format(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _fresh_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def invalidate_cached_user(user_id):
+    """Move the user to a new version, so both cache tiers reload it on the next request"""
+    key = USER_VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), timeout=None)
+    local_user_cache.delete(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that avoids the `User` query on every request.
+
+    The user is looked up in a per-process LRU first, then in the shared
+    cache, and only then in the database. Both tiers are invalidated by the
+    `User` post_save/post_delete signal once the change commits, so
+    deactivation and password changes take effect on the next request
+    (other processes may keep their local copy for at most
+    AUTH_USER_LOCAL_CACHE_TIMEOUT seconds). Shared entries are versioned: a
+    lookup racing the change cannot store the old row back.
+
+    Only CACHED_USER_FIELDS are cached; `request.user` is an unsaved
+    instance built from them, so views needing the rest of the row load it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            raise ImproperlyConfigured('CHECK_REVOKE_TOKEN needs the password hash, which is not cached')
+        super().__init__(*args, **kwargs)
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except exceptions.AuthenticationFailed as e:
+            codes = e.get_codes()
+            AUTH_FAILURES.labels(codes if isinstance(codes, str) else e.default_code).inc()
+            raise
+
+    async def aauthenticate(self, request):
+        """
+        `authenticate` for async views.
+
+        Only a user missing from the local cache is looked up off the event
+        loop (shared cache, then database).
+        """
+        try:
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+        except exceptions.AuthenticationFailed as e:
+            codes = e.get_codes()
+            AUTH_FAILURES.labels(codes if isinstance(codes, str) else e.default_code).inc()
+            raise
+
+    def get_user(self, validated_token):
+        return self.check_user(self.get_cached_user(self.get_user_id(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await self.aget_cached_user(self.get_user_id(validated_token)), validated_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def cached_fields(self, user):
+        return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+    def build_user(self, fields):
+        # A new instance per request, so requests never share (and mutate) one
+        return self.user_model(**fields)
+
+    def get_cached_user(self, user_id):
+        # Token claims carry the id as a string
+        fields = local_user_cache.get(str(user_id))
+        if fields is None:
+            # Read before the row, so a change committed meanwhile moves past it
+            version = get_user_version(user_id)
+            key = USER_CACHE_KEY.format(user_id, version)
+            fields = cache.get(key)
+            if fields is None:
+                try:
+                    user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+                except self.user_model.DoesNotExist as e:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+                fields = self.cached_fields(user)
+                cache.add(key, fields, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            if get_user_version(user_id) == version:
+                local_user_cache.set(str(user_id), fields)
+        return self.build_user(fields)
+
+    async def aget_cached_user(self, user_id):
+        fields = local_user_cache.get(str(user_id))
+        if fields is None:
+            version = await aget_user_version(user_id)
+            key = USER_CACHE_KEY.format(user_id, version)
+            fields = await cache.aget(key)
+            if fields is None:
+                try:
+                    user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+                except self.user_model.DoesNotExist as e:
+                    raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+                fields = self.cached_fields(user)
+                await cache.aadd(key, fields, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+            if await aget_user_version(user_id) == version:
+                local_user_cache.set(str(user_id), fields)
+        return self.build_user(fields)
+
+
+class LimitedModelBackend(ModelBackend):
+    """
+    ModelBackend that checks the password under the shared hashing limit.
+
+    Used by the login endpoint (and the admin), so a burst of logins queues
+    for a hashing slot instead of pinning every web worker's CPU.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong passwords
+            hash_password(password)
+            return None
+        if verify_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
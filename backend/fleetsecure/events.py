@@ -0,0 +1,299 @@
+"""
+Server-sent change feed for trucks and users, served by the ASGI app.
+
+Writes publish a small event (`truck.updated`, `user.deleted`, ...) on a
+Redis channel once their transaction commits. Each process keeps a single
+subscription to that channel and fans the events out to its clients
+through bounded per-connection queues. A client that falls behind is sent
+a `resync` event and disconnected, so one slow reader never holds up the
+others or grows the process's memory.
+
+Events only carry ids: clients fetch the rows through
+`changes/?since=<token>`, which also covers anything missed while
+disconnected.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import exceptions
+from utils.metrics import EVENT_OVERFLOWS, EVENT_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {'type': 'resync'}
+
+# Publishing clients, by EVENTS_REDIS_URL
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+def publish_event(kind, action, ids=None):
+    """
+    Announce a change to `kind` rows ('truck' or 'user') after the current transaction commits.
+
+    `ids` is a list of primary keys, or None when too many rows changed to
+    list them (subscribers then resync).
+    """
+    payload = json.dumps({'type': f'{kind}.{action}', 'ids': ids}, separators=(',', ':'))
+    transaction.on_commit(lambda: _publish(payload))
+
+
+def _publisher():
+    """Return this process's client for EVENTS_REDIS_URL, the server the brokers subscribe to"""
+    url = settings.EVENTS_REDIS_URL
+    with _publishers_lock:
+        client = _publishers.get(url)
+        if client is None:
+            import redis
+            client = _publishers[url] = redis.from_url(url, health_check_interval=30)
+        return client
+
+
+def _publish(payload):
+    try:
+        _publisher().publish(settings.EVENTS_CHANNEL, payload)
+    except Exception:
+        # Best effort: subscribers catch up through changes/ on their next resync
+        logger.exception('Could not publish change event')
+
+
+class Subscriber:
+    """One connected client: what it may see, and the events waiting to be sent to it"""
+
+    def __init__(self, user_id, is_admin, queue_size):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def wants(self, event):
+        if event['type'].startswith('user.'):
+            # Like the user endpoints: admins see everyone, users only themselves
+            return self.is_admin or (event['ids'] is not None and self.user_id in event['ids'])
+        return True
+
+    def offer(self, event):
+        """Queue `event` without blocking; a full queue marks the subscriber as overflowed"""
+        if self.overflowed or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            EVENT_OVERFLOWS.inc()
+
+
+class Broker:
+    """Fans the Redis channel out to the subscribers of this process"""
+
+    # Seconds between attempts to resubscribe after losing Redis
+    RECONNECT_DELAY = 1
+    # Longest wait for a message before checking whether to stop
+    POLL_TIMEOUT = 0.5
+
+    def __init__(self):
+        self.subscribers = set()
+        self._task = None
+        self._stop = None
+
+    def subscribe(self, subscriber):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._stop = asyncio.Event()
+            self._task = loop.create_task(self._listen(self._stop))
+        self.subscribers.add(subscriber)
+        EVENT_SUBSCRIBERS.inc()
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.discard(subscriber)
+            EVENT_SUBSCRIBERS.dec()
+
+    def dispatch(self, event):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(event)
+
+    async def close(self):
+        # The listener is stopped rather than cancelled: redis-py can swallow a
+        # cancellation that races its read timeout and keep reading forever
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = self._stop = None
+
+    async def _listen(self, stop):
+        import redis.asyncio as redis
+
+        reconnecting = False
+        while not stop.is_set():
+            client = redis.from_url(settings.EVENTS_REDIS_URL, health_check_interval=30)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.EVENTS_CHANNEL)
+                    if reconnecting:
+                        # Events published while we were away are lost
+                        self.dispatch(RESYNC)
+                        reconnecting = False
+                    while not stop.is_set():
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.POLL_TIMEOUT)
+                        if message is not None:
+                            self.dispatch(json.loads(message['data']))
+            except Exception:
+                logger.exception('Change feed lost its Redis subscription, retrying')
+                reconnecting = True
+                try:
+                    await asyncio.wait_for(stop.wait(), self.RECONNECT_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                await client.aclose()
+
+
+broker = Broker()
+
+
+def _format(event):
+    return f'event: {event["type"]}\ndata: {json.dumps(event, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _authenticate(scope):
+    """Return the user of the Bearer header or `?token=` (EventSource cannot set headers)"""
+    from fleetsecure.authentication import CachedJWTAuthentication
+
+    headers = dict(scope['headers'])
+    raw = None
+    header = headers.get(b'authorization', b'').split()
+    if len(header) == 2 and header[0].lower() == b'bearer':
+        raw = header[1]
+    else:
+        raw = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+    if not raw:
+        raise exceptions.NotAuthenticated()
+
+    authentication = CachedJWTAuthentication()
+    token = authentication.get_validated_token(raw)
+    return await authentication.aget_user(token), token
+
+
+async def _reject(send, status, detail):
+    body = json.dumps({'detail': str(detail)}).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def event_stream(scope, receive, send):
+    """
+    ASGI app for GET EVENTS_PATH: a text/event-stream of change events.
+
+    The stream ends when the access token expires, so clients reconnect
+    with a fresh one. Comment lines are sent every EVENTS_HEARTBEAT seconds
+    to keep proxies from closing idle streams.
+    """
+    if scope['method'] not in ('GET', 'HEAD'):
+        return await _reject(send, 405, 'Method not allowed.')
+    if len(broker.subscribers) >= settings.EVENTS_MAX_SUBSCRIBERS:
+        return await _reject(send, 503, 'Too many subscribers, try again later.')
+    try:
+        user, token = await _authenticate(scope)
+    except exceptions.APIException as exc:
+        return await _reject(send, exc.status_code, exc.detail)
+
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        # Stop nginx from buffering the stream
+        (b'x-accel-buffering', b'no'),
+    ]
+    origin = dict(scope['headers']).get(b'origin')
+    if origin and origin.decode('latin-1') in settings.CORS_ALLOWED_ORIGINS:
+        headers += [(b'access-control-allow-origin', origin), (b'vary', b'origin')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    if scope['method'] == 'HEAD':
+        return await send({'type': 'http.response.body', 'body': b''})
+
+    subscriber = Subscriber(user.pk, user.is_admin, settings.EVENTS_QUEUE_SIZE)
+    broker.subscribe(subscriber)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    expires_at = token['exp']
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n: connected\n\n', 'more_body': True})
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                break
+            getter = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnect}, timeout=min(settings.EVENTS_HEARTBEAT, remaining),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if getter not in done:
+                getter.cancel()
+                if disconnect in done:
+                    return
+                if subscriber.overflowed:
+                    chunk = _format(RESYNC)
+                else:
+                    chunk = b': keepalive\n\n'
+            else:
+                chunk = _format(getter.result())
+                if subscriber.overflowed:
+                    # Drop what is queued; the client reloads through changes/
+                    chunk = _format(RESYNC)
+
+            # A client that does not read within the timeout is dropped
+            await asyncio.wait_for(
+                send({'type': 'http.response.body', 'body': chunk, 'more_body': True}),
+                timeout=settings.EVENTS_SEND_TIMEOUT,
+            )
+            if subscriber.overflowed:
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        broker.unsubscribe(subscriber)
+        disconnect.cancel()
+
+
+class EventRouter:
+    """
+    Top-level ASGI app: the change feed at EVENTS_PATH, Django for everything else.
+
+    The feed bypasses Django's request handling, so an idle subscriber costs
+    a coroutine and a small queue rather than a request in flight.
+    """
+
+    def __init__(self, django_app):
+        self.django_app = django_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+            return await event_stream(scope, receive, send)
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        return await self.django_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await broker.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
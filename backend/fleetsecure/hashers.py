@@ -0,0 +1,47 @@
+"""
+Password hashers with cost parameters taken from settings.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with ARGON2_TIME_COST / ARGON2_MEMORY_COST / ARGON2_PARALLELISM.
+
+    The algorithm name is unchanged, so hashes made with other parameters
+    still verify and are re-hashed with the current ones on the next login.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with SCRYPT_WORK_FACTOR / SCRYPT_BLOCK_SIZE / SCRYPT_PARALLELISM"""
+
+    @property
+    def work_factor(self):
+        return settings.SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # OpenSSL refuses anything above 32 MiB unless told otherwise
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
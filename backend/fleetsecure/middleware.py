@@ -0,0 +1,195 @@
+"""
+Per-request instrumentation (SQL query count, DB time, serializer time and
+wall time), and the URLconf switch of the ASGI deployment.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from rest_framework.response import Response
+from utils.metrics import REQUEST_LATENCY, REQUEST_QUERIES, REQUESTS, refresh_gauges
+
+logger = logging.getLogger('fleetsecure.requests')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings collected while a sampled request is served (milliseconds)"""
+    __slots__ = ('queries', 'db_ms', 'serializer_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serializer_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - start) * 1000
+
+
+def serializer_data(serializer):
+    """
+    Return `serializer.data`, adding the time it takes to the serializer
+    time of the sampled request (see RequestMetricsMiddleware).
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return serializer.data
+    start = time.perf_counter()
+    try:
+        return serializer.data
+    finally:
+        metrics.serializer_ms += (time.perf_counter() - start) * 1000
+
+
+class SerializerTimingMixin:
+    """
+    Viewset mixin whose `list` and `retrieve` go through `serializer_data`.
+
+    The view's other actions call `serializer_data` themselves; serializers
+    are left untouched, so nothing changes for them elsewhere.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer_data(serializer))
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer_data(serializer))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer_data(serializer))
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure requests and report them per view name.
+
+    Every request feeds the Prometheus latency histogram. In addition,
+    REQUEST_METRICS_SAMPLE_RATE of the requests (0 to 1) have their SQL
+    queries counted and timed, and get a Server-Timing header and a JSON
+    log line on the 'fleetsecure.requests' logger. Work done while a
+    streaming response is consumed is not included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.observe(request, response, time.perf_counter() - start)
+            return response
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            response = await self.get_response(request)
+            self.observe(request, response, time.perf_counter() - start)
+            return response
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        # Connections are per thread: wrap those of the thread that runs
+        # this request's sync code, async ORM queries included
+        stack = ExitStack()
+        try:
+            await sync_to_async(self.wrap_connections)(stack, metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics, time.perf_counter() - start)
+
+    def wrap_connections(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+
+    def report(self, request, response, metrics, elapsed):
+        view = self.observe(request, response, elapsed)
+        REQUEST_QUERIES.labels(view).observe(metrics.queries)
+        total_ms = elapsed * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={metrics.db_ms:.2f};desc="{metrics.queries} queries", '
+            f'serializer;dur={metrics.serializer_ms:.2f}, '
+            f'total;dur={total_ms:.2f}'
+        )
+
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_ms, 2),
+            'serializer_ms': round(metrics.serializer_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }))
+        return response
+
+    def observe(self, request, response, elapsed):
+        match = request.resolver_match
+        # Unresolved paths share one label, so 404 scans cannot add series
+        view = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        refresh_gauges()
+        return view
+
+
+class ASGIURLConfMiddleware:
+    """
+    Resolve the requests of the ASGI app with ASGI_ROOT_URLCONF.
+
+    That URLconf serves some reads with async views (see
+    fleetsecure.asgi_urls); WSGI requests keep ROOT_URLCONF.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.ASGI_ROOT_URLCONF
+        return self.get_response(request)
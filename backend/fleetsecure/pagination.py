@@ -0,0 +1,207 @@
+"""
+Keyset (cursor) pagination shared by the FleetSecure API.
+"""
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering key.
+
+    The cursor stores the values of every ordering field plus a unique
+    tiebreaker, so each page is a `WHERE (key) > (position) LIMIT n` query.
+    Deep pages cost the same as the first one and no `COUNT(*)` is issued.
+    """
+    ordering = 'id'
+    tiebreaker = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views, fetching the page with the async ORM"""
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([row async for row in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor and self.cursor.position is not None:
+            self.cursor = self.cursor._replace(position=self._clean_position(queryset.model, self.cursor.position))
+
+        ordering = self._invert(self.ordering) if self._reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor and self.cursor.position is not None:
+            queryset = queryset.filter(self._after(ordering, self.cursor.position))
+
+        # Fetch one extra row to know whether there is a following page.
+        return queryset[:self.page_size + 1]
+
+    @property
+    def _reverse(self):
+        return bool(self.cursor and self.cursor.reverse)
+
+    def _set_page(self, results):
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self._reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None and self.cursor.position is not None
+
+        if self.has_next or self.has_previous:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return the requested ordering with the unique tiebreaker appended.
+
+        The tiebreaker follows the direction of the first field, so that
+        `-year` becomes `(-year, -id)`: one backward scan of the (year, id) index.
+        """
+        ordering = self.ordering
+
+        ordering_filters = [
+            filter_cls for filter_cls in getattr(view, 'filter_backends', [])
+            if hasattr(filter_cls, 'get_ordering')
+        ]
+        if ordering_filters:
+            ordering_from_filter = ordering_filters[0]().get_ordering(request, queryset, view)
+            if ordering_from_filter:
+                ordering = ordering_from_filter
+
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+
+        if not any(field.lstrip('-') in (self.tiebreaker, 'pk') for field in ordering):
+            descending = ordering[0].startswith('-')
+            ordering += (f'-{self.tiebreaker}' if descending else self.tiebreaker,)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = tokens.get('p', [None])[0]
+            if position is not None:
+                position = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position is not None and (
+            not isinstance(position, list) or len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def _clean_position(self, model, position):
+        """
+        Convert the cursor position to the types of the ordering fields.
+
+        Cursors come from the client: a tampered value must be rejected
+        here rather than fail inside the query.
+        """
+        cleaned = []
+        for field_name, value in zip(self.ordering, position):
+            try:
+                field = None
+                for name in field_name.lstrip('-').split('__'):
+                    field = (field.related_model if field else model)._meta.get_field(name)
+                value = field.to_python(value)
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None and not field.null:
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def encode_cursor(self, cursor):
+        tokens = {}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        if cursor.position is not None:
+            tokens['p'] = json.dumps(cursor.position, separators=(',', ':'), default=str)
+
+        querystring = parse.urlencode(tokens)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            field_name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = instance
+                for attr in field_name.split('__'):
+                    value = getattr(value, attr)
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _invert(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _after(ordering, position):
+        """
+        Build the keyset condition for rows strictly after `position`.
+        """
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value
+                for previous, value in zip(ordering[:index], position[:index])
+            }
+            condition |= Q(**equal, **{f'{field.lstrip("-")}__{lookup}': position[index]})
+        return condition
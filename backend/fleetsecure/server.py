@@ -0,0 +1,33 @@
+"""
+Worker sizing for the production server (gunicorn.conf.py).
+
+Imported by the gunicorn master before Django is set up: standard library only.
+"""
+import math
+import os
+
+CGROUP_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+
+
+def cpu_count(cgroup_cpu_max=CGROUP_CPU_MAX):
+    """CPUs this process may use: its affinity, capped by a cgroup v2 quota (`docker run --cpus`)"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    try:
+        with open(cgroup_cpu_max) as file:
+            quota, period = file.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def default_workers(worker_class, cpus):
+    """Workers for `worker_class` ('uvicorn', 'gthread' or 'sync') on `cpus` CPUs"""
+    if worker_class == 'sync':
+        # Sync workers block on every query: the usual 2 x CPUs + 1
+        return 2 * cpus + 1
+    if worker_class == 'gthread':
+        return cpus + 1
+    # An event loop keeps its CPU busy by itself
+    return cpus
@@ -15,6 +15,7 @@ from pathlib import Path
 from datetime import timedelta
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -52,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fleetsecure.middleware.RequestMetricsMiddleware',  # Outermost, to time everything below it
+    'fleetsecure.middleware.ASGIURLConfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -64,23 +68,45 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'fleetsecure.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'fleetsecure.throttling.ReadWriteRateThrottle',
     ],
+    # Per user (or per IP when anonymous); login, bulk import/export and
+    # everything else have separate budgets
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/day',
-        'user': '1000/day'
+        'login': config('THROTTLE_RATE_LOGIN', default='10/min'),
+        'bulk': config('THROTTLE_RATE_BULK', default='30/hour'),
+        'reads': config('THROTTLE_RATE_READS', default='1200/hour'),
+        'writes': config('THROTTLE_RATE_WRITES', default='300/hour'),
     },
+    'DEFAULT_RENDERER_CLASSES': [
+        'fleetsecure.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'fleetsecure.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'fleetsecure.pagination.KeysetPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=50, cast=int),
 }
 
+# Browsable API only while debugging
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
+
+# Upper bound for the ?page_size= query parameter on paginated endpoints
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+
 
 ROOT_URLCONF = 'fleetsecure.urls'
+# Same routes, with async views for the latency-bound reads (requests served by asgi.py)
+ASGI_ROOT_URLCONF = 'fleetsecure.asgi_urls'
 
 TEMPLATES = [
     {
@@ -121,9 +147,29 @@ else:
             'PASSWORD': config('DB_PASSWORD', default='fleetpass'),
             'HOST': config('DB_HOST', default='db'),
             'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 
+DATABASES['default'].setdefault('OPTIONS', {})
+DATABASES['default']['OPTIONS']['connect_timeout'] = config('DB_CONNECT_TIMEOUT', default=5, cast=int)
+
+# Connection pooling (psycopg 3, Django >= 5.1): one pool per process, for
+# either configuration above. With DB_POOL=False persistent connections
+# (CONN_MAX_AGE) still apply.
+if config('DB_POOL', default=True, cast=bool):
+    # Pooled connections are health-checked on checkout (CONN_HEALTH_CHECKS)
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # Required by Django when pooling
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        # Seconds a request waits for a free connection before failing
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,6 +189,43 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing - the first hasher hashes new passwords, the others only
+# verify existing hashes (which are upgraded on the next successful login)
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='argon2')
+
+PASSWORD_HASHER_CLASSES = {
+    'argon2': 'fleetsecure.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'fleetsecure.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = ['fleetsecure.authentication.LimitedModelBackend']
+
+# Login and password change hash at most PASSWORD_HASHING_CONCURRENCY passwords at
+# once across every worker (slots in THROTTLE_CACHE; per process without Redis).
+# Up to PASSWORD_HASHING_MAX_WAITING callers per process wait for a slot, each for
+# PASSWORD_HASHING_QUEUE_TIMEOUT seconds; the others get a 503 right away, so
+# waiting logins never hold every request thread
+PASSWORD_HASHING_CONCURRENCY = config('PASSWORD_HASHING_CONCURRENCY', default=4, cast=int)
+PASSWORD_HASHING_MAX_WAITING = config('PASSWORD_HASHING_MAX_WAITING', default=4, cast=int)
+PASSWORD_HASHING_QUEUE_TIMEOUT = config('PASSWORD_HASHING_QUEUE_TIMEOUT', default=5, cast=float)
+
+# Argon2id cost (defaults follow the OWASP minimum: 19 MiB, 2 passes, 1 lane)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+
+# scrypt cost (N=2^15, r=8, p=1 uses 32 MiB per hash)
+SCRYPT_WORK_FACTOR = config('SCRYPT_WORK_FACTOR', default=2 ** 15, cast=int)
+SCRYPT_BLOCK_SIZE = config('SCRYPT_BLOCK_SIZE', default=8, cast=int)
+SCRYPT_PARALLELISM = config('SCRYPT_PARALLELISM', default=1, cast=int)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -198,6 +281,59 @@ else:
         }
     }
 
+# Change feed (server-sent events on the ASGI app, fanned out from Redis pub/sub)
+EVENTS_PATH = '/api/v1/events/'
+EVENTS_CHANNEL = config('EVENTS_CHANNEL', default='fleetsecure:events')
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default='') or CACHES['default']['LOCATION']
+# Events buffered per client; a client further behind is told to resync and dropped
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int)
+# Seconds a client may take to accept one event before it is dropped
+EVENTS_SEND_TIMEOUT = config('EVENTS_SEND_TIMEOUT', default=10, cast=float)
+# Seconds between keepalive comments on idle streams
+EVENTS_HEARTBEAT = config('EVENTS_HEARTBEAT', default=15, cast=float)
+# Connected clients per process
+EVENTS_MAX_SUBSCRIBERS = config('EVENTS_MAX_SUBSCRIBERS', default=10000, cast=int)
+
+# In-process cache, usable where Redis is not available (e.g. tests)
+CACHES['local'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fleetsecure-local',
+}
+
+# Rows per bulk_create batch in POST /trucks/bulk_create/
+TRUCK_IMPORT_BATCH_SIZE = config('TRUCK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Rows fetched per server-side cursor round trip by the export endpoints
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Lifetime of cached API read responses (invalidated early on writes)
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int)
+
+# Authenticated user lookups: shared cache TTL, plus a short per-process LRU
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+AUTH_USER_LOCAL_CACHE_TIMEOUT = config('AUTH_USER_LOCAL_CACHE_TIMEOUT', default=2, cast=float)
+AUTH_USER_LOCAL_CACHE_SIZE = config('AUTH_USER_LOCAL_CACHE_SIZE', default=1024, cast=int)
+
+# Delta sync (changes/?since=): rows per page
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+# Deletion tombstones older than this are pruned; older sync tokens get 410 Gone
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Expired outstanding/blacklisted tokens deleted per transaction by prune_tokens
+TOKEN_PRUNE_BATCH_SIZE = config('TOKEN_PRUNE_BATCH_SIZE', default=1000, cast=int)
+
+# Share of requests (0 to 1) measured by RequestMetricsMiddleware
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=0.01, cast=float)
+
+# Bearer token Prometheus must send to /metrics (empty: only served in DEBUG)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Cache alias holding the rate limit buckets (Redis; any other backend limits per process)
+THROTTLE_CACHE = config('THROTTLE_CACHE', default='default')
+
+# Cache alias holding revoked JWT ids ('local' runs without Redis)
+TOKEN_BLACKLIST_CACHE = config('TOKEN_BLACKLIST_CACHE', default='default')
+
 # JWT Configuration com Redis
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_LIFETIME', default=60, cast=int)),
@@ -207,6 +343,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Blacklist checks read the cache first (fleetsecure/tokens.py)
+    'TOKEN_REFRESH_SERIALIZER': 'fleetsecure.tokens.TokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'fleetsecure.tokens.TokenVerifySerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'fleetsecure.tokens.TokenBlacklistSerializer',
 }
 
 # CORS configuration
@@ -214,6 +354,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "https://fleetsecure.vercel.app",
 ]
+# Conditional GETs: the frontend may send the validators itself and read them back
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match', 'if-modified-since')
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 # Configure S3 storage para produção ou LocalStack para desenvolvimento
 if config('USE_S3', default=True, cast=bool):
@@ -252,12 +395,21 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        # Request metrics are logged as a JSON object
+        'structured': {
+            'format': '{{"level": "{levelname}", "time": "{asctime}", "logger": "{name}", "metrics": {message}}}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'structured_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -269,5 +421,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'fleetsecure.requests': {
+            'handlers': ['structured_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
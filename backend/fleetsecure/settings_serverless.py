@@ -0,0 +1,38 @@
+"""
+Settings of the serverless deployment (vercel.json).
+
+Each lambda imports the app on a cold start, in front of the request that
+started it, so this profile keeps only what the JWT API serves: no admin,
+no sessions or messages, no static files (the platform serves them).
+`python manage.py profile_startup --settings=fleetsecure.settings_serverless`
+shows where the remaining import time goes.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+SERVERLESS_EXCLUDED_APPS = {
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.postgres',
+    # Files go through Django's storage API, which imports the backend on first use
+    'storages',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in SERVERLESS_EXCLUDED_APPS]
+
+# Requests authenticate with JWTs in DRF: no sessions, cookies or flash messages
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE if middleware not in {
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    }
+]
+
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.contrib.messages.context_processors.messages'
+]
@@ -0,0 +1,187 @@
+"""
+GCRA (token bucket) rate limiting, one atomic Redis call per request.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+from utils.metrics import THROTTLED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_KEY = 'throttle:{scope}:{ident}'
+
+# Generic cell rate algorithm: each key stores the theoretical arrival time
+# (TAT) of the next request. A request is allowed while it would not push
+# the TAT more than one period ahead of now, which allows bursts of up to
+# `limit` requests and then a steady `limit / period`. Returns 0 when the
+# request is allowed, otherwise the milliseconds to wait.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local wait = new_tat - now - period
+if wait > 0 then
+    return wait
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return 0
+"""
+
+_scripts = {}
+_scripts_lock = threading.Lock()
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def throttle_stats():
+    """Return the number of throttled requests of this process, by scope"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_throttle_stats():
+    """Reset the throttled request counters of this process"""
+    with _stats_lock:
+        _stats.clear()
+
+
+class LocalGCRA:
+    """In-process GCRA, used when the throttle cache is not Redis or is unreachable"""
+
+    # Expired entries are dropped once the table grows past this size
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key, interval, period):
+        now = int(time.monotonic() * 1000)
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            new_tat = tat + interval
+            wait = new_tat - now - period
+            if wait > 0:
+                return wait
+            if len(self._tats) >= self.MAX_KEYS:
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+            self._tats[key] = new_tat
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+local_gcra = LocalGCRA()
+
+
+def _redis_script(alias):
+    if not settings.CACHES[alias]['BACKEND'].startswith('django_redis.'):
+        return None
+    with _scripts_lock:
+        script = _scripts.get(alias)
+        if script is None:
+            from django_redis import get_redis_connection
+            # Script objects call EVALSHA, loading the script only on the first miss
+            script = _scripts[alias] = get_redis_connection(alias).register_script(GCRA_SCRIPT)
+        return script
+
+
+def gcra(key, limit, period):
+    """
+    Count a request against `key`, allowing `limit` requests per `period` seconds.
+
+    Returns 0 if the request is allowed, otherwise the seconds until it would be.
+    """
+    interval = max(int(period * 1000 // limit), 1)
+    period_ms = int(period * 1000)
+
+    script = _redis_script(settings.THROTTLE_CACHE)
+    if script is not None:
+        try:
+            return script(keys=[key], args=[interval, period_ms]) / 1000
+        except Exception:
+            logger.exception('Throttle cache unavailable, limiting per process')
+    return local_gcra(key, interval, period_ms) / 1000
+
+
+def reset_throttles():
+    """Forget every throttle bucket (used by the tests)"""
+    local_gcra.clear()
+    script = _redis_script(settings.THROTTLE_CACHE)
+    if script is not None:
+        client = script.registered_client
+        keys = list(client.scan_iter(match=THROTTLE_KEY.format(scope='*', ident='*')))
+        if keys:
+            client.delete(*keys)
+
+
+class GCRAThrottle(SimpleRateThrottle):
+    """
+    Rate throttle backed by `gcra`.
+
+    Requests are identified by user, or by client IP when anonymous. Each
+    `scope` has its own budget in DEFAULT_THROTTLE_RATES.
+    """
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return THROTTLE_KEY.format(scope=self.scope, ident=ident)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self._wait = gcra(self.key, self.num_requests, self.duration)
+        if self._wait:
+            with _stats_lock:
+                _stats[self.scope] += 1
+            THROTTLED_REQUESTS.labels(self.scope).inc()
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class ReadWriteRateThrottle(GCRAThrottle):
+    """Default throttle: separate budgets for reads (safe methods) and writes"""
+
+    # Initial scope; allow_request picks the one of each request
+    scope = 'reads'
+
+    def allow_request(self, request, view):
+        self.scope = 'reads' if request.method in SAFE_METHODS else 'writes'
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+
+class LoginRateThrottle(GCRAThrottle):
+    """Budget for auth/login/, per client IP"""
+    scope = 'login'
+
+
+class BulkRateThrottle(GCRAThrottle):
+    """Budget for bulk imports and exports"""
+    scope = 'bulk'
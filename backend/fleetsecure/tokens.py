@@ -0,0 +1,213 @@
+"""
+JWT blacklist kept in the cache, with the token_blacklist tables as the durable copy.
+
+Revoked JTIs are written to both. On Redis the cached copy is one sorted
+set (JTI scored by expiry) that also holds the LOADED member once it has
+been filled from the database: a lookup reads both in a single ZMSCORE, and
+with the marker present a missing JTI means "not revoked", so refresh and
+verify do not touch Postgres. An evicting Redis drops the whole set, marker
+included, so revoked tokens can never be evicted on their own. Without the
+marker, lookups use the database while a background thread loads the set.
+
+Other caches can evict entries one by one, so there only revoked JTIs are
+cached and a miss is checked against the database.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_KEY = 'jwt:blacklist'
+BLACKLIST_LOAD_LOCK_KEY = 'jwt:blacklist:loading'
+# Per-JTI keys of caches other than Redis
+BLACKLIST_JTI_KEY = 'jwt:blacklist:{}'
+
+# Members of the sorted set that are not JTIs (JTIs are hex UUIDs)
+LOADED = ':loaded'
+LOADING = ':loading:{}'
+
+LOAD_CHUNK_SIZE = 1000
+# Seconds a load may take before another worker can start one
+LOAD_TIMEOUT = 300
+
+# Marks the set as loaded only if the member added when this load started
+# is still there: had the set been evicted meanwhile, the chunks written
+# before the eviction would be missing.
+FINISH_LOAD_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], 'inf', ARGV[2])
+return 1
+"""
+
+_scripts = {}
+_scripts_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.TOKEN_BLACKLIST_CACHE]
+
+
+def _redis():
+    """Return the Redis client of the blacklist cache, or None for other backends"""
+    alias = settings.TOKEN_BLACKLIST_CACHE
+    if not settings.CACHES[alias]['BACKEND'].startswith('django_redis.'):
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection(alias)
+
+
+def _finish_load_script(client):
+    alias = settings.TOKEN_BLACKLIST_CACHE
+    with _scripts_lock:
+        script = _scripts.get(alias)
+        if script is None:
+            script = _scripts[alias] = client.register_script(FINISH_LOAD_SCRIPT)
+        return script
+
+
+def _ttl(expires_at):
+    return math.ceil((expires_at - timezone.now()).total_seconds())
+
+
+def add_to_blacklist(jti, expires_at):
+    """Cache a revoked JTI until the token expires"""
+    ttl = _ttl(expires_at)
+    if ttl <= 0:
+        return
+    try:
+        client = _redis()
+        if client is None:
+            _cache().set(BLACKLIST_JTI_KEY.format(jti), 1, timeout=ttl)
+            return
+        pipe = client.pipeline()
+        pipe.zadd(BLACKLIST_KEY, {jti: expires_at.timestamp()})
+        # Expired tokens are dropped as new ones come in
+        pipe.zremrangebyscore(BLACKLIST_KEY, '-inf', time.time())
+        pipe.execute()
+    except Exception:
+        logger.exception('Could not cache blacklisted token %s', jti)
+        # The cache no longer holds every revoked token; make lookups use
+        # the database until it is reloaded
+        try:
+            _redis().zrem(BLACKLIST_KEY, LOADED)
+        except Exception:
+            pass
+
+
+def is_blacklisted(jti):
+    """Return whether a JTI was revoked, normally with a single cache read"""
+    try:
+        client = _redis()
+        if client is None:
+            if _cache().get(BLACKLIST_JTI_KEY.format(jti)) is not None:
+                return True
+            return _in_database(jti)
+        expires, loaded = client.zmscore(BLACKLIST_KEY, [jti, LOADED])
+    except Exception:
+        logger.exception('Token blacklist cache unavailable, using the database')
+        return _in_database(jti)
+
+    if expires is not None and expires > time.time():
+        return True
+    if loaded is not None:
+        return False
+
+    _load_in_background()
+    return _in_database(jti)
+
+
+def _load_in_background():
+    """Fill the cache from the database without holding up the request"""
+    try:
+        if not _cache().add(BLACKLIST_LOAD_LOCK_KEY, 1, timeout=LOAD_TIMEOUT):
+            return  # Another worker is loading it
+    except Exception:
+        logger.exception('Could not start loading the token blacklist cache')
+        return
+    threading.Thread(target=_load_and_release, name='jwt-blacklist-load', daemon=True).start()
+
+
+def _load_and_release():
+    try:
+        load_blacklist()
+    except Exception:
+        logger.exception('Could not load the token blacklist cache')
+    finally:
+        _cache().delete(BLACKLIST_LOAD_LOCK_KEY)
+        connection.close()
+
+
+def load_blacklist():
+    """
+    Copy the unexpired blacklist from the database into the cache.
+
+    Returns whether the cache was marked as loaded.
+    """
+    client = _redis()
+    if client is None:
+        return False
+    loading = LOADING.format(uuid.uuid4().hex)
+    client.zadd(BLACKLIST_KEY, {loading: time.time() + LOAD_TIMEOUT})
+    rows = (
+        BlacklistedToken.objects
+        .filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', 'token__expires_at')
+        .iterator(chunk_size=LOAD_CHUNK_SIZE)
+    )
+    chunk = {}
+    for jti, expires_at in rows:
+        chunk[jti] = expires_at.timestamp()
+        if len(chunk) == LOAD_CHUNK_SIZE:
+            client.zadd(BLACKLIST_KEY, chunk)
+            chunk = {}
+    if chunk:
+        client.zadd(BLACKLIST_KEY, chunk)
+    return bool(_finish_load_script(client)(keys=[BLACKLIST_KEY], args=[loading, LOADED]))
+
+
+def _in_database(jti):
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class RefreshToken(tokens.RefreshToken):
+    """RefreshToken whose blacklist check reads the cached blacklist"""
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(jwt_serializers.TokenBlacklistSerializer):
+    token_class = RefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+
+    def validate(self, attrs):
+        token = tokens.UntypedToken(attrs['token'])
+
+        if api_settings.BLACKLIST_AFTER_ROTATION and is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+            raise ValidationError(_("Token is blacklisted"))
+
+        return {}
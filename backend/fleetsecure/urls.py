@@ -14,7 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -24,27 +24,37 @@ from rest_framework_simplejwt.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
+from .throttling import LoginRateThrottle
+from .views import DatabasePoolStatsView, PasswordHashingStatsView, metrics
 
 # API v1 URL patterns
 api_v1_patterns = [
-    path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/login/', TokenObtainPairView.as_view(throttle_classes=[LoginRateThrottle]), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('auth/logout/', TokenBlacklistView.as_view(), name='token_blacklist'),
     
+    path('stats/db-pool/', DatabasePoolStatsView.as_view(), name='db_pool_stats'),
+    path('stats/password-hashing/', PasswordHashingStatsView.as_view(), name='password_hashing_stats'),
+    
     path('', include('users.urls')),
     path('', include('trucks.urls')),
 ]
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/v1/', include(api_v1_patterns)),
+    path('metrics', metrics, name='metrics'),
     
     # Keep legacy URLs temporarily for backward compatibility
-    path('api/token/', TokenObtainPairView.as_view(), name='legacy_token_obtain'),
+    path('api/token/', TokenObtainPairView.as_view(throttle_classes=[LoginRateThrottle]), name='legacy_token_obtain'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='legacy_token_refresh'),
 ]
 
+# The serverless settings leave the admin out, and with it its imports
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
 # Add URLs to serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,51 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.views import IsAdminUser
+from utils.db import pool_stats
+from utils.hashing import hashing_stats
+from utils.metrics import refresh_gauges, render_metrics
+
+
+class DatabasePoolStatsView(APIView):
+    """
+    Connection pool statistics of the worker process serving the request.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pool': pool_stats()})
+
+
+class PasswordHashingStatsView(APIView):
+    """
+    Password hashing limit, and the hashes running in every worker and queued in the one serving the request.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'hashing': hashing_stats()})
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, aggregated across all workers.
+
+    Requires `Authorization: Bearer <METRICS_TOKEN>`; without a token
+    configured it is only served in DEBUG.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    refresh_gauges()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
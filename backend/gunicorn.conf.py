@@ -0,0 +1,95 @@
+"""
+Gunicorn configuration of the production server (`gunicorn` in backend/).
+
+GUNICORN_WORKER_CLASS picks the worker model:
+
+- uvicorn: the ASGI app (async reads, change feed); one event loop per CPU
+- gthread: the WSGI app on GUNICORN_THREADS threads per worker
+- sync: the WSGI app, one request at a time per worker
+
+Unless GUNICORN_WORKERS is set, the number of workers follows from the
+CPUs available to the container. The app is loaded once in the master and
+its memory shared copy-on-write with the workers (GUNICORN_PRELOAD).
+"""
+import gc
+import os
+import tempfile
+
+import decouple
+
+from fleetsecure.server import cpu_count, default_workers
+
+WORKER_CLASSES = {
+    'uvicorn': 'uvicorn_worker.UvicornWorker',
+    'gthread': 'gthread',
+    'sync': 'sync',
+}
+
+# Module-level names matching a gunicorn setting are read as that setting,
+# hence `decouple.config` rather than `config`
+worker_type = decouple.config('GUNICORN_WORKER_CLASS', default='uvicorn', cast=decouple.Choices(list(WORKER_CLASSES)))
+worker_class = WORKER_CLASSES[worker_type]
+wsgi_app = 'fleetsecure.asgi:application' if worker_type == 'uvicorn' else 'fleetsecure.wsgi:application'
+
+bind = decouple.config('GUNICORN_BIND', default='0.0.0.0:8000')
+# 0 = derived from the CPU count
+workers = decouple.config('GUNICORN_WORKERS', default=0, cast=int) or default_workers(worker_type, cpu_count())
+threads = decouple.config('GUNICORN_THREADS', default=4, cast=int) if worker_type == 'gthread' else 1
+
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+# Recycle workers to bound slow leaks; the jitter keeps them from restarting together
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=10000, cast=int)
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=1000, cast=int)
+
+# Longer than the load balancer's idle timeout (60 s on AWS ALB), so that the
+# balancer closes idle connections first and never reuses one being closed
+keepalive = decouple.config('GUNICORN_KEEPALIVE', default=65, cast=int)
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = decouple.config('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+# Worker heartbeats on tmpfs: a container's overlay filesystem can stall them
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+forwarded_allow_ips = decouple.config('FORWARDED_ALLOW_IPS', default='127.0.0.1')
+accesslog = decouple.config('GUNICORN_ACCESS_LOG', default=None)
+errorlog = '-'
+loglevel = decouple.config('GUNICORN_LOG_LEVEL', default='info')
+
+# Several workers share their Prometheus samples through a directory, which
+# must be set before prometheus_client is imported by the app
+if workers > 1 and not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), 'fleetsecure-prometheus')
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+if preload_app:
+    # Garbage left by loading the app would punch holes in the pages the
+    # workers share; collections resume once everything loaded is frozen
+    gc.disable()
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        # Samples of a previous run would be added to this one's (the
+        # master's own files were created by the preloaded app)
+        for name in os.listdir(directory):
+            if not name.endswith(f'_{os.getpid()}.db'):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    gc.freeze()
+    gc.enable()
+
+
+def pre_fork(server, worker):
+    # Collections in the worker then never write to the pages it shares with the master
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        # Drops the live gauges (pool sizes, subscribers) of the dead worker
+        multiprocess.mark_process_dead(worker.pid)
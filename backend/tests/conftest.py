@@ -0,0 +1,31 @@
+from unittest import mock
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """
+    Give every test empty caches.
+
+    Writes rolled back with a test never commit, so they never bump the
+    response cache generations: responses cached by another test would be
+    served again.
+    """
+    from django.core.cache import cache
+    from fleetsecure.authentication import local_user_cache
+    cache.clear()
+    local_user_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def load_blacklist_inline():
+    """
+    Load the JWT blacklist cache on the test's own connection.
+
+    The background loader runs on another connection, which cannot see the
+    rows of a test that are never committed.
+    """
+    from fleetsecure import tokens
+    with mock.patch.object(tokens, '_load_in_background', tokens.load_blacklist):
+        yield
@@ -0,0 +1,851 @@
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from fleetsecure.renderers import ORJSONParser, ORJSONRenderer
+from rest_framework.exceptions import ParseError
+from rest_framework.serializers import BaseSerializer
+from users.models import User
+from users.serializers import UserSerializer
+from users.views import UserViewSet
+from trucks.models import Truck
+from asgiref.sync import async_to_sync
+from fleetsecure.asgi import application
+from fleetsecure.events import EventRouter, _publish, _publisher, broker
+from fleetsecure.server import cpu_count
+from utils.startup import by_package, parse_importtime, profile_import
+from django.core.management import call_command
+from django.test import override_settings
+from django_redis import get_redis_connection
+from fleetsecure.throttling import GCRAThrottle, ReadWriteRateThrottle, gcra, reset_throttle_stats, reset_throttles, throttle_stats
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+from unittest import mock
+import asyncio
+import http.client
+import json
+import os
+import runpy
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal
+import io
+import time
+import uuid
+
+
+class ORJSONRendererTests(TestCase):
+    """Tests for the orjson renderer and parser"""
+
+    def test_output_matches_drf_renderer(self):
+        """Test that values are rendered exactly like DRF's JSONRenderer"""
+        data = {
+            'id': 1,
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'date_of_birth': date(1990, 5, 17),
+            'created': datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            'naive': datetime(2024, 1, 2, 3, 4, 5),
+            'time': dt_time(10, 30, 15, 123456),
+            'duration': timedelta(minutes=90),
+            'price': Decimal('1234.50'),
+            'name': 'Caminhão São José',
+            'separators': 'line\u2028paragraph\u2029',
+            'nested': [{'a': None, 'b': True, 'c': 1.5}],
+            3: 'integer key',
+        }
+        expected = JSONRenderer().render(data)
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+
+    def test_indented_output_falls_back_to_drf(self):
+        """Test that indented output (browsable API) matches DRF's JSONRenderer"""
+        data = {'a': [1, 2], 'b': 'c'}
+        expected = JSONRenderer().render(data, 'application/json; indent=4')
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=4'), expected)
+
+    def test_parser(self):
+        """Test that request bodies are parsed and invalid JSON rejected"""
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"plate": "ÁBC-1234"}'.encode())), {'plate': 'ÁBC-1234'})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{invalid'))
+
+
+class ORJSONAPITests(APITestCase):
+    """Tests that the API speaks JSON through orjson"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='jsonuser',
+            email='json@example.com',
+            password='jsonpass123',
+            date_of_birth=date(1990, 5, 17)
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_response_and_request_bodies(self):
+        """Test rendering dates and parsing JSON request bodies end to end"""
+        response = self.client.get('/api/v1/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn(b'"date_of_birth":"1990-05-17"', response.content)
+
+        response = self.client.patch(
+            f'/api/v1/users/{self.user.id}/',
+            '{"first_name": "José"}',
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['first_name'], 'José')
+
+
+class DatabasePoolStatsTests(APITestCase):
+    """Tests for the connection pool statistics endpoint"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(username='pooladmin', email='pooladmin@example.com', is_admin=True)
+        self.user = User.objects.create_user(username='pooluser', email='pooluser@example.com')
+        self.url = reverse('db_pool_stats')
+
+    def authenticate(self, user):
+        """Authenticate the client with a JWT for the given user"""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_admin_sees_pool_stats(self):
+        """Test that admins get the pool size and usage of the worker"""
+        self.authenticate(self.admin_user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('pid', response.data)
+        if settings.DATABASES['default']['OPTIONS'].get('pool'):
+            self.assertEqual(response.data['pool']['pool_max'], settings.DATABASES['default']['OPTIONS']['pool']['max_size'])
+            self.assertIn('pool_available', response.data['pool'])
+
+    def test_regular_user_is_denied(self):
+        """Test that pool statistics are admin only"""
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class GCRAThrottleTests(TestCase):
+    """Tests for the GCRA rate limiter"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        reset_throttles()
+
+    def test_allows_burst_then_limits(self):
+        """Test that `limit` requests pass at once and the next one waits one interval"""
+        for _ in range(5):
+            self.assertEqual(gcra('throttle:test:burst', 5, 60), 0)
+        self.assertAlmostEqual(gcra('throttle:test:burst', 5, 60), 12, delta=0.1)
+        self.assertEqual(gcra('throttle:test:other', 5, 60), 0)
+
+    def test_concurrent_requests_share_one_budget(self):
+        """Test that the check and update are atomic under concurrency"""
+        allowed = []
+
+        def hit():
+            for _ in range(20):
+                allowed.append(gcra('throttle:test:concurrent', 50, 3600) == 0)
+
+        threads = [threading.Thread(target=hit) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(allowed), 50)
+
+    def test_one_redis_round_trip_per_check(self):
+        """Test that a check is a single EVALSHA"""
+        gcra('throttle:test:warm', 5, 60)  # Loads the script
+        client = get_redis_connection(settings.THROTTLE_CACHE)
+
+        def script_calls():
+            stats = client.info('commandstats')
+            return [stats.get(name, {}).get('calls', 0) for name in ('cmdstat_evalsha', 'cmdstat_eval')]
+
+        evalsha, eval_ = script_calls()
+        for _ in range(10):
+            gcra('throttle:test:round-trips', 5, 60)
+        self.assertEqual(script_calls(), [evalsha + 10, eval_])
+
+    def test_falls_back_to_process_when_redis_fails(self):
+        """Test that an unreachable Redis does not disable throttling"""
+        broken = mock.Mock(side_effect=ConnectionError('redis down'))
+        with mock.patch('fleetsecure.throttling._redis_script', return_value=broken):
+            for _ in range(3):
+                self.assertEqual(gcra('throttle:test:fallback', 3, 60), 0)
+            self.assertGreater(gcra('throttle:test:fallback', 3, 60), 0)
+
+    @override_settings(THROTTLE_CACHE='local')
+    def test_local_cache_limits_in_process(self):
+        """Test the in-process limiter used with a non-Redis throttle cache"""
+        for _ in range(3):
+            self.assertEqual(gcra('throttle:test:local', 3, 60), 0)
+        self.assertGreater(gcra('throttle:test:local', 3, 60), 0)
+        self.assertIsNone(get_redis_connection('default').get('throttle:test:local'))
+
+
+@mock.patch.object(GCRAThrottle, 'THROTTLE_RATES', {'login': '2/min', 'bulk': '1/hour', 'reads': '5/min', 'writes': '5/min'})
+class ThrottleScopeTests(APITestCase):
+    """Tests for the per-endpoint throttle scopes"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        reset_throttles()
+        reset_throttle_stats()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='throttled', email='throttled@example.com', password='throttlepass123')
+        self.login_url = reverse('token_obtain_pair')
+
+    def authenticate(self):
+        """Authenticate the client with a JWT"""
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_login_has_its_own_budget(self):
+        """Test that logins are limited per IP without touching the read budget"""
+        credentials = {'username': 'throttled', 'password': 'throttlepass123'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(self.login_url, credentials, format='json').status_code, status.HTTP_200_OK)
+
+        response = self.client.post(self.login_url, credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(throttle_stats(), {'login': 1})
+
+        self.authenticate()
+        self.assertEqual(self.client.get(reverse('user-me')).status_code, status.HTTP_200_OK)
+
+    def test_reads_writes_and_bulk_budgets(self):
+        """Test that reads, writes and bulk endpoints are counted separately"""
+        self.authenticate()
+        me_url = reverse('user-me')
+        for _ in range(5):
+            self.assertEqual(self.client.get(me_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(me_url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        export_url = reverse('truck-export')
+        self.assertEqual(self.client.get(export_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(export_url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        url = reverse('user-detail', kwargs={'pk': self.user.id})
+        self.assertEqual(self.client.patch(url, {'first_name': 'T'}, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(throttle_stats(), {'reads': 1, 'bulk': 1})
+
+    def test_read_write_throttle_is_fully_initialised(self):
+        """Test that the default throttle is usable before its first request and switches scope per method"""
+        throttle = ReadWriteRateThrottle()
+        self.assertEqual((throttle.scope, throttle.rate, throttle.num_requests, throttle.duration), ('reads', '5/min', 5, 60))
+
+        request = mock.Mock(method='POST', user=self.user)
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertEqual((throttle.scope, throttle.key), ('writes', f'throttle:writes:user:{self.user.pk}'))
+
+
+class RequestMetricsMiddlewareTests(APITestCase):
+    """Tests for the per-request instrumentation middleware"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='metrics', email='metrics@example.com', is_admin=True)
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def parse_server_timing(self, header):
+        """Return {metric: (duration, description)} from a Server-Timing header"""
+        metrics = {}
+        for entry in header.split(', '):
+            name, *params = entry.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            metrics[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+        return metrics
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_is_measured(self):
+        """Test that query count and timings reach the header and the log, keyed by view name"""
+        with self.assertLogs('fleetsecure.requests', level='INFO') as logs:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('user-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = self.parse_server_timing(response['Server-Timing'])
+        self.assertEqual(timing['db'][1], f'{len(context.captured_queries)} queries')
+        self.assertGreaterEqual(timing['total'][0], timing['db'][0] + timing['serializer'][0])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertEqual(record['view'], 'user-list')
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(context.captured_queries))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    async def test_sampled_async_request_is_measured(self):
+        """Test that the queries of an async view are counted under ASGI"""
+        truck = await Truck.objects.acreate(user=self.user, plate_number='MET-0001', model='Volvo FH', year=2021)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with self.assertLogs('fleetsecure.requests', level='INFO') as logs:
+            response = await self.async_client.get(reverse('truck-detail', kwargs={'pk': truck.pk}), headers=headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Server-Timing', response)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'truck-detail')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['serializer_ms'], 0)
+
+    def test_serializers_are_timed_only_in_views(self):
+        """Test that serializer timing does not patch DRF for the whole process"""
+        self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+        self.assertIs(type(UserSerializer(self.user)), UserSerializer)
+        view = UserViewSet(request=None, format_kwarg=None, action='retrieve')
+        self.assertIs(type(view.get_serializer(self.user)), UserSerializer)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_measured(self):
+        """Test that requests outside the sample carry no Server-Timing header"""
+        response = self.client.get(reverse('user-me'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+
+MULTIPROCESS_WORKER = """
+import django
+django.setup()
+from utils.metrics import REQUESTS
+REQUESTS.labels('truck-list', 'GET', 200).inc(3)
+"""
+
+MULTIPROCESS_SCRAPE = """
+import django
+django.setup()
+from utils.metrics import render_metrics
+print(render_metrics().decode())
+"""
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsEndpointTests(APITestCase):
+    """Tests for the Prometheus /metrics endpoint"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='metricsuser', email='metricsuser@example.com')
+        self.url = reverse('metrics')
+
+    def scrape(self):
+        """Fetch /metrics with the scrape token"""
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def sample(self, name, **labels):
+        """Return the current value of a sample in this process"""
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requires_token(self):
+        """Test that scrapes without the token are refused"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_disabled_without_token_in_production(self):
+        """Test that an unconfigured endpoint is not public outside DEBUG"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_request_latency_and_status_per_route(self):
+        """Test that requests are counted and timed by view name"""
+        before = self.sample('fleetsecure_request_duration_seconds_count', view='truck-list', method='GET')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.client.get(reverse('truck-list'))
+        self.client.credentials()
+
+        self.assertEqual(self.sample('fleetsecure_request_duration_seconds_count', view='truck-list', method='GET'), before + 1)
+        self.assertIn('fleetsecure_requests_total{method="GET",status="200",view="truck-list"}', self.scrape())
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    def test_queries_per_request(self):
+        """Test that sampled requests record their query count"""
+        before = self.sample('fleetsecure_request_db_queries_count', view='user-list')
+        admin = User.objects.create_user(username='metricsadmin', email='metricsadmin@example.com', is_admin=True)
+        self.client.force_authenticate(admin)
+        self.client.get(reverse('user-list'))
+
+        self.assertEqual(self.sample('fleetsecure_request_db_queries_count', view='user-list'), before + 1)
+        self.assertGreater(self.sample('fleetsecure_request_db_queries_sum', view='user-list'), 0)
+
+    def test_cache_and_auth_failure_counters(self):
+        """Test the response cache hit/miss and JWT failure counters"""
+        hits = self.sample('fleetsecure_response_cache_requests_total', view='truck', result='hit')
+        failures = self.sample('fleetsecure_jwt_auth_failures_total', reason='token_not_valid')
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.client.get(reverse('truck-list'), {'model': 'metrics'})
+        self.client.get(reverse('truck-list'), {'model': 'metrics'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get(reverse('truck-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertEqual(self.sample('fleetsecure_response_cache_requests_total', view='truck', result='hit'), hits + 1)
+        self.assertEqual(self.sample('fleetsecure_jwt_auth_failures_total', reason='token_not_valid'), failures + 1)
+        self.client.credentials()
+        output = self.scrape()
+        self.assertIn('fleetsecure_redis_keyspace_hits_total', output)
+        self.assertIn('fleetsecure_throttled_requests_total', output)
+
+    def test_multiprocess_aggregation(self):
+        """Test that samples written by separate worker processes are summed"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory, 'DJANGO_SETTINGS_MODULE': 'fleetsecure.settings'}
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', MULTIPROCESS_WORKER], env=env, check=True, cwd=settings.BASE_DIR)
+            output = subprocess.run(
+                [sys.executable, '-c', MULTIPROCESS_SCRAPE], env=env, check=True, cwd=settings.BASE_DIR,
+                capture_output=True, text=True,
+            ).stdout
+
+        self.assertIn('fleetsecure_requests_total{method="GET",status="200",view="truck-list"} 6.0', output)
+
+
+class StreamClient:
+    """Drives the ASGI app like a server would, for one event stream request"""
+
+    def __init__(self, token=None, method='GET', path=None, send_delay=0):
+        query = f'token={token}'.encode() if token else b''
+        self.scope = {
+            'type': 'http', 'method': method, 'path': path or settings.EVENTS_PATH,
+            'query_string': query, 'headers': [(b'origin', b'http://localhost:3000')],
+        }
+        self.received = asyncio.Queue()
+        self.messages = asyncio.Queue()
+        self.send_delay = send_delay
+        self.task = None
+
+    async def receive(self):
+        return await self.received.get()
+
+    async def send(self, message):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        await self.messages.put(message)
+
+    def start(self):
+        self.task = asyncio.ensure_future(application(self.scope, self.receive, self.send))
+        return self
+
+    async def next_message(self, timeout=2):
+        return await asyncio.wait_for(self.messages.get(), timeout)
+
+    async def next_chunk(self, timeout=2):
+        """Return the next non-keepalive body chunk"""
+        async with asyncio.timeout(timeout):
+            while True:
+                message = await self.messages.get()
+                if message['type'] == 'http.response.body' and not message['body'].startswith(b': keepalive'):
+                    return message['body']
+
+    async def disconnect(self):
+        await self.received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 2)
+
+
+@override_settings(EVENTS_HEARTBEAT=0.2)
+class EventStreamTests(TestCase):
+    """Tests for the server-sent change feed"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.admin_user = User.objects.create_user(username='feedadmin', email='feedadmin@example.com', is_admin=True)
+        self.user = User.objects.create_user(username='feeduser', email='feeduser@example.com')
+        self.other = User.objects.create_user(username='feedother', email='feedother@example.com')
+        self.truck = Truck.objects.create(user=self.user, plate_number='FEE-0001', model='DAF XF', year=2020)
+
+    def token(self, user):
+        """Return an access token for the given user"""
+        return str(AccessToken.for_user(user))
+
+    def run_async(self, scenario):
+        """Run a coroutine function on a fresh event loop, closing the broker afterwards"""
+        async def wrapped():
+            try:
+                await scenario()
+            finally:
+                await broker.close()
+        async_to_sync(wrapped)()
+
+    async def connect(self, user, **kwargs):
+        """Open a stream and wait for its first chunk"""
+        client = StreamClient(self.token(user), **kwargs).start()
+        start = await client.next_message()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertIn((b'access-control-allow-origin', b'http://localhost:3000'), start['headers'])
+        self.assertIn(b': connected', await client.next_chunk())
+        return client
+
+    async def wait_for_redis_subscription(self):
+        """Wait until the broker is subscribed to the channel"""
+        redis = _publisher()
+        for _ in range(200):
+            if dict(redis.pubsub_numsub(settings.EVENTS_CHANNEL)).get(settings.EVENTS_CHANNEL.encode()):
+                return
+            await asyncio.sleep(0.01)
+        self.fail('Broker did not subscribe to Redis')
+
+    def test_requires_valid_token(self):
+        """Test that streams without a valid access token are rejected"""
+        async def scenario():
+            for token in (None, 'not-a-jwt'):
+                client = StreamClient(token).start()
+                self.assertEqual((await client.next_message())['status'], 401)
+                await asyncio.wait_for(client.task, 2)
+            self.assertEqual(len(broker.subscribers), 0)
+        self.run_async(scenario)
+
+    def test_events_are_fanned_out_from_redis(self):
+        """Test that an event published on Redis reaches every connected client"""
+        async def scenario():
+            clients = [await self.connect(self.user), await self.connect(self.admin_user)]
+            await self.wait_for_redis_subscription()
+
+            _publish(json.dumps({'type': 'truck.updated', 'ids': [self.truck.id]}))
+            for client in clients:
+                chunk = await client.next_chunk()
+                self.assertEqual(
+                    chunk, f'event: truck.updated\ndata: {{"type":"truck.updated","ids":[{self.truck.id}]}}\n\n'.encode()
+                )
+            for client in clients:
+                await client.disconnect()
+            self.assertEqual(len(broker.subscribers), 0)
+        self.run_async(scenario)
+
+    def test_events_go_through_events_redis_url(self):
+        """Test that events are published and subscribed to on EVENTS_REDIS_URL, not the cache's Redis"""
+        with override_settings(EVENTS_REDIS_URL='redis://127.0.0.1:1/0'):
+            with self.assertLogs('fleetsecure.events', 'ERROR'):
+                _publish(json.dumps({'type': 'truck.updated', 'ids': [self.truck.id]}))
+
+        # Another database of the same server: pub/sub channels are server-wide
+        url = settings.EVENTS_REDIS_URL.rsplit('/', 1)[0] + '/3'
+        self.assertNotEqual(url, settings.CACHES['default']['LOCATION'])
+
+        async def scenario():
+            client = await self.connect(self.user)
+            await self.wait_for_redis_subscription()
+            _publish(json.dumps({'type': 'truck.deleted', 'ids': [self.truck.id]}))
+            self.assertIn(b'event: truck.deleted', await client.next_chunk())
+            await client.disconnect()
+
+        with override_settings(EVENTS_REDIS_URL=url):
+            self.run_async(scenario)
+            self.assertEqual(_publisher().connection_pool.connection_kwargs['db'], 3)
+
+    def test_user_events_follow_permissions(self):
+        """Test that users only see their own user events, admins see all of them"""
+        async def scenario():
+            user_client = await self.connect(self.user)
+            admin_client = await self.connect(self.admin_user)
+
+            broker.dispatch({'type': 'user.updated', 'ids': [self.other.id]})
+            broker.dispatch({'type': 'user.updated', 'ids': [self.user.id]})
+
+            self.assertIn(f'"ids":[{self.other.id}]'.encode(), await admin_client.next_chunk())
+            self.assertIn(f'"ids":[{self.user.id}]'.encode(), await admin_client.next_chunk())
+            self.assertIn(f'"ids":[{self.user.id}]'.encode(), await user_client.next_chunk())
+            await user_client.disconnect()
+            await admin_client.disconnect()
+        self.run_async(scenario)
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    def test_client_that_falls_behind_is_resynced_and_dropped(self):
+        """Test per-connection backpressure: a full queue ends that stream only"""
+        async def scenario():
+            slow = await self.connect(self.user)
+            fast = await self.connect(self.admin_user)
+            overflows = REGISTRY.get_sample_value('fleetsecure_event_overflows_total') or 0
+
+            # Both queues fill up before either stream gets to run
+            for year in range(5):
+                broker.dispatch({'type': 'truck.updated', 'ids': [year]})
+
+            self.assertEqual(await slow.next_chunk(), b'event: resync\ndata: {"type":"resync"}\n\n')
+            self.assertEqual(await slow.next_chunk(), b'')
+            await asyncio.wait_for(slow.task, 2)
+            self.assertEqual(await fast.next_chunk(), b'event: resync\ndata: {"type":"resync"}\n\n')
+            self.assertEqual(REGISTRY.get_sample_value('fleetsecure_event_overflows_total'), overflows + 2)
+            self.assertEqual(len(broker.subscribers), 0)
+        self.run_async(scenario)
+
+    @override_settings(EVENTS_SEND_TIMEOUT=0.05)
+    def test_client_that_does_not_read_is_dropped(self):
+        """Test that a send blocked longer than EVENTS_SEND_TIMEOUT ends the stream"""
+        async def scenario():
+            client = await self.connect(self.user)
+            client.send_delay = 1
+            broker.dispatch({'type': 'truck.updated', 'ids': [1]})
+            await asyncio.wait_for(client.task, 2)
+            self.assertEqual(len(broker.subscribers), 0)
+        self.run_async(scenario)
+
+    def test_stream_ends_when_token_expires(self):
+        """Test that clients must reconnect with a fresh access token"""
+        async def scenario():
+            token = AccessToken.for_user(self.user)
+            token.set_exp(lifetime=timedelta(seconds=1))
+            client = StreamClient(str(token)).start()
+            self.assertEqual((await client.next_message())['status'], 200)
+            await asyncio.wait_for(client.task, 3)
+        self.run_async(scenario)
+
+    @override_settings(EVENTS_HEARTBEAT=60)
+    def test_event_reaches_every_idle_subscriber(self):
+        """Test that one dispatch is delivered to every open stream (timed in benchmarks/)"""
+        subscribers = 200
+
+        async def scenario():
+            clients = [StreamClient(self.token(self.user)).start() for _ in range(subscribers)]
+            for client in clients:
+                await client.next_message(timeout=30)
+                await client.next_chunk()
+            self.assertEqual(len(broker.subscribers), subscribers)
+
+            broker.dispatch({'type': 'truck.created', 'ids': [1]})
+            for client in clients:
+                self.assertIn(b'truck.created', await client.next_chunk())
+
+            for client in clients:
+                await client.received.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(asyncio.gather(*(client.task for client in clients)), 10)
+            self.assertEqual(len(broker.subscribers), 0)
+        self.run_async(scenario)
+
+    def test_router_hands_other_requests_to_django(self):
+        """Test that only the feed path bypasses Django, and that shutdown closes the broker"""
+        django_app = mock.AsyncMock()
+        router = EventRouter(django_app)
+
+        async def scenario():
+            client = StreamClient(path='/api/v1/trucks/')
+            await router(client.scope, client.receive, client.send)
+            django_app.assert_awaited_once_with(client.scope, client.receive, client.send)
+
+            await self.connect(self.user)
+            lifespan = StreamClient()
+            lifespan.scope = {'type': 'lifespan'}
+            for message in ('lifespan.startup', 'lifespan.shutdown'):
+                await lifespan.received.put({'type': message})
+            await asyncio.wait_for(router(lifespan.scope, lifespan.receive, lifespan.send), 2)
+            self.assertEqual((await lifespan.next_message())['type'], 'lifespan.startup.complete')
+            self.assertEqual((await lifespan.next_message())['type'], 'lifespan.shutdown.complete')
+            self.assertIsNone(broker._task)
+        self.run_async(scenario)
+
+
+class ChangeEventPublishingTests(TestCase):
+    """Tests for the events published by writes"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.user = User.objects.create_user(username='pubuser', email='pubuser@example.com')
+
+    def published(self, write):
+        """Run `write` and return the events published once it commits"""
+        with mock.patch('fleetsecure.events._publish') as publish:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                write()
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        return [json.loads(call.args[0]) for call in publish.call_args_list]
+
+    def test_writes_publish_after_commit(self):
+        """Test that creates, updates and deletes are announced once committed"""
+        truck = Truck(user=self.user, plate_number='PUB-0001', model='DAF XF', year=2020)
+        self.assertEqual(self.published(truck.save), [{'type': 'truck.created', 'ids': [truck.id]}])
+
+        truck.year = 2021
+        self.assertEqual(self.published(truck.save), [{'type': 'truck.updated', 'ids': [truck.id]}])
+
+        truck_id, user_id = truck.id, self.user.id
+        self.assertEqual(self.published(self.user.delete), [
+            {'type': 'truck.deleted', 'ids': [truck_id]},
+            {'type': 'user.deleted', 'ids': [user_id]},
+        ])
+
+    def test_logins_are_not_announced(self):
+        """Test that last_login updates do not reach the feed"""
+        self.user.last_login = datetime.now(timezone.utc)
+        self.assertEqual(self.published(lambda: self.user.save(update_fields=['last_login'])), [])
+
+
+class GunicornConfigTests(TestCase):
+    """Tests for gunicorn.conf.py and its worker sizing"""
+
+    def load_config(self, **env):
+        """Return the settings of gunicorn.conf.py read with `env`"""
+        env = {'GUNICORN_PRELOAD': 'False', 'PROMETHEUS_MULTIPROC_DIR': '', **env}
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_cpu_count_honours_cgroup_quota(self):
+        """Test that a container CPU quota caps the CPU count"""
+        available = len(os.sched_getaffinity(0))
+        with tempfile.NamedTemporaryFile('w') as cpu_max:
+            cpu_max.write('150000 100000\n')
+            cpu_max.flush()
+            self.assertEqual(cpu_count(cpu_max.name), min(available, 2))
+        with tempfile.NamedTemporaryFile('w') as cpu_max:
+            cpu_max.write('max 100000\n')
+            cpu_max.flush()
+            self.assertEqual(cpu_count(cpu_max.name), available)
+        self.assertEqual(cpu_count('/nonexistent/cpu.max'), available)
+
+    def test_worker_classes(self):
+        """Test the app, worker class and default worker count of each worker model"""
+        with mock.patch('fleetsecure.server.cpu_count', return_value=4):
+            uvicorn = self.load_config(GUNICORN_WORKER_CLASS='uvicorn', GUNICORN_WORKERS='0')
+            gthread = self.load_config(GUNICORN_WORKER_CLASS='gthread', GUNICORN_WORKERS='0')
+            sync = self.load_config(GUNICORN_WORKER_CLASS='sync', GUNICORN_WORKERS='0')
+
+        self.assertEqual(uvicorn['worker_class'], 'uvicorn_worker.UvicornWorker')
+        self.assertEqual(uvicorn['wsgi_app'], 'fleetsecure.asgi:application')
+        self.assertEqual(uvicorn['workers'], 4)
+        self.assertEqual((gthread['wsgi_app'], gthread['workers'], gthread['threads']), ('fleetsecure.wsgi:application', 5, 4))
+        self.assertEqual((sync['wsgi_app'], sync['workers'], sync['threads']), ('fleetsecure.wsgi:application', 9, 1))
+
+        self.assertEqual(self.load_config(GUNICORN_WORKERS='3')['workers'], 3)
+        with self.assertRaises(ValueError):
+            self.load_config(GUNICORN_WORKER_CLASS='eventlet')
+
+    def test_child_exit_marks_worker_dead(self):
+        """Test that a dead worker's live gauges are dropped"""
+        with tempfile.TemporaryDirectory() as directory:
+            config = self.load_config(GUNICORN_WORKERS='1', PROMETHEUS_MULTIPROC_DIR=directory)
+            with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}), \
+                    mock.patch('prometheus_client.multiprocess.mark_process_dead') as mark_process_dead:
+                config['child_exit'](None, mock.Mock(pid=1234))
+        mark_process_dead.assert_called_once_with(1234)
+
+    def test_serves_requests(self):
+        """Test that gunicorn starts preloaded workers of each class from the config file"""
+        for worker_class in ('uvicorn', 'sync'):
+            with self.subTest(worker_class=worker_class), tempfile.TemporaryDirectory() as directory:
+                with socket.socket() as sock:
+                    sock.bind(('127.0.0.1', 0))
+                    port = sock.getsockname()[1]
+                env = {
+                    **os.environ, 'GUNICORN_WORKER_CLASS': worker_class, 'GUNICORN_WORKERS': '2',
+                    'GUNICORN_BIND': f'127.0.0.1:{port}', 'PROMETHEUS_MULTIPROC_DIR': directory,
+                }
+                server = subprocess.Popen(
+                    ['gunicorn'], cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                )
+                try:
+                    status_code = None
+                    for _ in range(100):
+                        try:
+                            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                            connection.request('GET', '/api/v1/users/me/', headers={'X-Forwarded-Proto': 'https'})
+                            status_code = connection.getresponse().status
+                            break
+                        except OSError:
+                            time.sleep(0.1)
+                    self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+                finally:
+                    server.terminate()
+                    log = server.communicate(timeout=30)[1].decode()
+                self.assertEqual(log.count('Booting worker'), 2)
+
+
+class ColdStartTests(TestCase):
+    """Tests for the serverless settings and the startup profile"""
+
+    SERVERLESS_SETTINGS = 'fleetsecure.settings_serverless'
+
+    # Wall time of a cold import of the WSGI app and URLconf, under -X importtime
+    COLD_START_BUDGET_MS = 600
+
+    # Loaded by the full settings, never needed to serve the API
+    UNUSED_MODULES = (
+        'users.admin', 'trucks.admin', 'django.contrib.sessions.middleware',
+        'storages', 'boto3', 'multiprocessing', 'concurrent.futures.process',
+    )
+
+    def import_app(self):
+        """Import the WSGI app with the serverless settings in a fresh interpreter; return its state"""
+        code = (
+            'import json, sys, fleetsecure.wsgi\n'
+            'from django.urls import get_resolver\n'
+            'print(json.dumps({"modules": [m for m in sys.argv[1:] if m in sys.modules],'
+            ' "routes": [str(p.pattern) for p in get_resolver().url_patterns]}))'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': self.SERVERLESS_SETTINGS}
+        result = subprocess.run(
+            [sys.executable, '-c', code, *self.UNUSED_MODULES],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout)
+
+    def test_serverless_settings_skip_unused_modules(self):
+        """Test that the serverless app loads neither the admin nor the storage and process pool modules"""
+        state = self.import_app()
+        self.assertEqual(state['modules'], [])
+        self.assertIn('api/v1/', state['routes'])
+        self.assertNotIn('admin/', state['routes'])
+
+    def test_cold_start_budget(self):
+        """Test that a cold start with the serverless settings stays within its budget"""
+        total = min(profile_import('fleetsecure.wsgi', self.SERVERLESS_SETTINGS)[0] for _ in range(3))
+        self.assertLess(total, self.COLD_START_BUDGET_MS)
+
+    def test_parse_importtime(self):
+        """Test that modules are attributed to their importer and grouped by package"""
+        modules = parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       300 |        300 |     yaml.reader',
+            'import time:       200 |        500 |   yaml',
+            'import time:       100 |        100 |   rest_framework.fields',
+            'import time:      1000 |       1600 | rest_framework.compat',
+        ])
+        self.assertEqual(modules, [
+            ('yaml.reader', 0.3, 0.3, 'yaml'),
+            ('yaml', 0.2, 0.5, 'rest_framework.compat'),
+            ('rest_framework.fields', 0.1, 0.1, 'rest_framework.compat'),
+            ('rest_framework.compat', 1.0, 1.6, None),
+        ])
+        packages = by_package(modules)
+        self.assertEqual([(p['package'], p['modules'], p['imported_by']) for p in packages], [
+            ('rest_framework', 2, None),
+            ('yaml', 2, 'rest_framework.compat'),
+        ])
+        self.assertAlmostEqual(packages[0]['ms'], 1.1)
+
+    def test_profile_startup_command(self):
+        """Test that the command reports the import time of the app"""
+        out = io.StringIO()
+        call_command('profile_startup', '--limit', '5', stdout=out)
+        output = out.getvalue()
+        self.assertIn('psycopg', output)
+        self.assertIn('fleetsecure.wsgi and the URLconf imported in', output)
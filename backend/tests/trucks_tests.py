@@ -1,11 +1,43 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import threading
+import time
+from base64 import b64encode
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from urllib import parse
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
-from trucks.models import Truck
-from users.models import User
-import json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from fleetsecure.asgi import application
+from fleetsecure.pagination import KeysetPagination
+from trucks import bulk_import, seeding
+from trucks.models import DeletedTruck, Truck
+from trucks.serializers import PLATE_NUMBER_TAKEN, TruckListSerializer, TruckSerializer
+from trucks.views import TruckViewSet
+from users.models import DeletedUser, User
+from utils import export
+from utils.cache import cache_stats, get_generations, reset_cache_stats
+from utils.sync import encode_token
+
 
 class TruckModelTests(TestCase):
     """Tests for the Truck model"""
@@ -169,7 +201,7 @@ class TruckAPITests(APITestCase):
         
         response = self.client.get(self.trucks_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)  # Should have 2 trucks
+        self.assertEqual(len(response.data['results']), 2)  # Should have 2 trucks
     
     def test_retrieve_truck(self):
         """Test for retrieving truck details"""
@@ -245,14 +277,14 @@ class TruckAPITests(APITestCase):
         # Filter trucks by user1
         response = self.client.get(f'{self.by_user_url}?user_id={self.user1.id}')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['plate_number'], 'ABC-1234')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['plate_number'], 'ABC-1234')
         
         # Filter trucks by user2
         response = self.client.get(f'{self.by_user_url}?user_id={self.user2.id}')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['plate_number'], 'DEF-5678')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['plate_number'], 'DEF-5678')
     
     def test_filter_trucks_by_year(self):
         """Test for filtering trucks by year"""
@@ -263,14 +295,14 @@ class TruckAPITests(APITestCase):
         # Filter trucks from year 2022
         response = self.client.get(f'{self.by_year_url}?year=2022')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['plate_number'], 'ABC-1234')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['plate_number'], 'ABC-1234')
         
         # Filter trucks from year 2023
         response = self.client.get(f'{self.by_year_url}?year=2023')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['plate_number'], 'DEF-5678')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['plate_number'], 'DEF-5678')
     
     def test_fail_filters_without_parameters(self):
         """Test to ensure filters fail when required parameters are not provided"""
@@ -304,6 +336,43 @@ class TruckAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('user', response.data)  # Error message should mention the user field
         
+    def test_create_truck_with_duplicate_plate(self):
+        """Test that plate numbers are unique regardless of case"""
+        tokens = self.get_tokens_for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        
+        data = {
+            'user': self.user1.id,
+            'plate_number': 'abc-1234',
+            'model': 'Scania S730',
+            'year': 2024
+        }
+        response = self.client.post(self.trucks_list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('plate_number', response.data)
+        
+        # Updating a truck keeps its own plate valid
+        response = self.client.patch(self.truck_detail_url, {'plate_number': 'abc-1234'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_concurrent_duplicate_plate_is_a_validation_error(self):
+        """Test that a duplicate inserted after the uniqueness check is still a 400"""
+        tokens = self.get_tokens_for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        data = {'user': self.user1.id, 'plate_number': 'abc-1234', 'model': 'Scania S730', 'year': 2024}
+
+        # Both requests pass the check before either inserts
+        with mock.patch.object(TruckSerializer, 'validate_plate_number', side_effect=lambda value: value):
+            response = self.client.post(self.trucks_list_url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['plate_number'], [PLATE_NUMBER_TAKEN])
+
+            other = Truck.objects.create(user=self.user1, plate_number='XYZ-0001', model='DAF XF', year=2020)
+            url = reverse('truck-detail', kwargs={'pk': other.id})
+            response = self.client.patch(url, {'plate_number': 'ABC-1234'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['plate_number'], [PLATE_NUMBER_TAKEN])
+        
     def test_filter_truck_with_nonexistent_user(self):
         """Test filtering trucks with a non-existent user ID"""
         # Authenticate as normal user
@@ -316,7 +385,7 @@ class TruckAPITests(APITestCase):
         
         # It should return an empty list, not an error
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
         
     def test_filter_truck_with_year_no_results(self):
         """Test filtering trucks with a year that has no trucks"""
@@ -330,4 +399,1202 @@ class TruckAPITests(APITestCase):
         
         # It should return an empty list, not an error
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+
+class TruckQueryBudgetTests(APITestCase):
+    """Tests that the truck read endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='budgetpass',
+            license_number='DRV-100',
+            is_active=True
+        )
+        tokens = self.get_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        # Warm the authentication cache so every measured request starts alike
+        self.client.get(reverse('user-me'))
+
+    def get_tokens_for_user(self, user):
+        """Get JWT tokens for a user"""
+        refresh = RefreshToken.for_user(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+
+    def create_trucks(self, count):
+        """Create trucks, each owned by a different driver"""
+        start = Truck.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(start, start + count):
+                driver = User.objects.create_user(
+                    username=f'driver{i}',
+                    email=f'driver{i}@example.com',
+                    license_number=f'DRV-{i:04d}'
+                )
+                Truck.objects.create(
+                    user=driver,
+                    plate_number=f'BGT-{i:04d}',
+                    model='Volvo FH16',
+                    year=2022
+                )
+
+    def count_queries(self, url):
+        """Run a GET request and return the number of queries it executed"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Test that list, by_user and by_year keep the same query count as rows grow"""
+        urls = [
+            reverse('truck-list'),
+            f"{reverse('truck-by-year')}?year=2022",
+        ]
+
+        self.create_trucks(2)
+        small = [self.count_queries(url) for url in urls]
+
+        self.create_trucks(20)
+        large = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(small, large)
+
+    def test_by_user_query_count_does_not_grow_with_rows(self):
+        """Test that by_user keeps the same query count as a driver's fleet grows"""
+        url = f"{reverse('truck-by-user')}?user_id={self.user.id}"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Truck.objects.create(user=self.user, plate_number='OWN-0000', model='Scania R450', year=2021)
+        small = self.count_queries(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(1, 20):
+                Truck.objects.create(user=self.user, plate_number=f'OWN-{i:04d}', model='Scania R450', year=2021)
+        large = self.count_queries(url)
+
+        self.assertEqual(small, large)
+
+
+class TruckPaginationTests(APITestCase):
+    """Tests for keyset pagination on the truck endpoints"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='pageuser',
+            email='page@example.com',
+            password='pagepass',
+            is_active=True
+        )
+        tokens = self.get_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+        # Few distinct years and names so the tiebreaker is exercised
+        drivers = [
+            User.objects.create_user(
+                username=f'pagedriver{i}',
+                email=f'pagedriver{i}@example.com',
+                first_name=['Ana', 'Bruno'][i % 2],
+                license_number=f'PG-{i}'
+            )
+            for i in range(3)
+        ]
+        self.trucks = [
+            Truck.objects.create(
+                user=drivers[i % 3],
+                plate_number=f'PAG-{i:04d}',
+                model='Volvo FH16',
+                year=2020 + i % 3
+            )
+            for i in range(11)
+        ]
+        self.trucks_list_url = reverse('truck-list')
+
+    def get_tokens_for_user(self, user):
+        """Get JWT tokens for a user"""
+        refresh = RefreshToken.for_user(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+
+    def collect_pages(self, url):
+        """Follow next links and return the ids of every page"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([truck['id'] for truck in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_pages_cover_every_truck_once(self):
+        """Test that following next links returns every truck exactly once"""
+        for ordering in ['', 'year', '-year', 'user__first_name', '-user__first_name,year']:
+            pages = self.collect_pages(f'{self.trucks_list_url}?page_size=4&ordering={ordering}')
+            ids = [truck_id for page in pages for truck_id in page]
+
+            self.assertEqual([len(page) for page in pages], [4, 4, 3])
+            self.assertCountEqual(ids, [truck.id for truck in self.trucks])
+
+    def test_pages_follow_requested_ordering(self):
+        """Test that pages are ordered by the requested field with id as tiebreaker, in the same direction"""
+        pages = self.collect_pages(f'{self.trucks_list_url}?page_size=4&ordering=-year')
+        ids = [truck_id for page in pages for truck_id in page]
+
+        expected = sorted(self.trucks, key=lambda truck: (-truck.year, -truck.id))
+        self.assertEqual(ids, [truck.id for truck in expected])
+
+        pages = self.collect_pages(f'{self.trucks_list_url}?page_size=4&ordering=year')
+        ids = [truck_id for page in pages for truck_id in page]
+        self.assertEqual(ids, [truck.id for truck in sorted(self.trucks, key=lambda truck: (truck.year, truck.id))])
+
+    def test_previous_link_returns_previous_page(self):
+        """Test that the previous link walks back to the same page"""
+        first = self.client.get(f'{self.trucks_list_url}?page_size=4&ordering=year')
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_page_size_is_bounded(self):
+        """Test that page_size cannot exceed the configured maximum"""
+        with mock.patch.object(KeysetPagination, 'max_page_size', 5):
+            response = self.client.get(f'{self.trucks_list_url}?page_size=1000')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.client.get(f'{self.trucks_list_url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_position(self):
+        """Test that a cursor position of the wrong type is rejected rather than sent to the database"""
+        for position in ('["x",1]', '[2021,"x"]', '[null,1]', '[{"a":1},1]'):
+            with self.subTest(position=position):
+                cursor = b64encode(parse.urlencode({'p': position}).encode('ascii')).decode('ascii')
+                response = self.client.get(self.trucks_list_url, {'ordering': 'year', 'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(str(response.data['detail']), 'Invalid cursor')
+
+        # Values are coerced to the field type, as in cursors built by hand
+        cursor = b64encode(parse.urlencode({'p': '["2021","0"]'}).encode('ascii')).decode('ascii')
+        response = self.client.get(self.trucks_list_url, {'ordering': 'year', 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(truck['year'] >= 2021 for truck in response.data['results']))
+
+    def test_no_count_query(self):
+        """Test that paginating does not issue a COUNT(*) query"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'{self.trucks_list_url}?page_size=4')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in context.captured_queries))
+
+
+class TruckResponseCacheTests(APITestCase):
+    """Tests for the cached truck read endpoints"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        reset_cache_stats()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='cachepass',
+            first_name='Cache',
+            license_number='DRV-200',
+            is_active=True
+        )
+        self.admin_user = User.objects.create_user(
+            username='cacheadmin',
+            email='cacheadmin@example.com',
+            password='adminpass',
+            is_admin=True
+        )
+        self.truck = Truck.objects.create(
+            user=self.user,
+            plate_number='CCH-0001',
+            model='Volvo FH16',
+            year=2022
+        )
+        self.trucks_list_url = reverse('truck-list')
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        """Authenticate the client with a JWT for the given user"""
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_repeated_read_is_served_from_cache(self):
+        """Test that the second identical read is a cache hit without truck queries"""
+        first = self.client.get(f'{self.trucks_list_url}?year=2022&model=Volvo FH16')
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(f'{self.trucks_list_url}?model=Volvo FH16&year=2022')
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(any('trucks_truck' in query['sql'] for query in context.captured_queries))
+        self.assertEqual(cache_stats()['truck'], {'hits': 1, 'misses': 1, 'not_modified': 0})
+
+    def test_truck_change_invalidates_cache(self):
+        """Test that saving or deleting a truck invalidates cached reads"""
+        detail_url = reverse('truck-detail', kwargs={'pk': self.truck.id})
+        self.client.get(detail_url)
+
+        self.truck.model = 'Scania R450'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.truck.save()
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['model'], 'Scania R450')
+
+        self.client.get(self.trucks_list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.truck.delete()
+        response = self.client.get(self.trucks_list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_user_change_invalidates_embedded_user_details(self):
+        """Test that changing the owner refreshes the cached user_details"""
+        detail_url = reverse('truck-detail', kwargs={'pk': self.truck.id})
+        self.client.get(detail_url)
+
+        self.user.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(detail_url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['user_details']['first_name'], 'Renamed')
+
+    def test_cache_is_invalidated_on_commit(self):
+        """Test that the generation only moves once the change commits"""
+        detail_url = reverse('truck-detail', kwargs={'pk': self.truck.id})
+        self.client.get(detail_url)
+        generation = get_generations(['trucks'])
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.truck.model = 'Scania R450'
+            self.truck.save()
+        # A read before the commit sees the old row and must not cache it under a new generation
+        self.assertEqual(get_generations(['trucks']), generation)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generations(['trucks']), generation)
+        self.assertEqual(self.client.get(detail_url)['X-Cache'], 'MISS')
+
+    def test_cache_is_scoped_by_permission(self):
+        """Test that admin and regular users do not share cached responses"""
+        self.client.get(self.trucks_list_url)
+
+        self.authenticate(self.admin_user)
+        response = self.client.get(self.trucks_list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+
+
+class TruckConditionalGetTests(APITestCase):
+    """Tests for ETag and Last-Modified validation of truck reads"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        reset_cache_stats()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(
+                username='etaguser',
+                email='etag@example.com',
+                password='etagpass',
+                license_number='DRV-300',
+            )
+            self.admin_user = User.objects.create_user(
+                username='etagadmin',
+                email='etagadmin@example.com',
+                password='adminpass',
+                is_admin=True
+            )
+            self.truck = Truck.objects.create(user=self.user, plate_number='ETG-0001', model='Volvo FH16', year=2021)
+        self.trucks_list_url = reverse('truck-list')
+        self.detail_url = reverse('truck-detail', kwargs={'pk': self.truck.id})
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_list_returns_304_without_queries_or_serialization(self):
+        """Test that a matching If-None-Match is answered before any truck query or serializer"""
+        # Once the second of the last change has ended
+        with mock.patch('utils.cache.time.time', return_value=time.time() + 1):
+            first = self.client.get(self.trucks_list_url, {'year': 2021})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+
+        with CaptureQueriesContext(connection) as context, \
+                mock.patch.object(TruckListSerializer, 'to_representation') as to_representation:
+            second = self.client.get(self.trucks_list_url, {'year': 2021}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(context.captured_queries), 0)
+        to_representation.assert_not_called()
+        self.assertEqual(cache_stats()['truck']['not_modified'], 1)
+
+    def test_changes_produce_a_new_etag(self):
+        """Test that saving a truck or its owner changes the validators"""
+        etag = self.client.get(self.detail_url)['ETag']
+
+        self.truck.year = 2022
+        with self.captureOnCommitCallbacks(execute=True):
+            self.truck.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['year'], 2022)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.user.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_details']['first_name'], 'Renamed')
+
+    def test_etag_depends_on_query_and_scope(self):
+        """Test that other filters and other permission scopes get their own validators"""
+        etag = self.client.get(self.trucks_list_url)['ETag']
+
+        response = self.client.get(self.trucks_list_url, {'year': 2021}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get(self.trucks_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        """Test Last-Modified validation when no ETag is sent"""
+        with mock.patch('utils.cache.time.time', return_value=time.time() + 1):
+            last_modified = self.client.get(self.trucks_list_url)['Last-Modified']
+            response = self.client.get(self.trucks_list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with mock.patch('utils.cache.time.time', return_value=time.time() + 10), \
+                self.captureOnCommitCallbacks(execute=True):
+            Truck.objects.create(user=self.user, plate_number='ETG-0002', model='DAF XF', year=2020)
+        response = self.client.get(self.trucks_list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_change_in_the_same_second_is_not_hidden(self):
+        """Test that Last-Modified is only sent, and If-Modified-Since only honoured, once its second has ended"""
+        second = int(time.time()) + 100
+        with mock.patch('utils.cache.time.time', return_value=second + 0.2), \
+                self.captureOnCommitCallbacks(execute=True):
+            Truck.objects.create(user=self.user, plate_number='ETG-0002', model='DAF XF', year=2020)
+        with mock.patch('utils.cache.time.time', return_value=second + 0.5):
+            response = self.client.get(self.trucks_list_url)
+            self.assertNotIn('Last-Modified', response)
+            self.assertIn('ETag', response)
+            response = self.client.get(self.trucks_list_url, HTTP_IF_MODIFIED_SINCE=http_date(second))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Made later in the same second as the first change
+        with mock.patch('utils.cache.time.time', return_value=second + 0.8), \
+                self.captureOnCommitCallbacks(execute=True):
+            Truck.objects.create(user=self.user, plate_number='ETG-0003', model='DAF XF', year=2020)
+        with mock.patch('utils.cache.time.time', return_value=second + 1.5):
+            response = self.client.get(self.trucks_list_url)
+            self.assertEqual(response['Last-Modified'], http_date(second))
+            self.assertEqual(len(response.data['results']), 3)
+            response = self.client.get(self.trucks_list_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unauthenticated_request_is_rejected_before_validation(self):
+        """Test that a valid ETag does not bypass authentication"""
+        etag = self.client.get(self.trucks_list_url)['ETag']
+
+        self.client.force_authenticate(None)
+        response = self.client.get(self.trucks_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncTruckReadTests(TestCase):
+    """Tests for the async truck reads served under ASGI"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='asyncowner',
+            email='asyncowner@example.com',
+            password='asyncpass',
+            license_number='DRV-ASYNC',
+        )
+        self.trucks = [
+            Truck.objects.create(user=self.user, plate_number=f'ASY-000{i}', model='Volvo FH16', year=2020 + i)
+            for i in range(3)
+        ]
+        self.detail_url = reverse('truck-detail', kwargs={'pk': self.trucks[0].id})
+        self.by_user_url = reverse('truck-by-user')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.client.defaults['HTTP_AUTHORIZATION'] = self.headers['Authorization']
+
+    async def test_async_reads_match_sync_reads(self):
+        """Test that ASGI requests use the async actions and answer like the sync ones"""
+        requests = [
+            (self.detail_url, {}),
+            (self.by_user_url, {'user_id': self.user.id}),
+            (self.by_user_url, {'user_id': self.user.id, 'page_size': 2, 'ordering': '-year'}),
+        ]
+        for url, params in requests:
+            await cache.aclear()
+            with mock.patch.object(TruckViewSet, 'retrieve') as retrieve, \
+                    mock.patch.object(TruckViewSet, 'by_user') as by_user:
+                response = await self.async_client.get(url, params, headers=self.headers)
+            retrieve.assert_not_called()
+            by_user.assert_not_called()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['X-Cache'], 'MISS')
+
+            await cache.aclear()
+            expected = await sync_to_async(self.client.get)(url, params)
+            self.assertEqual(response.json(), expected.json())
+            self.assertEqual(response['Content-Type'], expected['Content-Type'])
+
+    async def test_cursor_pages(self):
+        """Test that async pages chain through their cursors"""
+        plates = []
+        url, params = self.by_user_url, {'user_id': self.user.id, 'page_size': 2}
+        while url:
+            response = await self.async_client.get(url, params, headers=self.headers)
+            plates += [truck['plate_number'] for truck in response.json()['results']]
+            url, params = response.json()['next'], None
+        self.assertEqual(plates, [truck.plate_number for truck in self.trucks])
+
+    async def test_conditional_and_cached_reads(self):
+        """Test that async reads share the response cache and answer 304s"""
+        first = await self.async_client.get(self.detail_url, headers=self.headers)
+        second = await self.async_client.get(self.detail_url, headers=self.headers)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        not_modified = await self.async_client.get(
+            self.detail_url, headers={**self.headers, 'If-None-Match': first['ETag']},
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_errors(self):
+        """Test authentication, throttling, missing objects and bad parameters"""
+        response = await self.async_client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+        response = await self.async_client.get(self.detail_url, headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+        missing = reverse('truck-detail', kwargs={'pk': 999999})
+        response = await self.async_client.get(missing, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await self.async_client.get(self.by_user_url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch('fleetsecure.throttling.gcra', return_value=30):
+            response = await self.async_client.get(self.detail_url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+    async def test_writes_use_the_sync_view(self):
+        """Test that other methods on an async route are handed to the sync viewset"""
+        response = await self.async_client.patch(
+            self.detail_url, {'year': 2001}, content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        truck = await Truck.objects.aget(pk=self.trucks[0].id)
+        self.assertEqual(truck.year, 2001)
+
+
+class TruckBulkImportTests(APITestCase):
+    """Tests for the bulk truck import endpoint"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+
+        self.admin_user = User.objects.create_user(
+            username='importadmin',
+            email='importadmin@example.com',
+            password='admin123',
+            is_admin=True
+        )
+        self.driver = User.objects.create_user(
+            username='importdriver',
+            email='importdriver@example.com',
+            license_number='DRV-300',
+            is_active=True
+        )
+        self.inactive_user = User.objects.create_user(
+            username='importinactive',
+            email='importinactive@example.com',
+            license_number='DRV-301',
+            is_active=False
+        )
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.bulk_url = reverse('truck-bulk-create')
+
+    def upload(self, name, content, content_type):
+        """Post a file to the bulk import endpoint"""
+        upload = SimpleUploadedFile(name, content.encode('utf-8'), content_type=content_type)
+        return self.client.post(self.bulk_url, {'file': upload}, format='multipart')
+
+    def test_import_csv_with_row_errors(self):
+        """Test that valid CSV rows are created and invalid ones reported"""
+        content = (
+            'user,plate_number,model,year\n'
+            f'{self.driver.id},IMP-0001,Volvo FH16,2022\n'
+            f'{self.inactive_user.id},IMP-0002,Volvo FH16,2022\n'
+            '99999,IMP-0003,Volvo FH16,2022\n'
+            f'{self.driver.id},IMP-0004,Scania R450,not-a-year\n'
+            f'{self.driver.id},IMP-0005,Scania R450,2023\n'
+        )
+        response = self.upload('trucks.csv', content, 'text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 3)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 2, 3])
+        self.assertIn('user', response.data['errors'][1]['errors'])
+        self.assertCountEqual(
+            Truck.objects.values_list('plate_number', flat=True),
+            ['IMP-0001', 'IMP-0005']
+        )
+
+    def test_import_ndjson(self):
+        """Test importing trucks from an NDJSON file"""
+        lines = [
+            json.dumps({'user': self.driver.id, 'plate_number': f'NDJ-{i:04d}', 'model': 'Volvo FH16', 'year': 2021})
+            for i in range(5)
+        ]
+        lines.insert(2, '{not json')
+        response = self.upload('trucks.ndjson', '\n'.join(lines), 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['errors'], [{'row': 3, 'errors': {'non_field_errors': ['Invalid JSON']}}])
+        self.assertEqual(Truck.objects.filter(user=self.driver).count(), 5)
+
+    def test_users_are_resolved_once_per_batch(self):
+        """Test that the import does not query users per row"""
+        content = 'user,plate_number,model,year\n' + ''.join(
+            f'{self.driver.id},BLK-{i:04d},Volvo FH16,2022\n' for i in range(50)
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.upload('trucks.csv', content, 'text/csv')
+
+        self.assertEqual(response.data['created'], 50)
+        user_queries = [query for query in context.captured_queries if 'FROM "users_user"' in query['sql']]
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertLessEqual(len(user_queries), 2)  # authentication + one lookup
+        self.assertEqual(len(inserts), 1)
+
+    def test_import_reports_lines_that_are_not_utf8(self):
+        """Test that a line in another encoding is a row error rather than a server error"""
+        content = (
+            'user,plate_number,model,year\n'
+            f'{self.driver.id},ENC-0001,Volvo FH16,2022\n'
+            f'{self.driver.id},ENC-0002,Citroën Jumper,2022\n'
+            f'{self.driver.id},ENC-0003,Volvo FH16,2022\n'
+        ).encode('latin-1')
+        upload = SimpleUploadedFile('trucks.csv', content, content_type='text/csv')
+        response = self.client.post(self.bulk_url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            response.data['errors'], [{'row': 2, 'errors': {'non_field_errors': ['Line 3 is not valid UTF-8']}}]
+        )
+
+        lines = [
+            json.dumps({'user': self.driver.id, 'plate_number': 'ENC-0004', 'model': 'Volvo FH16', 'year': 2021}),
+            '{"model": "Citro\xebn"}',
+        ]
+        upload = SimpleUploadedFile('trucks.ndjson', '\n'.join(lines).encode('latin-1'))
+        response = self.client.post(self.bulk_url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            response.data['errors'], [{'row': 2, 'errors': {'non_field_errors': ['Line 2 is not valid UTF-8']}}]
+        )
+
+    def test_out_of_range_values_are_row_errors(self):
+        """Test that values the columns cannot hold are reported like in POST trucks/, not a 500"""
+        content = (
+            'user,plate_number,model,year\n'
+            f'{self.driver.id},RNG-0001,Volvo FH16,99999999999\n'
+            '99999999999999999999,RNG-0002,Volvo FH16,2022\n'
+            f'{self.driver.id},RNG-0003,Volvo FH16,2022\n'
+        )
+        response = self.upload('trucks.csv', content, 'text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['errors']['year'][0].code, 'max_value')
+        self.assertIn('user', response.data['errors'][1]['errors'])
+
+    def test_reported_errors_are_capped(self):
+        """Test that a file of bad rows lists a bounded number of errors but counts them all"""
+        content = 'user,plate_number,model,year\n' + 'x,BAD,Volvo FH16,2022\n' * 5
+        with mock.patch.object(bulk_import, 'MAX_REPORTED_ERRORS', 2):
+            response = self.upload('trucks.csv', content, 'text/csv')
+
+        self.assertEqual(response.data['failed'], 5)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+
+    def test_failed_import_still_invalidates_committed_batches(self):
+        """Test that batches committed before an error are not hidden by the cache or left unannounced"""
+        rows = [
+            (number, {'user': self.driver.id, 'plate_number': f'FIN-{number:04d}', 'model': 'DAF XF', 'year': 2020}, None)
+            for number in range(2, 6)
+        ]
+        import_batch = bulk_import._import_batch
+        calls = []
+
+        def failing_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('storage went away')
+            import_batch(*args)
+
+        before = get_generations(['trucks'])
+        with mock.patch.object(bulk_import, '_import_batch', failing_batch), \
+                mock.patch('trucks.bulk_import.publish_event') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                bulk_import.import_trucks(iter(rows), 2)
+
+        self.assertEqual(Truck.objects.filter(plate_number__startswith='FIN-').count(), 2)
+        self.assertNotEqual(get_generations(['trucks']), before)
+        publish.assert_called_once_with('truck', 'created')
+
+    def test_import_requires_supported_file(self):
+        """Test that a missing or unsupported file is rejected"""
+        response = self.client.post(self.bulk_url, {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.upload('trucks.xlsx', 'data', 'application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TruckExportTests(APITestCase):
+    """Tests for the streaming truck export"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+
+        self.driver = User.objects.create_user(
+            username='exportdriver',
+            email='exportdriver@example.com',
+            license_number='DRV-400',
+            is_active=True
+        )
+        for i in range(3):
+            Truck.objects.create(user=self.driver, plate_number=f'EXP-{i:04d}', model='Volvo FH16', year=2020 + i)
+        Truck.objects.create(user=self.driver, plate_number='EXP-SCAN', model='Scania R450', year=2020)
+
+        refresh = RefreshToken.for_user(self.driver)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.export_url = reverse('truck-export')
+
+    def test_export_csv_honors_filters_and_search(self):
+        """Test that the CSV export streams only the filtered trucks"""
+        response = self.client.get(f'{self.export_url}?year=2020&search=EXP-0')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'id,plate_number,model,year,user,user_username,user_license_number')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('EXP-0000,Volvo FH16,2020', lines[1])
+        self.assertTrue(lines[1].endswith('exportdriver,DRV-400'))
+
+    def test_export_ndjson(self):
+        """Test that the NDJSON export emits one object per truck"""
+        response = self.client.get(f'{self.export_url}?file_format=ndjson&ordering=-year')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['year'], 2022)
+        self.assertEqual(rows[0]['user'], self.driver.id)
+
+    def test_export_streams_incrementally_under_asgi(self):
+        """Test that the ASGI handler sends each chunk as it is read, not the whole export at the end"""
+        produced, bodies = [], []
+        chunked = export._chunked
+
+        def counted(lines, size):
+            for chunk in chunked(lines, size):
+                produced.append(chunk)
+                yield chunk
+
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # The client stays connected
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body'):
+                bodies.append((message['body'], len(produced)))
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': self.export_url, 'query_string': b'ordering=id',
+            'server': ('testserver', 80),
+            'headers': [(b'authorization', self.client._credentials['HTTP_AUTHORIZATION'].encode())],
+        }
+        # Like the test client, keep the handler from closing the test's connection
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with mock.patch.object(export, 'WRITE_ROWS', 1), mock.patch.object(export, '_chunked', counted), \
+                    override_settings(EXPORT_CHUNK_SIZE=2):
+                async_to_sync(application)(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        lines = b''.join(body for body, _ in bodies).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 5)
+        # Header and four rows, each sent before the next one was read
+        self.assertEqual([count for _, count in bodies], [1, 2, 3, 4, 5])
+
+    def test_export_rejects_unknown_format(self):
+        """Test that an unsupported export format is rejected"""
+        response = self.client.get(f'{self.export_url}?file_format=xlsx')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TruckIndexTests(TestCase):
+    """Tests that filter, search and ordering paths can use an index"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.user = User.objects.create_user(
+            username='indexuser',
+            email='index@example.com',
+            license_number='DRV-500'
+        )
+        Truck.objects.create(user=self.user, plate_number='IDX-0001', model='Volvo FH16', year=2022)
+
+    def explain(self, queryset):
+        """Return the query plan with sequential scans disabled"""
+        with connection.cursor() as cursor:
+            # Tiny test tables would otherwise always be scanned sequentially
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_plate_and_model_search_use_trigram_indexes(self):
+        """Test that icontains search on plate_number and model uses the GIN indexes"""
+        plan = self.explain(Truck.objects.filter(plate_number__icontains='dx-00'))
+        self.assertIn('truck_plate_trgm_idx', plan)
+
+        plan = self.explain(Truck.objects.filter(model__icontains='olvo'))
+        self.assertIn('truck_model_trgm_idx', plan)
+
+    def test_filters_and_ordering_use_btree_indexes(self):
+        """Test that year/model filters with id ordering use the composite indexes"""
+        plan = self.explain(Truck.objects.filter(year=2022).order_by('id'))
+        self.assertIn('truck_year_id_idx', plan)
+
+        plan = self.explain(Truck.objects.filter(model='Volvo FH16').order_by('id'))
+        self.assertIn('truck_model_id_idx', plan)
+
+        plan = self.explain(Truck.objects.filter(user=self.user).order_by('id'))
+        self.assertIn('truck_user_id_idx', plan)
+
+    def test_user_filters_use_indexes(self):
+        """Test that license_number and is_active lookups on users use an index"""
+        plan = self.explain(User.objects.filter(license_number='DRV-500'))
+        self.assertIn('user_license_number_idx', plan)
+
+        # A boolean index only pays off with realistic statistics
+        User.objects.bulk_create([
+            User(username=f'indexed{i}', email=f'indexed{i}@example.com', is_active=i % 50 != 0)
+            for i in range(500)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users_user')
+        plan = self.explain(User.objects.filter(is_active=False).order_by('id'))
+        self.assertIn('user_is_active_id_idx', plan)
+
+    def test_plate_lookup_uses_unique_index(self):
+        """Test that the case-insensitive plate lookup uses the unique index"""
+        plan = self.explain(Truck.objects.filter(plate_number__iexact='idx-0001'))
+        self.assertIn('truck_plate_number_unique', plan)
+
+
+
+class TruckDeltaSyncTests(APITransactionTestCase):
+    """Tests for trucks/changes/ (committed writes: a sync skips those of open transactions)"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username='syncowner',
+            email='syncowner@example.com',
+            password='syncpass',
+            first_name='Sync',
+            license_number='DRV-700'
+        )
+        self.trucks = [
+            Truck.objects.create(user=self.owner, plate_number=f'SYN-{i:04d}', model='Volvo FH16', year=2015 + i)
+            for i in range(5)
+        ]
+        self.changes_url = reverse('truck-changes')
+        self.client.force_authenticate(self.owner)
+
+    def sync(self, since=None, **params):
+        """Fetch one page of changes"""
+        if since:
+            params['since'] = since
+        response = self.client.get(self.changes_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def sync_all(self, since=None, **params):
+        """Follow has_more to the end; return changed ids, deleted ids, pages and the last token"""
+        changed, deleted, pages = [], [], 0
+        while True:
+            data = self.sync(since, **params)
+            changed += [row['id'] for row in data['changed']]
+            deleted += data['deleted']
+            pages += 1
+            since = data['next']
+            if not data['has_more']:
+                return changed, deleted, pages, since
+
+    def test_full_sync_then_nothing(self):
+        """Test that the first sync returns every truck and the next one nothing"""
+        data = self.sync()
+        self.assertEqual([row['id'] for row in data['changed']], [truck.id for truck in self.trucks])
+        self.assertEqual(data['changed'][0]['user_details']['username'], 'syncowner')
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+
+        data = self.sync(data['next'])
+        self.assertEqual((data['changed'], data['deleted']), ([], []))
+
+    def test_only_changes_since_token_are_returned(self):
+        """Test that inserts, updates and deletes after the token are reported, and nothing else"""
+        token = self.sync()['next']
+
+        self.trucks[1].year = 2024
+        self.trucks[1].save()
+        created = Truck.objects.create(user=self.owner, plate_number='SYN-0100', model='DAF XF', year=2023)
+        deleted_id = self.trucks[3].id
+        self.trucks[3].delete()
+
+        data = self.sync(token)
+        self.assertEqual([row['id'] for row in data['changed']], [self.trucks[1].id, created.id])
+        self.assertEqual(data['changed'][0]['year'], 2024)
+        self.assertEqual(data['deleted'], [deleted_id])
+
+    def test_user_deletion_cascades_tombstones(self):
+        """Test that trucks removed by deleting their owner are reported as deleted"""
+        token = self.sync()['next']
+        admin = User.objects.create_user(username='syncadmin', email='syncadmin@example.com', is_admin=True)
+
+        truck_ids = sorted(truck.id for truck in self.trucks)
+        with mock.patch('fleetsecure.events._publish') as publish, \
+                CaptureQueriesContext(connection) as context:
+            self.owner.delete()
+        self.assertEqual(DeletedTruck.objects.count(), 5)
+        # One tombstone insert and one event for all the trucks
+        inserts = [query for query in context.captured_queries if 'INSERT INTO "trucks_deletedtruck"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        truck_events = [json.loads(call.args[0]) for call in publish.call_args_list if 'truck.' in call.args[0]]
+        self.assertEqual(len(truck_events), 1)
+        self.assertEqual(sorted(truck_events[0]['ids']), truck_ids)
+
+        self.client.force_authenticate(admin)
+        data = self.sync(token)
+        self.assertEqual(sorted(data['deleted']), truck_ids)
+        self.assertEqual(data['changed'], [])
+
+    def test_owner_changes_are_reported_but_logins_are_not(self):
+        """Test that trucks embedding a renamed owner count as changed"""
+        token = self.sync()['next']
+
+        self.owner.last_login = timezone.now()
+        self.owner.save(update_fields=['last_login'])
+        self.assertEqual(self.sync(token)['changed'], [])
+
+        self.owner.first_name = 'Renamed'
+        self.owner.save()
+        data = self.sync(token)
+        self.assertEqual(len(data['changed']), 5)
+        self.assertEqual(data['changed'][0]['user_details']['first_name'], 'Renamed')
+
+    def test_bounded_pages(self):
+        """Test that paging returns every change exactly once"""
+        changed, deleted, pages, token = self.sync_all(page_size=2)
+        self.assertEqual(changed, [truck.id for truck in self.trucks])
+        self.assertEqual(pages, 3)
+
+        deleted_ids = [truck.id for truck in self.trucks[:3]]
+        for truck in self.trucks[:3]:
+            truck.delete()
+        changed, deleted, pages, token = self.sync_all(token, page_size=2)
+        self.assertEqual(changed, [])
+        self.assertEqual(deleted, deleted_ids)
+        self.assertEqual(pages, 2)
+
+    def test_late_commit_is_not_skipped(self):
+        """Test that a write committed after a later-timestamped one is reported once it commits"""
+        token = self.sync()['next']
+        written, commit = threading.Event(), threading.Event()
+
+        def slow_update():
+            try:
+                with transaction.atomic():
+                    Truck.objects.filter(pk=self.trucks[0].pk).update(year=2001, updated_at=timezone.now())
+                    written.set()
+                    commit.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_update)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(10))
+            self.trucks[1].year = 2002
+            self.trucks[1].save()
+            # Nothing past the open transaction is reported yet
+            data = self.sync(token)
+            self.assertEqual(data['changed'], [])
+        finally:
+            commit.set()
+            thread.join()
+
+        slow, fast = Truck.objects.filter(pk__in=[self.trucks[0].pk, self.trucks[1].pk]).order_by('id')
+        self.assertLess(slow.updated_at, fast.updated_at)
+        changed, _, _, _ = self.sync_all(data['next'])
+        self.assertEqual(changed, [slow.id, fast.id])
+
+    def test_invalid_and_expired_tokens(self):
+        """Test that a malformed token is a 400 and one older than the tombstones a 410"""
+        response = self.client.get(self.changes_url, {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        old = datetime.now(dt_timezone.utc) - timedelta(days=60)
+        response = self.client.get(self.changes_url, {'since': encode_token((0, 0), (0, 0), old)})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data['detail'].code, 'sync_token_expired')
+
+    def test_prune_tombstones(self):
+        """Test that only tombstones past the retention are pruned"""
+        old_id, recent_id = self.trucks[0].id, self.trucks[1].id
+        self.trucks[0].delete()
+        self.trucks[1].delete()
+        DeletedTruck.objects.filter(object_id=old_id).update(deleted_at=timezone.now() - timedelta(days=31))
+
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Removed 1 truck and 0 user tombstones', out.getvalue())
+        self.assertEqual(list(DeletedTruck.objects.values_list('object_id', flat=True)), [recent_id])
+
+    def test_sync_cost_scales_with_churn(self):
+        """Test that both streams are read by range scans on the (sync_xid, id) indexes"""
+        token = self.sync()['next']
+        with CaptureQueriesContext(connection) as context:
+            self.sync(token)
+        # The oldest running transaction, then one query per stream
+        self.assertEqual(len(context.captured_queries), 3)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Tiny test tables would otherwise always be scanned sequentially
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = Truck.objects.filter(
+                Q(sync_xid__gte=1) & (Q(sync_xid__gt=1) | Q(sync_xid=1, id__gt=0)), sync_xid__lt=10,
+            ).order_by('sync_xid', 'id')[:501].explain()
+            self.assertIn('truck_sync_xid_id_idx', plan)
+            plan = DeletedTruck.objects.filter(sync_xid__gte=1).order_by('sync_xid', 'id')[:501].explain()
+            self.assertIn('deleted_truck_xid_id_idx', plan)
+
+class TruckListSerializerTests(TestCase):
+    """Tests for the read-only fast path used by truck lists"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        owners = [
+            User.objects.create_user(
+                username='fastdriver',
+                email='fast@example.com',
+                first_name='Fast',
+                last_name='Driver',
+                cpf='123.456.789-00',
+                phone_number='11999990000',
+                date_of_birth=date(1985, 3, 9),
+                profile_picture='profile_pictures/fast.png',
+                license_number='DRV-600'
+            ),
+            User.objects.create_user(username='nolicense', email=''),
+            User.objects.create_user(username='onlylast', last_name='Silva', license_number='', is_admin=True),
+        ]
+        for i in range(300):
+            Truck.objects.create(
+                user=owners[i % 3],
+                plate_number=f'FST-{i:04d}',
+                model=['Volvo FH16', 'Scania R450', 'Mercedes Actros'][i % 3],
+                year=2015 + i % 10
+            )
+        self.request = Request(APIRequestFactory().get('/api/v1/trucks/'))
+
+    def render_both(self):
+        """Render the same trucks through both serializers"""
+        context = {'request': self.request}
+        trucks = list(Truck.objects.select_related('user').order_by('id'))
+        rows = list(Truck.objects.order_by('id').values(*TruckListSerializer.values_fields))
+        return trucks, rows, context
+
+    def test_output_is_byte_identical(self):
+        """Test that the fast path renders exactly the same JSON as TruckSerializer"""
+        trucks, rows, context = self.render_both()
+
+        expected = JSONRenderer().render(TruckSerializer(trucks, many=True, context=context).data)
+        actual = JSONRenderer().render(TruckListSerializer(rows, many=True, context=context).data)
+
+        self.assertEqual(actual, expected)
+
+
+class SeedFleetCommandTests(TestCase):
+    """Tests for the seed_fleet management command"""
+
+    def seed(self, **options):
+        """Run the command and return its output"""
+        out = StringIO()
+        call_command('seed_fleet', stdout=out, **options)
+        return out.getvalue()
+
+    def fleet(self):
+        """Seeded users and trucks, without ids and timestamps"""
+        users = list(
+            User.objects.filter(username__startswith='seed').order_by('id')
+            .values_list('username', 'cpf', 'license_number', 'first_name', 'is_active')
+        )
+        trucks = list(Truck.objects.order_by('id').values_list('user__username', 'plate_number', 'model', 'year'))
+        return users, trucks
+
+    def test_generates_valid_unique_rows(self):
+        """Test that CPFs, license numbers and plates are valid and unique"""
+        output = self.seed(users=2000, trucks=3000)
+
+        self.assertIn('Created 2000 users and 3000 trucks', output)
+        users = User.objects.filter(username__startswith='seed')
+        self.assertEqual(users.count(), 2000)
+        self.assertEqual(Truck.objects.count(), 3000)
+
+        cpfs = list(users.values_list('cpf', flat=True))
+        self.assertEqual(len(set(cpfs)), 2000)
+        for value in cpfs:
+            self.assertRegex(value, r'^\d{3}\.\d{3}\.\d{3}-\d{2}$')
+            digits = re.sub(r'\D', '', value)
+            self.assertEqual(seeding.cpf(int(digits[:9])), value)
+
+        licenses = list(users.exclude(license_number=None).values_list('license_number', flat=True))
+        self.assertEqual(len(set(licenses)), len(licenses))
+        self.assertTrue(0.6 < len(licenses) / 2000 < 0.8)
+        # Trucks belong to drivers
+        self.assertFalse(Truck.objects.filter(user__license_number=None).exists())
+
+        plates = list(Truck.objects.values_list('plate_number', flat=True))
+        self.assertEqual(len(set(plates)), 3000)
+        for value in plates:
+            self.assertRegex(value, r'^[A-Z]{3}(\d[A-Z]\d{2}|-\d{4})$')
+        self.assertTrue(all(
+            seeding.YEAR_MIN <= year <= seeding.YEAR_MAX for year in Truck.objects.values_list('year', flat=True)
+        ))
+
+    def test_same_seed_same_fleet(self):
+        """Test that a seed always generates the same rows and --clear replaces them"""
+        self.seed(users=300, trucks=300, seed=7)
+        first = self.fleet()
+
+        self.seed(users=300, trucks=300, seed=7, clear=True)
+        self.assertEqual(self.fleet(), first)
+
+        self.seed(users=300, trucks=300, seed=8, clear=True)
+        self.assertNotEqual(self.fleet(), first)
+
+    def test_clear_only_removes_seeded_rows(self):
+        """Test that --clear keeps accounts that merely start with the prefix, in a few set-based statements"""
+        real = User.objects.create_user(username='seedorf', email='seedorf@example.com', license_number='DRV-999')
+        Truck.objects.create(user=real, plate_number='REA-0001', model='DAF XF', year=2020)
+        self.seed(users=50, trucks=80)
+        user_ids = set(seeding.seeded_users('seed').values_list('id', flat=True))
+        RefreshToken.for_user(User.objects.get(username='seed0'))
+
+        with CaptureQueriesContext(connection) as context:
+            output = self.seed(users=50, trucks=80, clear=True)
+        self.assertIn('Deleted', output)
+        self.assertLess(len(context.captured_queries), 30)
+
+        self.assertEqual(User.objects.get(username='seedorf').trucks.count(), 1)
+        self.assertEqual(seeding.seeded_users('seed').count(), 50)
+        self.assertEqual(DeletedTruck.objects.count(), 80)
+        self.assertEqual(set(DeletedUser.objects.values_list('object_id', flat=True)), user_ids)
+
+    def test_password_is_hashed_once(self):
+        """Test that every user shares a single precomputed hash that verifies"""
+        with mock.patch('trucks.seeding.make_password', wraps=seeding.make_password) as make_password:
+            self.seed(users=500, trucks=0, password='seeded-pass')
+
+        make_password.assert_called_once_with('seeded-pass')
+        self.assertEqual(User.objects.filter(username__startswith='seed').values('password').distinct().count(), 1)
+        self.assertTrue(User.objects.get(username='seed0').check_password('seeded-pass'))
+
+    def test_conflicts_write_nothing(self):
+        """Test that conflicting rows abort the whole seed with a clear error"""
+        self.seed(users=100, trucks=100)
+
+        with self.assertRaisesMessage(CommandError, 'conflict with existing data'):
+            self.seed(users=200, trucks=100)
+        self.assertEqual(User.objects.filter(username__startswith='seed').count(), 100)
+        self.assertEqual(Truck.objects.count(), 100)
+
+    def test_seeding_invalidates_cached_lists(self):
+        """Test that the response cache does not hide rows inserted by COPY"""
+        admin = User.objects.create_user(username='cacheadmin', email='cacheadmin@example.com', is_admin=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertEqual(client.get(reverse('truck-list')).data['results'], [])
+
+        self.seed(users=10, trucks=5)
+        self.assertEqual(len(client.get(reverse('truck-list')).data['results']), 5)
@@ -1,11 +1,37 @@
 from django.test import TestCase
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from asgiref.sync import sync_to_async
 from users.models import User
 from trucks.models import Truck
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.test import override_settings
+from users.models import DeletedUser
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from fleetsecure.authentication import USER_CACHE_KEY, get_user_version, invalidate_cached_user, local_user_cache
+from fleetsecure import tokens
+from fleetsecure.tokens import RefreshToken as CachedRefreshToken, is_blacklisted
+from users.views import UserViewSet
+from utils import hashing
+from utils.hashing import SLOT_LEASE_MS, SLOTS_KEY, hashing_stats, reset_hashing_stats
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from datetime import timedelta
+from unittest import mock
+import io
 import json
+import threading
+import time
+import uuid
 
 class UserModelTests(TestCase):
     """Tests for the User model"""
@@ -166,7 +192,7 @@ class UserAPITests(APITestCase):
         
         response = self.client.get(self.users_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) >= 3)  # Should have at least the three created users
+        self.assertTrue(len(response.data['results']) >= 3)  # Should have at least the three created users
     
     def test_user_list_normal_user_denied(self):
         """Test for listing users (access denied for normal user)"""
@@ -341,3 +367,684 @@ class UserAPITests(APITestCase):
         self.assertIn('user_details', response.data)
         self.assertEqual(response.data['user_details']['username'], 'driver')
         self.assertEqual(response.data['user_details']['license_number'], 'DRV12345')
+
+    def test_user_export(self):
+        """Test streaming the user list as NDJSON (admin only)"""
+        url = reverse('user-export')
+
+        tokens = self.get_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        response = self.client.get(f'{url}?file_format=ndjson')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        tokens = self.get_tokens_for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        response = self.client.get(f'{url}?file_format=ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['admin', 'testuser', 'driver'])
+        self.assertNotIn('password', rows[0])
+
+
+class CachedAuthenticationTests(APITestCase):
+    """Tests for the cached JWT user lookup"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        local_user_cache.clear()
+        self.client = APIClient()
+
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='admin123',
+            is_admin=True
+        )
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        self.user_me_url = reverse('user-me')
+        self.user_tokens = self.get_tokens_for_user(self.user)
+        self.admin_tokens = self.get_tokens_for_user(self.admin_user)
+
+    def get_tokens_for_user(self, user):
+        """Get JWT tokens for a user"""
+        refresh = RefreshToken.for_user(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+
+    def get_me(self, tokens):
+        """Request /users/me/ with the given tokens"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        return self.client.get(self.user_me_url)
+
+    def test_repeated_requests_do_not_query_user(self):
+        """Test that authentication loads the user from the database only once"""
+        self.get_me(self.user_tokens)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_me(self.user_tokens)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'testuser')
+        # Only users/me/ reading the profile
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_shared_cache_is_used_when_local_cache_is_cold(self):
+        """Test that another process (empty local cache) reads the user from the shared cache"""
+        self.get_me(self.user_tokens)
+        local_user_cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_me(self.user_tokens)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_shared_cache_holds_no_password_hash(self):
+        """Test that only the fields authentication needs are cached"""
+        self.get_me(self.user_tokens)
+
+        key = USER_CACHE_KEY.format(self.user.pk, get_user_version(self.user.pk))
+        self.assertEqual(cache.get(key), {
+            'id': self.user.pk, 'username': 'testuser', 'is_active': True,
+            'is_staff': False, 'is_superuser': False, 'is_admin': False,
+        })
+        self.assertEqual(local_user_cache.get(str(self.user.pk)), cache.get(key))
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        """Test that deactivating a user invalidates its cached lookup"""
+        self.assertEqual(self.get_me(self.user_tokens).status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_tokens["access"]}')
+        url = reverse('user-deactivate', kwargs={'pk': self.user.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.get_me(self.user_tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        url = reverse('user-activate', kwargs={'pk': self.user.id})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_tokens["access"]}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.get_me(self.user_tokens).status_code, status.HTTP_200_OK)
+
+    def test_user_update_refreshes_cached_user(self):
+        """Test that updating a user is visible on the next authenticated request"""
+        self.get_me(self.user_tokens)
+
+        url = reverse('user-detail', kwargs={'pk': self.user.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'first_name': 'Changed'}, format='json')
+
+        response = self.get_me(self.user_tokens)
+        self.assertEqual(response.data['first_name'], 'Changed')
+
+    def test_cached_user_is_kept_until_commit(self):
+        """Test that the cached user is only dropped once the change commits"""
+        self.get_me(self.user_tokens)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.user.first_name = 'Changed'
+            self.user.save()
+        # A request reading before the commit would only cache the old row again
+        version = get_user_version(self.user.pk)
+        self.assertIsNotNone(local_user_cache.get(str(self.user.pk)))
+
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(local_user_cache.get(str(self.user.pk)))
+        self.assertNotEqual(get_user_version(self.user.pk), version)
+
+    def test_lookup_racing_a_change_does_not_cache_the_old_row(self):
+        """Test that a row read before a change committed is not stored back in the cache"""
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        def get(**kwargs):
+            # The deactivation commits while this lookup reads the old row
+            invalidate_cached_user(self.user.pk)
+            return stale
+
+        with mock.patch.object(User.objects, 'get', side_effect=get):
+            self.assertEqual(self.get_me(self.user_tokens).status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(local_user_cache.get(str(self.user.pk)))
+        self.assertEqual(self.get_me(self.user_tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+
+class UserConditionalGetTests(APITestCase):
+    """Tests for ETag and Last-Modified validation of user reads"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        local_user_cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_user = User.objects.create_user(
+                username='admin',
+                email='admin@example.com',
+                password='admin123',
+                is_admin=True
+            )
+            self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_unchanged_list_returns_304_without_queries(self):
+        """Test that polling an unchanged user list costs no database query"""
+        url = reverse('user-list')
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_update_changes_detail_validators(self):
+        """Test that a user update is not hidden by a stale ETag or Last-Modified"""
+        url = reverse('user-detail', kwargs={'pk': self.user.id})
+        # Once the second of the last change has ended
+        with mock.patch('utils.cache.time.time', return_value=time.time() + 1):
+            first = self.client.get(url)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, status.HTTP_304_NOT_MODIFIED
+        )
+
+        with mock.patch('utils.cache.time.time', return_value=time.time() + 10):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(url, {'first_name': 'Changed'}, format='json')
+        for headers in ({'HTTP_IF_NONE_MATCH': first['ETag']}, {'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}):
+            response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['first_name'], 'Changed')
+
+
+class AsyncUserReadTests(TestCase):
+    """Tests for users/me/ served by its async action under ASGI"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        local_user_cache.clear()
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='asyncme',
+            email='asyncme@example.com',
+            password='asyncpass',
+            first_name='Async',
+            last_name='Me',
+        )
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_me_matches_sync_view(self):
+        """Test that the async users/me/ answers like the sync one"""
+        with mock.patch.object(UserViewSet, 'me') as me:
+            response = await self.async_client.get(reverse('user-me'), headers=self.headers)
+        me.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected = await sync_to_async(self.client.get)(
+            reverse('user-me'), HTTP_AUTHORIZATION=self.headers['Authorization'],
+        )
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['full_name'], 'Async Me')
+
+    async def test_cached_user_needs_no_query(self):
+        """Test that users/me/ authenticates from the cache and only reads the profile"""
+        await self.async_client.get(reverse('user-me'), headers=self.headers)
+        with mock.patch.object(User.objects, 'aget', wraps=User.objects.aget) as aget:
+            response = await self.async_client.get(reverse('user-me'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aget.assert_called_once_with(pk=self.user.pk)
+
+    async def test_rejected_users(self):
+        """Test anonymous and deactivated users"""
+        response = await self.async_client.get(reverse('user-me'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = False
+        await self.user.asave()
+        response = await self.async_client.get(reverse('user-me'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'user_inactive')
+
+
+class UserDeltaSyncTests(APITransactionTestCase):
+    """Tests for users/changes/"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(username='admin', email='admin@example.com', is_admin=True)
+        self.user = User.objects.create_user(username='testuser', email='test@example.com')
+        self.changes_url = reverse('user-changes')
+
+    def test_admin_only(self):
+        """Test that regular users cannot read the user change feed"""
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.changes_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_updates_and_deletions_since_token(self):
+        """Test that the feed reports updated and deleted users after the token"""
+        self.client.force_authenticate(self.admin_user)
+        data = self.client.get(self.changes_url).data
+        self.assertEqual([row['username'] for row in data['changed']], ['admin', 'testuser'])
+
+        other = User.objects.create_user(username='other', email='other@example.com')
+        user_id = self.user.id
+        self.user.delete()
+        data = self.client.get(self.changes_url, {'since': data['next']}).data
+
+        self.assertEqual([row['username'] for row in data['changed']], ['other'])
+        self.assertEqual(data['changed'][0]['id'], other.id)
+        self.assertEqual(data['deleted'], [user_id])
+        self.assertTrue(DeletedUser.objects.filter(object_id=user_id).exists())
+
+class UserSignupTests(APITestCase):
+    """Tests for the user creation path and password hashing"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.client = APIClient()
+        self.users_list_url = reverse('user-list')
+
+    def signup_data(self, username):
+        """Build a valid signup payload"""
+        return {
+            'username': username,
+            'email': f'{username}@Example.COM',
+            'password': 'S3cure-pass!',
+            'password_confirm': 'S3cure-pass!',
+            'first_name': 'New',
+            'last_name': 'User',
+        }
+
+    def test_signup_hashes_once_and_writes_once(self):
+        """Test that signup computes a single hash and issues a single INSERT"""
+        hasher = get_hasher()
+        with mock.patch.object(type(hasher), 'encode', autospec=True, side_effect=type(hasher).encode) as encode:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(self.users_list_url, self.signup_data('newuser'), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(encode.call_count, 1)
+        writes = [q['sql'] for q in context.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1)
+
+        user = User.objects.get(username='newuser')
+        self.assertEqual(user.email, 'newuser@example.com')
+        self.assertTrue(user.password.startswith('argon2$argon2id$'))
+        self.assertTrue(user.check_password('S3cure-pass!'))
+
+    @override_settings(ARGON2_TIME_COST=1, ARGON2_MEMORY_COST=8192, ARGON2_PARALLELISM=2)
+    def test_argon2_parameters_come_from_settings(self):
+        """Test that the Argon2 cost parameters are configurable"""
+        encoded = make_password('S3cure-pass!')
+        self.assertIn('$m=8192,t=1,p=2$', encoded)
+        self.assertTrue(check_password('S3cure-pass!', encoded))
+
+    @override_settings(PASSWORD_HASHERS=['fleetsecure.hashers.TunedScryptPasswordHasher'], SCRYPT_WORK_FACTOR=2 ** 16)
+    def test_scrypt_hasher(self):
+        """Test that scrypt can be selected and tuned beyond OpenSSL's default memory limit"""
+        encoded = make_password('S3cure-pass!')
+        self.assertTrue(encoded.startswith(f'scrypt${2 ** 16}$'))
+        self.assertTrue(check_password('S3cure-pass!', encoded))
+
+    def test_legacy_pbkdf2_hash_is_upgraded_on_login(self):
+        """Test that existing PBKDF2 hashes still verify and are re-hashed with the preferred hasher"""
+        user = User.objects.create(username='legacy', password=make_password('S3cure-pass!', hasher='pbkdf2_sha256'))
+
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'legacy', 'password': 'S3cure-pass!'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$'))
+
+
+class PasswordHashingLimitTests(APITestCase):
+    """Tests for the concurrency limit on password hashing"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        cache.clear()
+        local_user_cache.clear()
+        reset_hashing_stats()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.login_url = reverse('token_obtain_pair')
+
+    def login(self, password='testpass123'):
+        """Post credentials to the login endpoint"""
+        return self.client.post(self.login_url, {'username': 'testuser', 'password': password}, format='json')
+
+    def take_slots(self, count, age_ms=0):
+        """Hold hashing slots the way other workers would, taken `age_ms` ago"""
+        client = get_redis_connection(settings.THROTTLE_CACHE)
+        taken_at = time.time() * 1000 - age_ms
+        client.zadd(SLOTS_KEY, {f'other-worker-{i}': taken_at for i in range(count)})
+
+    def test_login_hashes_under_the_limit(self):
+        """Test that login checks the password through the limiter"""
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('wrongpass').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(self.login_url, {'username': 'nobody', 'password': 'testpass123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        stats = hashing_stats()
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['shared_in_flight'], 0)
+
+    def test_change_password_uses_the_limit(self):
+        """Test that both hashes of a password change take a slot"""
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        url = reverse('user-change-password', kwargs={'pk': self.user.id})
+
+        response = self.client.post(url, {
+            'old_password': 'testpass123',
+            'new_password': 'N3w-secure-pass',
+            'new_password_confirm': 'N3w-secure-pass',
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(hashing_stats()['completed'], 2)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3w-secure-pass'))
+
+    @override_settings(PASSWORD_HASHING_QUEUE_TIMEOUT=0.05)
+    def test_limit_is_shared_between_workers(self):
+        """Test that slots held by other workers count against the limit, with a 503 beyond it"""
+        self.take_slots(settings.PASSWORD_HASHING_CONCURRENCY)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['detail'].code, 'hashing_unavailable')
+        self.assertEqual(hashing_stats()['rejected'], 1)
+
+    @override_settings(PASSWORD_HASHING_MAX_WAITING=0)
+    def test_callers_beyond_the_waiting_cap_are_rejected_at_once(self):
+        """Test that a full local queue turns logins away without waiting, with Retry-After"""
+        with mock.patch('utils.hashing._acquire') as acquire:
+            response = self.login()
+
+        acquire.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(hashing_stats()['waiting'], 0)
+
+    @override_settings(PASSWORD_HASHING_QUEUE_TIMEOUT=0.5)
+    def test_waiters_poll_redis_with_backoff(self):
+        """Test that a caller waiting for a slot asks Redis less and less often"""
+        self.take_slots(settings.PASSWORD_HASHING_CONCURRENCY)
+        script = hashing._acquire_script()
+
+        with mock.patch('utils.hashing._acquire_script', return_value=mock.Mock(wraps=script)) as acquire_script:
+            self.assertEqual(self.login().status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # 10, 20, 40, 80, 160 then 200 ms apart, against 50 calls at a fixed 10 ms
+        self.assertLessEqual(acquire_script.return_value.call_count, 8)
+
+    @override_settings(PASSWORD_HASHING_QUEUE_TIMEOUT=0.05)
+    def test_slots_of_dead_workers_are_taken_back(self):
+        """Test that a slot held past its lease no longer counts"""
+        self.take_slots(settings.PASSWORD_HASHING_CONCURRENCY, age_ms=SLOT_LEASE_MS + 1000)
+
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    @override_settings(THROTTLE_CACHE='local', PASSWORD_HASHING_QUEUE_TIMEOUT=0.01)
+    def test_limit_applies_per_process_without_redis(self):
+        """Test the in-process fallback when the shared cache is not Redis"""
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with mock.patch('utils.hashing._local_slots', slots):
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIsNone(hashing_stats()['shared_in_flight'])
+
+    def test_stats_endpoint(self):
+        """Test that admins can read the limit and the queue depth"""
+        admin = User.objects.create_user(username='admin', email='admin@example.com', is_admin=True)
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.take_slots(2)
+
+        response = self.client.get(reverse('password_hashing_stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hashing']['concurrency'], settings.PASSWORD_HASHING_CONCURRENCY)
+        self.assertEqual(response.data['hashing']['in_flight'], 0)
+        self.assertEqual(response.data['hashing']['shared_in_flight'], 2)
+
+
+class TokenHistoryMixin:
+    """Helpers to build and prune a token history"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        self.user = User.objects.create_user(username='testuser', email='test@example.com')
+
+    def add_history(self, count, expired=True):
+        """Insert `count` outstanding tokens, every other one blacklisted"""
+        now = timezone.now()
+        expires_at = now - timedelta(days=1) if expired else now + timedelta(days=1)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.user, jti=uuid.uuid4().hex, token='', created_at=now, expires_at=expires_at)
+            for _ in range(count)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[::2]])
+
+    def prune(self, **options):
+        """Run the command and return its output"""
+        out = io.StringIO()
+        call_command('prune_tokens', stdout=out, **options)
+        return out.getvalue()
+
+
+class TokenPruningTests(TokenHistoryMixin, TestCase):
+    """Tests for the prune_tokens management command"""
+
+    def test_prunes_only_expired_tokens_in_batches(self):
+        """Test that expired tokens are deleted in batches and live ones kept"""
+        self.add_history(250)
+        self.add_history(10, expired=False)
+
+        output = self.prune(batch_size=100)
+
+        self.assertIn('Removed 250 outstanding and 125 blacklisted tokens in 3 batches', output)
+        self.assertEqual(OutstandingToken.objects.count(), 10)
+        self.assertEqual(BlacklistedToken.objects.count(), 5)
+
+    def test_refreshed_tokens_stay_blacklisted_until_expiry(self):
+        """Test that a rotated refresh token is still rejected after pruning"""
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+
+        self.assertIn('Removed 0 outstanding', self.prune())
+        with self.assertRaises(TokenError):
+            RefreshToken(str(refresh))
+
+
+class TokenBlacklistCacheTests(APITestCase):
+    """Tests for the cached JWT blacklist"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        caches[settings.TOKEN_BLACKLIST_CACHE].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com')
+        self.refresh = CachedRefreshToken.for_user(self.user)
+
+    def refresh_token(self, token):
+        """Post a refresh token to auth/refresh/"""
+        return self.client.post(reverse('token_refresh'), {'refresh': str(token)}, format='json')
+
+    def test_rotated_refresh_token_is_rejected(self):
+        """Test that a refresh token cannot be reused after rotation"""
+        response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.refresh_token(response.data['refresh']).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.refresh_token(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_blacklists_token(self):
+        """Test that a logged out refresh token is rejected by refresh and verify"""
+        response = self.client.post(reverse('token_blacklist'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.refresh_token(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_verify'), {'token': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_blacklist_check_is_a_cache_hit(self):
+        """Test that blacklist lookups do not query the database once the cache is loaded"""
+        revoked = CachedRefreshToken.for_user(self.user)
+        revoked.blacklist()
+        is_blacklisted(self.refresh['jti'])  # Loads the cache
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_blacklisted(revoked['jti']))
+            self.assertFalse(is_blacklisted(self.refresh['jti']))
+            response = self.client.post(reverse('token_verify'), {'token': str(self.refresh)}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_cold_cache_is_reloaded_from_database(self):
+        """Test that revoked tokens survive losing the cache"""
+        self.refresh.blacklist()
+        caches[settings.TOKEN_BLACKLIST_CACHE].clear()
+
+        self.assertTrue(is_blacklisted(self.refresh['jti']))
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_blacklisted(self.refresh['jti']))
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_cache_outage_falls_back_to_database(self):
+        """Test that lookups use Postgres when the cache is unreachable"""
+        self.refresh.blacklist()
+        broken = mock.Mock(**{
+            'zmscore.side_effect': ConnectionError('cache down'),
+            'get.side_effect': ConnectionError('cache down'),
+        })
+
+        with mock.patch('fleetsecure.tokens._redis', return_value=broken), \
+                mock.patch('fleetsecure.tokens._cache', return_value=broken):
+            self.assertTrue(is_blacklisted(self.refresh['jti']))
+            self.assertFalse(is_blacklisted(CachedRefreshToken.for_user(self.user)['jti']))
+
+
+@override_settings(TOKEN_BLACKLIST_CACHE='local')
+class LocalTokenBlacklistCacheTests(TokenBlacklistCacheTests):
+    """Tests for the cached JWT blacklist on the in-process stand-in cache"""
+
+    def test_blacklist_check_is_a_cache_hit(self):
+        """Test that only revoked tokens are answered from the cache, which may evict any entry"""
+        revoked = CachedRefreshToken.for_user(self.user)
+        revoked.blacklist()
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_blacklisted(revoked['jti']))
+        self.assertEqual(len(context.captured_queries), 0)
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(is_blacklisted(self.refresh['jti']))
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_cold_cache_is_reloaded_from_database(self):
+        """Test that revoked tokens survive losing the cache"""
+        self.refresh.blacklist()
+        caches[settings.TOKEN_BLACKLIST_CACHE].clear()
+
+        self.assertTrue(is_blacklisted(self.refresh['jti']))
+
+
+class TokenBlacklistEvictionTests(APITestCase):
+    """Tests for the Redis blacklist set losing its contents"""
+
+    def setUp(self):
+        """Initial setup for tests"""
+        caches[settings.TOKEN_BLACKLIST_CACHE].clear()
+        self.redis = get_redis_connection(settings.TOKEN_BLACKLIST_CACHE)
+        self.user = User.objects.create_user(username='testuser', email='test@example.com')
+        self.revoked = CachedRefreshToken.for_user(self.user)
+        self.revoked.blacklist()
+        self.assertTrue(tokens.load_blacklist())
+
+    def test_evicted_set_falls_back_to_database(self):
+        """Test that a revoked token is still rejected once the set has been evicted"""
+        self.redis.delete(tokens.BLACKLIST_KEY)
+
+        with mock.patch.object(tokens, '_load_in_background') as load:
+            self.assertTrue(is_blacklisted(self.revoked['jti']))
+            self.assertFalse(is_blacklisted(CachedRefreshToken.for_user(self.user)['jti']))
+        load.assert_called()
+
+    def test_load_interrupted_by_eviction_is_not_marked_loaded(self):
+        """Test that a load losing its earlier chunks to an eviction does not mark the set loaded"""
+        finish = tokens._finish_load_script
+
+        def evict_then_finish(client):
+            client.delete(tokens.BLACKLIST_KEY)
+            return finish(client)
+
+        with mock.patch.object(tokens, '_finish_load_script', evict_then_finish):
+            self.assertFalse(tokens.load_blacklist())
+        self.assertIsNone(self.redis.zscore(tokens.BLACKLIST_KEY, tokens.LOADED))
+
+    def test_expired_tokens_are_dropped_from_the_set(self):
+        """Test that adding a revoked token drops the expired ones"""
+        expired = uuid.uuid4().hex
+        self.redis.zadd(tokens.BLACKLIST_KEY, {expired: time.time() - 1})
+
+        tokens.add_to_blacklist(uuid.uuid4().hex, timezone.now() + timedelta(hours=1))
+
+        self.assertIsNone(self.redis.zscore(tokens.BLACKLIST_KEY, expired))
+        self.assertIsNotNone(self.redis.zscore(tokens.BLACKLIST_KEY, tokens.LOADED))
+
+
+# The real loader, which tests/conftest.py replaces with an inline one
+load_in_background = tokens._load_in_background
+
+
+class TokenBlacklistBackgroundLoadTests(APITransactionTestCase):
+    """Tests for loading the blacklist set off the request path"""
+
+    def test_cold_cache_is_loaded_in_the_background(self):
+        """Test that a lookup on a cold cache reads one row and leaves the loading to a thread"""
+        user = User.objects.create_user(username='testuser', email='test@example.com')
+        revoked = CachedRefreshToken.for_user(user)
+        revoked.blacklist()
+        caches[settings.TOKEN_BLACKLIST_CACHE].clear()
+
+        with mock.patch.object(tokens, '_load_in_background', load_in_background), \
+                CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_blacklisted(revoked['jti']))
+        self.assertEqual(len(context.captured_queries), 1)
+
+        for thread in threading.enumerate():
+            if thread.name == 'jwt-blacklist-load':
+                thread.join(timeout=5)
+        active = CachedRefreshToken.for_user(user)
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_blacklisted(revoked['jti']))
+            self.assertFalse(is_blacklisted(active['jti']))
+        self.assertEqual(len(context.captured_queries), 0)
@@ -0,0 +1,172 @@
+"""
+Streaming bulk import of trucks from CSV or NDJSON uploads
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from users.models import User
+from fleetsecure.events import publish_event
+from utils.cache import bump_generation_on_commit
+from .models import Truck
+from .serializers import PLATE_NUMBER_TAKEN, TruckImportSerializer
+
+CSV_EXTENSIONS = ('.csv',)
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json')
+
+# Rows listed in `errors`; `failed` still counts every one
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(upload):
+    """Return 'csv' or 'ndjson' for an uploaded file, or None if unsupported"""
+    name = (upload.name or '').lower()
+    if name.endswith(CSV_EXTENSIONS) or upload.content_type == 'text/csv':
+        return 'csv'
+    if name.endswith(NDJSON_EXTENSIONS) or upload.content_type in NDJSON_CONTENT_TYPES:
+        return 'ndjson'
+    return None
+
+
+def read_rows(upload, file_format):
+    """
+    Yield `(row_number, row, error)` for each record of the upload.
+
+    The file is decoded line by line, so memory does not grow with its size.
+    A line that is not UTF-8 is reported as a failed row of its own.
+    """
+    undecodable = []
+    lines = _decode_lines(upload, undecodable)
+    number = 0
+    if file_format == 'csv':
+        for row in csv.DictReader(lines):
+            for number, error in _decode_errors(undecodable, number):
+                yield number, None, error
+            number += 1
+            yield number, row, None
+        for number, error in _decode_errors(undecodable, number):
+            yield number, None, error
+        return
+
+    for line in lines:
+        for number, error in _decode_errors(undecodable, number):
+            yield number, None, error
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, {"non_field_errors": ["Invalid JSON"]}
+            continue
+        if not isinstance(row, dict):
+            yield number, None, {"non_field_errors": ["Expected a JSON object"]}
+            continue
+        yield number, row, None
+
+
+def _decode_lines(upload, undecodable):
+    """Decode the upload line by line, replacing a line that is not UTF-8 by a blank one"""
+    for line_number, line in enumerate(upload, start=1):
+        try:
+            yield line.decode('utf-8-sig' if line_number == 1 else 'utf-8')
+        except UnicodeDecodeError:
+            undecodable.append(line_number)
+            # Skipped by both readers
+            yield '\n'
+
+
+def _decode_errors(undecodable, number):
+    """Yield `(row_number, error)` for the lines found undecodable so far"""
+    while undecodable:
+        number += 1
+        yield number, {"non_field_errors": [f"Line {undecodable.pop(0)} is not valid UTF-8"]}
+
+
+def import_trucks(rows, batch_size):
+    """
+    Validate and insert trucks in `bulk_create` batches, each committed on its own.
+
+    Invalid rows are reported and skipped; they never abort the import.
+    Short transactions keep a large import from holding back delta sync,
+    which only reads up to the oldest transaction still running.
+    """
+    result = {"created": 0, "failed": 0, "errors": []}
+    validator = TruckImportSerializer()
+    users = {}
+
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                _import_batch(batch, validator, users, result)
+    finally:
+        # Also when a later batch fails: the earlier ones are committed
+        if result["created"]:
+            # bulk_create does not send post_save
+            bump_generation_on_commit('trucks')
+            # Too many ids to list: subscribers resync
+            publish_event('truck', 'created')
+    return result
+
+
+def _import_batch(batch, validator, users, result):
+    valid = []
+    for number, row, error in batch:
+        if error is None:
+            try:
+                valid.append((number, validator.run_validation(row)))
+                continue
+            except serializers.ValidationError as exc:
+                error = exc.detail
+        _add_error(result, number, error)
+
+    # Resolve every user referenced by the batch in a single query
+    missing = {data['user'] for _, data in valid} - users.keys()
+    if missing:
+        users.update(User.objects.filter(pk__in=missing).values_list('pk', 'is_active'))
+
+    pending = []
+    for number, data in valid:
+        is_active = users.get(data['user'])
+        if is_active is None:
+            _add_error(result, number, {"user": ["User not found"]})
+        elif not is_active:
+            _add_error(result, number, {"user": "Cannot assign truck to inactive user"})
+        else:
+            pending.append((number, Truck(
+                user_id=data['user'],
+                plate_number=data['plate_number'],
+                model=data['model'],
+                year=data['year'],
+            )))
+
+    if not pending:
+        return
+    try:
+        with transaction.atomic():
+            Truck.objects.bulk_create([truck for _, truck in pending])
+        result["created"] += len(pending)
+    except IntegrityError:
+        # Find the offending rows one by one, keeping the rest of the batch
+        for number, truck in pending:
+            try:
+                with transaction.atomic():
+                    Truck.objects.bulk_create([truck])
+                result["created"] += 1
+            except IntegrityError as exc:
+                if 'truck_plate_number_unique' in str(exc):
+                    _add_error(result, number, {"plate_number": [PLATE_NUMBER_TAKEN]})
+                else:
+                    _add_error(result, number, {"non_field_errors": [str(exc).strip()]})
+
+
+def _add_error(result, number, errors):
+    result["failed"] += 1
+    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+        result["errors"].append({"row": number, "errors": errors})
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from utils.startup import by_package, profile_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Import the app and its URLconf in a fresh interpreter, as on a cold "
+        "start, and report where the import time goes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module', default='fleetsecure.wsgi',
+            help='Entry point to import (fleetsecure.wsgi or fleetsecure.asgi)',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=15,
+            help='Packages and modules listed',
+        )
+
+    def handle(self, *args, **options):
+        # The child inherits DJANGO_SETTINGS_MODULE, so --settings applies to it too
+        total, modules = profile_import(options['module'])
+        limit = options['limit']
+
+        self.stdout.write(f'{"package":<28} {"self ms":>8} {"modules":>8}  imported by')
+        for entry in by_package(modules)[:limit]:
+            self.stdout.write(
+                f'{entry["package"]:<28} {entry["ms"]:>8.1f} {entry["modules"]:>8}  {entry["imported_by"] or "-"}'
+            )
+
+        self.stdout.write(f'\n{"module":<48} {"self ms":>8} {"cumul ms":>9}')
+        for name, self_ms, cumulative_ms, _ in sorted(modules, key=lambda module: module[1], reverse=True)[:limit]:
+            self.stdout.write(f'{name:<48} {self_ms:>8.1f} {cumulative_ms:>9.1f}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{options["module"]} and the URLconf imported in {total:.0f} ms ({len(modules)} modules)'
+        ))
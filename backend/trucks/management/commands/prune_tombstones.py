@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from trucks.models import DeletedTruck
+from users.models import DeletedUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete delta sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS "
+        "in small batches, each in its own short transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE,
+            help='Tombstones deleted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        removed = {model: self.prune(model, cutoff, options['batch_size']) for model in (DeletedTruck, DeletedUser)}
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed[DeletedTruck]} truck and {removed[DeletedUser]} user tombstones '
+            f'({time.monotonic() - start:.2f}s)'
+        ))
+
+    def prune(self, model, cutoff, batch_size):
+        removed = 0
+        while True:
+            with transaction.atomic():
+                # Tombstones are inserted in deleted_at order, so the oldest ids come first
+                ids = list(
+                    model.objects.filter(deleted_at__lt=cutoff)
+                    .order_by('deleted_at', 'id')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    return removed
+                removed += model.objects.filter(id__in=ids).delete()[0]
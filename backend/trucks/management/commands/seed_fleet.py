@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from trucks.seeding import DEFAULT_PASSWORD, DEFAULT_SEED, clear_fleet, seed_fleet
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic fleet of users and trucks for load tests. "
+        "The same seed always produces the same rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to create')
+        parser.add_argument('--trucks', type=int, default=1000, help='Trucks to create')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+        parser.add_argument(
+            '--password', default=DEFAULT_PASSWORD,
+            help='Password of every generated user (hashed once)',
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Username prefix of the generated users (<prefix><n>)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per INSERT when COPY is not available',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete the users (and trucks) previously generated with the same prefix first',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 0 or options['trucks'] < 0:
+            raise CommandError('--users and --trucks cannot be negative')
+        if options['trucks'] and not options['users']:
+            raise CommandError('Trucks need at least one user to own them')
+
+        start = time.monotonic()
+        if options['clear']:
+            deleted = clear_fleet(options['prefix'])
+            self.stdout.write(f'Deleted {deleted} rows seeded with prefix "{options["prefix"]}"')
+
+        try:
+            seed_fleet(
+                options['users'], options['trucks'], seed=options['seed'], password=options['password'],
+                prefix=options['prefix'], batch_size=options['batch_size'],
+            )
+        except IntegrityError as exc:
+            raise CommandError(
+                f'Generated rows conflict with existing data, nothing was written '
+                f'(use --clear or another --prefix/--seed): {exc}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["users"]} users and {options["trucks"]} trucks '
+            f'({time.monotonic() - start:.2f}s)'
+        ))
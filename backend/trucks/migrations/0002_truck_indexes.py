@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:30
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+def report_duplicate_plates(apps, schema_editor):
+    """Stop before the unique index with the plates to fix, rather than an IntegrityError midway"""
+    Truck = apps.get_model('trucks', 'Truck')
+    duplicates = list(
+        Truck.objects.values(plate=django.db.models.functions.text.Upper('plate_number'))
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+        .values_list('plate', 'count')[:50]
+    )
+    if duplicates:
+        listed = ', '.join(f'{plate} ({count} trucks)' for plate, count in duplicates)
+        raise RuntimeError(
+            f'Plate numbers are not unique (ignoring case): {listed}. '
+            'Rename or delete the duplicates and run the migration again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently so the table stays writable
+    atomic = False
+
+    dependencies = [
+        ('trucks', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # First: a failure after an index was built would leave it behind for the rerun
+        migrations.RunPython(report_duplicate_plates, migrations.RunPython.noop),
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=models.Index(fields=['year', 'id'], name='truck_year_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=models.Index(fields=['model', 'id'], name='truck_model_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=models.Index(fields=['user', 'id'], name='truck_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('plate_number'), name='gin_trgm_ops'), name='truck_plate_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('model'), name='gin_trgm_ops'), name='truck_model_trgm_idx'),
+        ),
+        # The unique constraint is a unique index: built concurrently, then
+        # recorded as the constraint without touching the table again
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    [
+                        # Left INVALID by an interrupted build
+                        'DROP INDEX CONCURRENTLY IF EXISTS "truck_plate_number_unique"',
+                        'CREATE UNIQUE INDEX CONCURRENTLY "truck_plate_number_unique" '
+                        'ON "trucks_truck" (UPPER("plate_number"))',
+                    ],
+                    'DROP INDEX CONCURRENTLY IF EXISTS "truck_plate_number_unique"',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='truck',
+                    constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('plate_number'), name='truck_plate_number_unique'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trucks', '0002_truck_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='truck',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
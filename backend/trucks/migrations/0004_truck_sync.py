@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:22
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # The (updated_at, id) index is built concurrently so the table stays writable
+    atomic = False
+
+    dependencies = [
+        ('trucks', '0003_truck_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedTruck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=models.Index(fields=['updated_at', 'id'], name='truck_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedtruck',
+            index=models.Index(fields=['deleted_at', 'id'], name='deleted_truck_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+# sync_xid is the transaction that last changed updated_at (or inserted the
+# row). Delta sync reads it up to the oldest transaction still running, so
+# it follows commit order where timestamps do not.
+SYNC_XID_TRIGGERS = """
+CREATE FUNCTION trucks_set_sync_xid() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.sync_xid := pg_current_xact_id()::text::bigint;
+    ELSIF NEW.updated_at IS DISTINCT FROM OLD.updated_at THEN
+        NEW.sync_xid := pg_current_xact_id()::text::bigint;
+    ELSE
+        NEW.sync_xid := OLD.sync_xid;
+    END IF;
+    RETURN NEW;
+END
+$$;
+CREATE TRIGGER trucks_truck_sync_xid BEFORE INSERT OR UPDATE ON trucks_truck
+    FOR EACH ROW EXECUTE FUNCTION trucks_set_sync_xid();
+CREATE TRIGGER trucks_deletedtruck_sync_xid BEFORE INSERT ON trucks_deletedtruck
+    FOR EACH ROW EXECUTE FUNCTION trucks_set_sync_xid();
+"""
+
+DROP_SYNC_XID_TRIGGERS = """
+DROP TRIGGER trucks_deletedtruck_sync_xid ON trucks_deletedtruck;
+DROP TRIGGER trucks_truck_sync_xid ON trucks_truck;
+DROP FUNCTION trucks_set_sync_xid();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are built concurrently so the table stays writable
+    atomic = False
+
+    dependencies = [
+        ('trucks', '0004_truck_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='truck',
+            name='sync_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deletedtruck',
+            name='sync_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(SYNC_XID_TRIGGERS, DROP_SYNC_XID_TRIGGERS),
+        AddIndexConcurrently(
+            model_name='truck',
+            index=models.Index(fields=['sync_xid', 'id'], name='truck_sync_xid_id_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='truck',
+            name='truck_updated_at_id_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='deletedtruck',
+            index=models.Index(fields=['sync_xid', 'id'], name='deleted_truck_xid_id_idx'),
+        ),
+    ]
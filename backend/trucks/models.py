@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from users.models import User
 
 class Truck(models.Model):
@@ -6,6 +8,41 @@ class Truck(models.Model):
     plate_number = models.CharField(max_length=10)
     model = models.CharField(max_length=50)
     year = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+    # Transaction that last changed updated_at, set by a trigger (delta sync)
+    sync_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Filters and orderings of TruckViewSet, with id as pagination tiebreaker
+            models.Index(fields=['year', 'id'], name='truck_year_id_idx'),
+            models.Index(fields=['model', 'id'], name='truck_model_id_idx'),
+            models.Index(fields=['user', 'id'], name='truck_user_id_idx'),
+            # Delta sync (trucks/changes/)
+            models.Index(fields=['sync_xid', 'id'], name='truck_sync_xid_id_idx'),
+            # icontains compiles to UPPER(col) LIKE UPPER('%term%')
+            GinIndex(OpClass(Upper('plate_number'), name='gin_trgm_ops'), name='truck_plate_trgm_idx'),
+            GinIndex(OpClass(Upper('model'), name='gin_trgm_ops'), name='truck_model_trgm_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(Upper('plate_number'), name='truck_plate_number_unique'),
+        ]
 
     def __str__(self):
         return f"{self.model} - {self.plate_number}"
+
+
+
+class DeletedTruck(models.Model):
+    """Tombstone of a deleted truck, reported by trucks/changes/"""
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    # Transaction that deleted the truck, set by a trigger
+    sync_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sync_xid', 'id'], name='deleted_truck_xid_id_idx'),
+            # prune_tombstones
+            models.Index(fields=['deleted_at', 'id'], name='deleted_truck_at_id_idx'),
+        ]
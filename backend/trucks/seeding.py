@@ -0,0 +1,256 @@
+"""
+Synthetic fleets (users and trucks) for load tests and benchmarks.
+
+Rows are streamed with COPY on PostgreSQL (batched bulk_create elsewhere),
+every user shares one precomputed password hash, and the same seed always
+produces the same fleet.
+"""
+import random
+import re
+from datetime import date, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+from fleetsecure.events import publish_event
+from users.models import DeletedUser, User
+from utils.cache import bump_generation
+from .models import DeletedTruck, Truck
+
+DEFAULT_SEED = 20240101
+DEFAULT_PASSWORD = 'fleet-pass-123'
+
+FIRST_NAMES = [
+    'Ana', 'Antônio', 'Beatriz', 'Bruno', 'Camila', 'Carlos', 'Daniel', 'Eduardo', 'Fernanda', 'Francisco',
+    'Gabriel', 'Gustavo', 'Isabela', 'João', 'José', 'Juliana', 'Larissa', 'Leonardo', 'Lucas', 'Luiz',
+    'Marcos', 'Maria', 'Mariana', 'Matheus', 'Paulo', 'Pedro', 'Rafael', 'Ricardo', 'Rodrigo', 'Vitória',
+]
+LAST_NAMES = [
+    'Almeida', 'Alves', 'Araújo', 'Barbosa', 'Cardoso', 'Carvalho', 'Castro', 'Costa', 'Dias', 'Ferreira',
+    'Gomes', 'Lima', 'Martins', 'Melo', 'Moreira', 'Nascimento', 'Oliveira', 'Pereira', 'Ribeiro', 'Rocha',
+    'Rodrigues', 'Santos', 'Silva', 'Soares', 'Souza',
+]
+AREA_CODES = [11, 11, 11, 19, 21, 21, 27, 31, 41, 47, 48, 51, 61, 62, 71, 81, 85, 91]
+
+# (model, weight): roughly the mix of heavy trucks on Brazilian roads
+MODELS = [
+    ('Volvo FH 540', 16), ('Scania R450', 14), ('Mercedes-Benz Actros', 14),
+    ('Volkswagen Constellation 24.280', 12), ('Mercedes-Benz Axor', 10), ('Volvo VM 270', 8),
+    ('DAF XF', 8), ('Scania G410', 6), ('Volkswagen Meteor', 5), ('Iveco S-Way', 4), ('Ford Cargo 2429', 3),
+]
+# Model years follow a triangular distribution: most trucks are a few years old
+YEAR_MIN, YEAR_MODE, YEAR_MAX = 1998, 2021, 2025
+
+DRIVER_RATIO = 0.7
+INACTIVE_RATIO = 0.03
+# Share of trucks still on the pre-Mercosul plate format (LLL-NNNN)
+OLD_PLATE_RATIO = 0.3
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Unique values come from a bijection `n -> (n * MULTIPLIER + offset) % space`
+# over each value space, which looks random but never repeats. The multiplier
+# is coprime with every space below (they only have 2, 5 and 13 as factors).
+MULTIPLIER = 387_420_489  # 3 ** 18
+CPF_SPACE = 10 ** 9
+LICENSE_SPACE = 10 ** 11
+MERCOSUL_PLATE_SPACE = 26 ** 4 * 10 ** 3
+OLD_PLATE_SPACE = 26 ** 3 * 10 ** 4
+
+USER_COLUMNS = [
+    'username', 'email', 'password', 'first_name', 'last_name', 'cpf', 'phone_number', 'date_of_birth',
+    'license_number', 'is_active', 'is_admin', 'is_staff', 'is_superuser', 'date_joined', 'updated_at',
+]
+TRUCK_COLUMNS = ['user_id', 'plate_number', 'model', 'year', 'updated_at']
+
+
+def _permute(number, offset, space):
+    return (number * MULTIPLIER + offset) % space
+
+
+def cpf(number):
+    """Format a 9-digit base number as a CPF with valid check digits (XXX.XXX.XXX-DD)"""
+    digits = [int(d) for d in f'{number:09d}']
+    for length in (9, 10):
+        total = sum(d * (length + 1 - i) for i, d in enumerate(digits))
+        digits.append(total * 10 % 11 % 10)
+    text = ''.join(map(str, digits))
+    return f'{text[:3]}.{text[3:6]}.{text[6:9]}-{text[9:]}'
+
+
+def plate(number, mercosul=True):
+    """Plate for a number below the format's space: LLLNLNN (Mercosul) or LLL-NNNN"""
+    if mercosul:
+        number, tail = divmod(number, 100)
+        number, letter = divmod(number, 26)
+        number, digit = divmod(number, 10)
+        prefix = number
+    else:
+        prefix, tail = divmod(number, 10 ** 4)
+    letters = ''
+    for _ in range(3):
+        prefix, index = divmod(prefix, 26)
+        letters += LETTERS[index]
+    if mercosul:
+        return f'{letters}{digit}{LETTERS[letter]}{tail:02d}'
+    return f'{letters}-{tail:04d}'
+
+
+def generate_users(count, rng, password_hash, prefix):
+    """Yield `count` user rows in USER_COLUMNS order"""
+    cpf_offset = rng.randrange(CPF_SPACE)
+    license_offset = rng.randrange(LICENSE_SPACE)
+    joined = timezone.now()
+    oldest_birth = date(1955, 1, 1)
+    for i in range(count):
+        username = f'{prefix}{i}'
+        driver = rng.random() < DRIVER_RATIO
+        yield (
+            username,
+            f'{username}@example.com',
+            password_hash,
+            rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES),
+            cpf(_permute(i, cpf_offset, CPF_SPACE)),
+            f'+55{rng.choice(AREA_CODES)}9{rng.randrange(10 ** 8):08d}',
+            oldest_birth + timedelta(days=rng.randrange(18250)),
+            f'{_permute(i, license_offset, LICENSE_SPACE):011d}' if driver else None,
+            rng.random() >= INACTIVE_RATIO,
+            False,
+            False,
+            False,
+            joined,
+            joined,
+        )
+
+
+def generate_trucks(count, rng, owner_ids):
+    """
+    Yield `count` truck rows in TRUCK_COLUMNS order.
+
+    Ownership is skewed: most owners have one or two trucks, a few own fleets.
+    """
+    models, weights = zip(*MODELS)
+    mercosul_offset = rng.randrange(MERCOSUL_PLATE_SPACE)
+    old_offset = rng.randrange(OLD_PLATE_SPACE)
+    owners = len(owner_ids)
+    created = timezone.now()
+    for i in range(count):
+        if rng.random() < OLD_PLATE_RATIO:
+            plate_number = plate(_permute(i, old_offset, OLD_PLATE_SPACE), mercosul=False)
+        else:
+            plate_number = plate(_permute(i, mercosul_offset, MERCOSUL_PLATE_SPACE))
+        yield (
+            owner_ids[int(owners * rng.random() ** 2)],
+            plate_number,
+            rng.choices(models, weights)[0],
+            int(rng.triangular(YEAR_MIN, YEAR_MAX + 1, YEAR_MODE)),
+            created,
+        )
+
+
+def _insert(model, columns, rows, batch_size):
+    if connection.vendor == 'postgresql':
+        names = ', '.join(model._meta.get_field(column).column for column in columns)
+        # copy() bypasses Django's cursor wrapper, so map the driver errors here
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            with cursor.copy(f'COPY {model._meta.db_table} ({names}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return
+
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        model.objects.bulk_create([model(**dict(zip(columns, row))) for row in batch])
+
+
+def seeded_users(prefix):
+    """The users generated with `prefix`: exactly `<prefix><n>`, not every name starting with it"""
+    return User.objects.filter(username__regex=rf'^{re.escape(prefix)}\d+$')
+
+
+def clear_fleet(prefix):
+    """
+    Delete the users seeded with `prefix`, their trucks and what else refers to them.
+
+    Returns the number of rows deleted. A fleet can hold millions of rows,
+    so each table is handled by one statement instead of the ORM's
+    per-row deletes and signals; delta sync tombstones are written the
+    same way, and caches and subscribers are told once at the end.
+    """
+    ids_sql, params = seeded_users(prefix).values('id').query.sql_with_params()
+    quote = connection.ops.quote_name
+    statements = [(
+        f'INSERT INTO {quote(DeletedTruck._meta.db_table)} (object_id, deleted_at) '
+        f'SELECT id, %s FROM {quote(Truck._meta.db_table)} WHERE user_id IN ({ids_sql})',
+        (timezone.now(), *params),
+    )]
+    deletes = [
+        (quote(field.remote_field.through._meta.db_table), quote(field.m2m_column_name()))
+        for field in User._meta.many_to_many
+    ]
+    # Trucks, admin log entries and JWTs; none has rows referring to it in turn
+    for relation in User._meta.related_objects:
+        table, column = quote(relation.related_model._meta.db_table), quote(relation.field.column)
+        if relation.on_delete is models.SET_NULL:
+            statements.append((f'UPDATE {table} SET {column} = NULL WHERE {column} IN ({ids_sql})', params))
+        elif relation.on_delete is models.CASCADE:
+            deletes.append((table, column))
+    statements += [
+        (f'DELETE FROM {table} WHERE {column} IN ({ids_sql})', params) for table, column in deletes
+    ]
+    statements += [
+        (
+            f'INSERT INTO {quote(DeletedUser._meta.db_table)} (object_id, deleted_at) '
+            f'SELECT id, %s FROM {quote(User._meta.db_table)} WHERE id IN ({ids_sql})',
+            (timezone.now(), *params),
+        ),
+        (f'DELETE FROM {quote(User._meta.db_table)} WHERE id IN ({ids_sql})', params),
+    ]
+
+    deleted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql, sql_params in statements:
+            cursor.execute(sql, sql_params)
+            if sql.startswith('DELETE'):
+                deleted += cursor.rowcount
+
+    if deleted:
+        # No signals fire for these rows: drop the cached responses and let
+        # subscribers resync
+        bump_generation('users')
+        bump_generation('trucks')
+        publish_event('user', 'deleted')
+        publish_event('truck', 'deleted')
+    return deleted
+
+
+def seed_fleet(users, trucks, seed=DEFAULT_SEED, password=DEFAULT_PASSWORD, prefix='seed', batch_size=5000):
+    """
+    Insert `users` users named `<prefix><n>` and `trucks` trucks owned by them.
+
+    Returns the ids of the new users, in insertion order. Nothing is written
+    if any row conflicts with existing data.
+    """
+    rng = random.Random(seed)
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        last_id = User.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        _insert(User, USER_COLUMNS, generate_users(users, rng, password_hash, prefix), batch_size)
+        seeded = seeded_users(prefix).filter(id__gt=last_id).order_by('id')
+        user_ids = list(seeded.values_list('id', flat=True))
+        owner_ids = list(seeded.filter(license_number__isnull=False).values_list('id', flat=True)) or user_ids
+        if trucks and not owner_ids:
+            raise ValueError('Trucks need at least one user to own them')
+        _insert(Truck, TRUCK_COLUMNS, generate_trucks(trucks, rng, owner_ids), batch_size)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {User._meta.db_table}, {Truck._meta.db_table}')
+    # No signals fire for these rows, so drop the cached responses explicitly
+    bump_generation('users')
+    bump_generation('trucks')
+    return user_ids
@@ -1,6 +1,30 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from .models import Truck
-from users.serializers import UserSerializer
+from users.models import User
+from users.serializers import RowSerializer, UserListSerializer, UserSerializer, user_row_representation
+
+PLATE_NUMBER_TAKEN = "A truck with this plate number already exists"
+
+
+@contextmanager
+def plate_number_taken_errors():
+    """
+    Turn a violation of the unique plate index into the validation error.
+
+    `validate_plate_number` checks before the insert, so two concurrent
+    requests can both pass it: the index decides, and the loser gets a 400.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as exc:
+        if 'truck_plate_number_unique' not in str(exc):
+            raise
+        raise serializers.ValidationError({"plate_number": [PLATE_NUMBER_TAKEN]}) from exc
+
 
 class TruckSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
@@ -15,9 +39,57 @@ class TruckSerializer(serializers.ModelSerializer):
         representation.pop('user', None)
         return representation
         
+    def validate_plate_number(self, value):
+        """Validate that the plate number is unique, ignoring case"""
+        trucks = Truck.objects.filter(plate_number__iexact=value)
+        if self.instance is not None:
+            trucks = trucks.exclude(pk=self.instance.pk)
+        if trucks.exists():
+            raise serializers.ValidationError(PLATE_NUMBER_TAKEN)
+        return value
+        
     def validate(self, attrs):
         """Validate that the user is active"""
         user = attrs.get('user')
         if user and not user.is_active:
             raise serializers.ValidationError({"user": "Cannot assign truck to inactive user"})
         return attrs
+
+    def create(self, validated_data):
+        with plate_number_taken_errors():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with plate_number_taken_errors():
+            return super().update(instance, validated_data)
+
+
+class TruckListSerializer(RowSerializer):
+    """
+    Read-only fast path for truck lists.
+
+    Takes `.values(*values_fields)` rows instead of model instances and
+    returns exactly what `TruckSerializer` would, without the per-field
+    machinery of ModelSerializer.
+    """
+    values_fields = ['id', 'plate_number', 'model', 'year'] + [
+        f'user__{field}' for field in UserListSerializer.values_fields
+    ]
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'plate_number': row['plate_number'],
+            'model': row['model'],
+            'year': row['year'],
+            'user_details': user_row_representation(row, 'user__', self.file_url),
+        }
+
+
+class TruckImportSerializer(serializers.Serializer):
+    """Validates one row of a bulk truck import"""
+    # The model fields' range validators: values the columns cannot hold are row errors, not DataErrors
+    user = serializers.IntegerField(validators=list(User._meta.pk.validators))
+    plate_number = serializers.CharField(max_length=10)
+    model = serializers.CharField(max_length=50)
+    year = serializers.IntegerField(validators=list(Truck._meta.get_field('year').validators))
@@ -0,0 +1,46 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from fleetsecure.events import publish_event
+from users.models import User
+from utils.cache import bump_generation_on_commit
+from .models import DeletedTruck, Truck
+
+
+def _cascaded(origin):
+    """Return whether a truck is deleted by its owner's deletion cascading"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not Truck
+
+
+@receiver(post_save, sender=Truck)
+def invalidate_truck_cache(sender, **kwargs):
+    """Invalidate cached truck responses once the change commits"""
+    bump_generation_on_commit('trucks')
+
+
+@receiver(post_delete, sender=Truck)
+def record_deleted_truck(sender, instance, origin=None, **kwargs):
+    """Invalidate, leave a tombstone for delta sync and push the deletion of one truck"""
+    if _cascaded(origin):
+        return  # Done once for all of them by record_owner_trucks_deleted
+    bump_generation_on_commit('trucks')
+    DeletedTruck.objects.create(object_id=instance.pk)
+    publish_event('truck', 'deleted', [instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def record_owner_trucks_deleted(sender, instance, **kwargs):
+    """Do the same for all the trucks an owner's deletion cascades to, in one go"""
+    truck_ids = list(Truck.objects.filter(user=instance).values_list('pk', flat=True))
+    if not truck_ids:
+        return
+    bump_generation_on_commit('trucks')
+    DeletedTruck.objects.bulk_create(DeletedTruck(object_id=pk) for pk in truck_ids)
+    publish_event('truck', 'deleted', truck_ids)
+
+
+@receiver(post_save, sender=Truck)
+def announce_saved_truck(sender, instance, created, **kwargs):
+    """Push the change to the event stream subscribers"""
+    publish_event('truck', 'created' if created else 'updated', [instance.pk])
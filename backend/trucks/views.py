@@ -1,35 +1,127 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Truck
-from .serializers import TruckSerializer
+from .models import DeletedTruck, Truck
+from .serializers import TruckListSerializer, TruckSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from utils.cache import CachedReadMixin, acache_response, cache_response
+from django.conf import settings
+from fleetsecure.async_views import AsyncViewSetMixin
+from fleetsecure.middleware import SerializerTimingMixin, serializer_data
+from fleetsecure.throttling import BulkRateThrottle
+from utils.export import EXPORT_FORMATS, stream_export
+from utils.sync import DeltaSyncMixin
+from .bulk_import import detect_format, import_trucks, read_rows
 
 
-class TruckViewSet(viewsets.ModelViewSet):
-    queryset = Truck.objects.all()
+class TruckViewSet(AsyncViewSetMixin, DeltaSyncMixin, CachedReadMixin, SerializerTimingMixin, viewsets.ModelViewSet):
+    queryset = Truck.objects.select_related('user')
     serializer_class = TruckSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['user', 'year', 'model']
     search_fields = ['plate_number', 'model']
     ordering_fields = ['year', 'user__first_name']
+    ordering = ['id']
+    # user_details embeds the owner, so user changes invalidate trucks too
+    cache_namespaces = ('trucks', 'users')
+    tombstone_model = DeletedTruck
+    export_fields = [
+        ('id', 'id'),
+        ('plate_number', 'plate_number'),
+        ('model', 'model'),
+        ('year', 'year'),
+        ('user', 'user_id'),
+        ('user_username', 'user__username'),
+        ('user_license_number', 'user__license_number'),
+    ]
+    
+    def is_fast_list(self):
+        return self.action in ('list', 'by_user', 'by_year', 'changes') and self.request.method in ('GET', 'HEAD')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'changes':
+            return queryset.values(*TruckListSerializer.values_fields, 'sync_xid')
+        if self.is_fast_list():
+            return queryset.values(*TruckListSerializer.values_fields)
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.is_fast_list():
+            return TruckListSerializer
+        return TruckSerializer
     
     @action(detail=False)
+    @cache_response
     def by_user(self, request):
         user_id = request.query_params.get('user_id')
         if user_id:
-            trucks = Truck.objects.filter(user_id=user_id)
+            trucks = self.get_queryset().filter(user_id=user_id)
+            page = self.paginate_queryset(trucks)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer_data(serializer))
             serializer = self.get_serializer(trucks, many=True)
-            return Response(serializer.data)
+            return Response(serializer_data(serializer))
+        return Response({"error": "user_id parameter is required"}, status=400)
+    
+    @acache_response
+    async def aretrieve(self, request, *args, **kwargs):
+        truck = await self.aget_object()
+        serializer = self.get_serializer(truck)
+        return Response(serializer_data(serializer))
+    
+    @acache_response
+    async def aby_user(self, request):
+        user_id = request.query_params.get('user_id')
+        if user_id:
+            trucks = self.get_queryset().filter(user_id=user_id)
+            page = await self.apaginate_queryset(trucks)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer_data(serializer))
+            serializer = self.get_serializer([truck async for truck in trucks], many=True)
+            return Response(serializer_data(serializer))
         return Response({"error": "user_id parameter is required"}, status=400)
     
     @action(detail=False)
+    @cache_response
     def by_year(self, request):
         year = request.query_params.get('year')
         if year:
-            trucks = Truck.objects.filter(year=year)
+            trucks = self.get_queryset().filter(year=year)
+            page = self.paginate_queryset(trucks)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer_data(serializer))
             serializer = self.get_serializer(trucks, many=True)
-            return Response(serializer.data)
+            return Response(serializer_data(serializer))
         return Response({"error": "year parameter is required"}, status=400)
+    
+    @action(detail=False, methods=['post'], throttle_classes=[BulkRateThrottle])
+    def bulk_create(self, request):
+        """Create trucks from an uploaded CSV or NDJSON file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=400)
+        
+        file_format = detect_format(upload)
+        if file_format is None:
+            return Response({"error": "file must be CSV or NDJSON"}, status=400)
+        
+        result = import_trucks(read_rows(upload, file_format), settings.TRUCK_IMPORT_BATCH_SIZE)
+        if result["failed"] and not result["created"]:
+            return Response(result, status=400)
+        return Response(result, status=201)
+    
+    @action(detail=False, throttle_classes=[BulkRateThrottle])
+    def export(self, request):
+        """Stream the filtered trucks as CSV or NDJSON"""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({"error": "file_format must be csv or ndjson"}, status=400)
+        
+        trucks = self.filter_queryset(self.get_queryset())
+        return stream_export(trucks, self.export_fields, file_format, 'trucks')
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired JWTs from the outstanding and blacklisted token tables "
+        "in small batches, each in its own short transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE,
+            help='Outstanding tokens deleted per transaction',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between batches, to leave room for other writers',
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Run VACUUM (ANALYZE) on both tables after deleting rows (PostgreSQL)',
+        )
+        parser.add_argument(
+            '--every', type=float, default=0,
+            help='Keep running, pruning every EVERY seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.prune(options['batch_size'], options['pause'], options['vacuum'])
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def prune(self, batch_size, pause, vacuum):
+        start = time.monotonic()
+        now = aware_utcnow()
+        outstanding = blacklisted = batches = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                # Expired tokens are the oldest ones, so walking the primary key
+                # finds them without a scan over the whole table per batch
+                ids = list(
+                    OutstandingToken.objects
+                    .filter(id__gt=last_id, expires_at__lte=now)
+                    .order_by('id')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                _, deleted = OutstandingToken.objects.filter(id__in=ids).delete()
+
+            batches += 1
+            last_id = ids[-1]
+            outstanding += deleted.get(OutstandingToken._meta.label, 0)
+            blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+            if pause:
+                time.sleep(pause)
+
+        if vacuum and outstanding and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'VACUUM (ANALYZE) {OutstandingToken._meta.db_table}, {BlacklistedToken._meta.db_table}'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {outstanding} outstanding and {blacklisted} blacklisted tokens '
+            f'in {batches} batches ({time.monotonic() - start:.2f}s)'
+        ))
+        return outstanding, blacklisted
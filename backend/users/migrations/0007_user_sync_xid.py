@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+# sync_xid is the transaction that last changed updated_at (or inserted the
+# row). Delta sync reads it up to the oldest transaction still running, so
+# it follows commit order where timestamps do not.
+SYNC_XID_TRIGGERS = """
+CREATE FUNCTION users_set_sync_xid() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.sync_xid := pg_current_xact_id()::text::bigint;
+    ELSIF NEW.updated_at IS DISTINCT FROM OLD.updated_at THEN
+        NEW.sync_xid := pg_current_xact_id()::text::bigint;
+    ELSE
+        NEW.sync_xid := OLD.sync_xid;
+    END IF;
+    RETURN NEW;
+END
+$$;
+CREATE TRIGGER users_user_sync_xid BEFORE INSERT OR UPDATE ON users_user
+    FOR EACH ROW EXECUTE FUNCTION users_set_sync_xid();
+CREATE TRIGGER users_deleteduser_sync_xid BEFORE INSERT ON users_deleteduser
+    FOR EACH ROW EXECUTE FUNCTION users_set_sync_xid();
+"""
+
+DROP_SYNC_XID_TRIGGERS = """
+DROP TRIGGER users_deleteduser_sync_xid ON users_deleteduser;
+DROP TRIGGER users_user_sync_xid ON users_user;
+DROP FUNCTION users_set_sync_xid();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # The indexes are built concurrently so the table stays writable
+    atomic = False
+
+    dependencies = [
+        ('users', '0006_user_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='sync_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deleteduser',
+            name='sync_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(SYNC_XID_TRIGGERS, DROP_SYNC_XID_TRIGGERS),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['sync_xid', 'id'], name='user_sync_xid_id_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='user',
+            name='user_updated_at_id_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='deleteduser',
+            index=models.Index(fields=['sync_xid', 'id'], name='deleted_user_xid_id_idx'),
+        ),
+    ]
@@ -9,9 +9,38 @@ class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
     license_number = models.CharField(max_length=20, blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Transaction that last changed updated_at, set by a trigger (delta sync)
+    sync_xid = models.BigIntegerField(default=0, editable=False)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['license_number'], name='user_license_number_idx'),
+            models.Index(fields=['is_active', 'id'], name='user_is_active_id_idx'),
+            # Ordering trucks by user__first_name
+            models.Index(fields=['first_name', 'id'], name='user_first_name_id_idx'),
+            # Delta sync (users/changes/)
+            models.Index(fields=['sync_xid', 'id'], name='user_sync_xid_id_idx'),
+        ]
     
     def __str__(self):
         return self.get_full_name() if self.get_full_name() else self.username
         
     def is_driver(self):
         return bool(self.license_number)
+
+
+
+class DeletedUser(models.Model):
+    """Tombstone of a deleted user, reported by users/changes/"""
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    # Transaction that deleted the user, set by a trigger
+    sync_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sync_xid', 'id'], name='deleted_user_xid_id_idx'),
+            # prune_tombstones
+            models.Index(fields=['deleted_at', 'id'], name='deleted_user_at_id_idx'),
+        ]
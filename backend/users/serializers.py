@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.contrib.auth import password_validation
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from .models import User
 
@@ -23,6 +25,71 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_driver(self, obj):
         return obj.is_driver()
 
+
+def user_row_representation(row, prefix='', file_url=None):
+    """
+    Build the `UserSerializer` representation from a `.values()` row.
+
+    `prefix` selects the columns of a related user (e.g. 'user__').
+    """
+    first_name = row[prefix + 'first_name']
+    last_name = row[prefix + 'last_name']
+    date_of_birth = row[prefix + 'date_of_birth']
+    profile_picture = row[prefix + 'profile_picture']
+    license_number = row[prefix + 'license_number']
+
+    return {
+        'id': row[prefix + 'id'],
+        'username': row[prefix + 'username'],
+        'email': row[prefix + 'email'],
+        'first_name': first_name,
+        'last_name': last_name,
+        'full_name': f'{first_name} {last_name}'.strip(),
+        'cpf': row[prefix + 'cpf'],
+        'phone_number': row[prefix + 'phone_number'],
+        'date_of_birth': date_of_birth.isoformat() if date_of_birth else None,
+        'profile_picture': file_url(profile_picture) if profile_picture else None,
+        'is_active': row[prefix + 'is_active'],
+        'is_admin': row[prefix + 'is_admin'],
+        'is_driver': bool(license_number),
+        'license_number': license_number,
+    }
+
+
+class RowSerializer(serializers.BaseSerializer):
+    """Base for read-only serializers fed by `.values()` rows"""
+
+    def file_url(self, name):
+        """Return what DRF's FileField renders for a stored profile picture"""
+        # Owners repeat across rows, so resolve each file once per response
+        urls = self.__dict__.setdefault('_file_urls', {})
+        url = urls.get(name)
+        if url is None:
+            url = User._meta.get_field('profile_picture').storage.url(name)
+            request = self.context.get('request')
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[name] = url
+        return url
+
+
+class UserListSerializer(RowSerializer):
+    """
+    Read-only fast path for user lists.
+
+    Takes `.values(*values_fields)` rows instead of model instances and
+    returns exactly what `UserSerializer` would, without the per-field
+    machinery of ModelSerializer.
+    """
+    values_fields = [
+        'id', 'username', 'email', 'first_name', 'last_name', 'cpf',
+        'phone_number', 'date_of_birth', 'profile_picture', 'is_active',
+        'is_admin', 'license_number',
+    ]
+
+    def to_representation(self, row):
+        return user_row_representation(row, file_url=self.file_url)
+
 class UserCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating new users"""
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -42,20 +109,13 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            first_name=validated_data.get('first_name', ''),
-            last_name=validated_data.get('last_name', ''),
-            cpf=validated_data.get('cpf'),
-            phone_number=validated_data.get('phone_number'),
-            date_of_birth=validated_data.get('date_of_birth'),
-            profile_picture=validated_data.get('profile_picture'),
-            license_number=validated_data.get('license_number'),
-            is_admin=validated_data.get('is_admin', False)
-        )
-        user.set_password(validated_data['password'])
-        user.save()
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.clean()  # Normalizes username and email, as create_user does
+        # Hash once, before opening the transaction: it is the slow part
+        user.password = make_password(password)
+        with transaction.atomic():
+            user.save(force_insert=True)
         return user
 
 class PasswordChangeSerializer(serializers.Serializer):
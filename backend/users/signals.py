@@ -0,0 +1,59 @@
+import functools
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from fleetsecure.authentication import invalidate_cached_user
+from fleetsecure.events import publish_event
+from fleetsecure.tokens import add_to_blacklist
+from utils.cache import bump_generation_on_commit
+from .models import DeletedUser, User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Invalidate cached user responses (and trucks embedding them) once the change commits"""
+    bump_generation_on_commit('users')
+    transaction.on_commit(functools.partial(invalidate_cached_user, instance.pk))
+
+
+# Saves that do not change what trucks embed in user_details
+CREDENTIAL_FIELDS = {'last_login', 'password'}
+
+
+@receiver(post_save, sender=User)
+def touch_owned_trucks(sender, instance, created, update_fields=None, **kwargs):
+    """Report the owner's trucks as changed to delta sync, since they embed the owner"""
+    if created or (update_fields is not None and set(update_fields) <= CREDENTIAL_FIELDS):
+        return
+    from trucks.models import Truck
+    Truck.objects.filter(user=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=User)
+def record_deleted_user(sender, instance, **kwargs):
+    """Leave a tombstone for delta sync"""
+    DeletedUser.objects.create(object_id=instance.pk)
+
+
+@receiver(post_save, sender=User)
+def announce_saved_user(sender, instance, created, update_fields=None, **kwargs):
+    """Push the change to the event stream subscribers (not for logins)"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    publish_event('user', 'created' if created else 'updated', [instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def announce_deleted_user(sender, instance, **kwargs):
+    """Push the deletion to the event stream subscribers"""
+    publish_event('user', 'deleted', [instance.pk])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    """Mirror revoked tokens (rotation, logout, admin) into the cached blacklist"""
+    if created:
+        add_to_blacklist(instance.token.jti, instance.token.expires_at)
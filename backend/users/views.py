@@ -2,9 +2,16 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import User
-from .serializers import UserSerializer, UserCreateSerializer, PasswordChangeSerializer
+from .models import DeletedUser, User
+from .serializers import UserSerializer, UserCreateSerializer, UserListSerializer, PasswordChangeSerializer
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from fleetsecure.async_views import AsyncViewSetMixin
+from fleetsecure.middleware import SerializerTimingMixin, serializer_data
+from fleetsecure.throttling import BulkRateThrottle
+from utils.cache import CachedReadMixin
+from utils.export import EXPORT_FORMATS, stream_export
+from utils.hashing import hash_password, verify_user_password
+from utils.sync import DeltaSyncMixin
 
 class IsAdminOrSelf(permissions.BasePermission):
     """
@@ -20,20 +27,48 @@ class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_admin)
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AsyncViewSetMixin, DeltaSyncMixin, CachedReadMixin, SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    cache_namespaces = ('users',)
+    tombstone_model = DeletedUser
+    export_fields = [
+        ('id', 'id'),
+        ('username', 'username'),
+        ('email', 'email'),
+        ('first_name', 'first_name'),
+        ('last_name', 'last_name'),
+        ('cpf', 'cpf'),
+        ('phone_number', 'phone_number'),
+        ('date_of_birth', 'date_of_birth'),
+        ('is_active', 'is_active'),
+        ('is_admin', 'is_admin'),
+        ('license_number', 'license_number'),
+    ]
     
     def get_permissions(self):
         if self.action == 'create':
             return [permissions.AllowAny()]
         elif self.action in ['update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsAdminOrSelf()]
-        elif self.action == 'list':
+        elif self.action in ['list', 'export', 'changes']:
             return [IsAuthenticated(), IsAdminUser()]
         return [IsAuthenticated()]
     
+    def is_fast_list(self):
+        return self.action in ('list', 'changes') and self.request.method in ('GET', 'HEAD')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'changes':
+            return queryset.values(*UserListSerializer.values_fields, 'sync_xid')
+        if self.is_fast_list():
+            return queryset.values(*UserListSerializer.values_fields)
+        return queryset
+    
     def get_serializer_class(self):
+        if self.is_fast_list():
+            return UserListSerializer
         if self.action == 'create':
             return UserCreateSerializer
         if self.action == 'change_password':
@@ -42,8 +77,13 @@ class UserViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        # The authentication cache only holds the fields auth needs
+        serializer = self.get_serializer(User.objects.get(pk=request.user.pk))
+        return Response(serializer_data(serializer))
+    
+    async def ame(self, request):
+        serializer = self.get_serializer(await User.objects.aget(pk=request.user.pk))
+        return Response(serializer_data(serializer))
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrSelf])
     def change_password(self, request, pk=None):
@@ -51,13 +91,14 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         
         if serializer.is_valid():
-            if not user.check_password(serializer.validated_data['old_password']):
+            # Both hashes count against the shared hashing limit
+            if not verify_user_password(user, serializer.validated_data['old_password']):
                 return Response(
                     {"old_password": ["Incorrect current password"]},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            user.set_password(serializer.validated_data['new_password'])
+            user.password = hash_password(serializer.validated_data['new_password'])
             user.save()
             return Response({"status": "Password changed successfully"})
         
@@ -76,3 +117,13 @@ class UserViewSet(viewsets.ModelViewSet):
         user.is_active = False
         user.save()
         return Response({"status": "User deactivated"})
+    
+    @action(detail=False, methods=['get'], throttle_classes=[BulkRateThrottle])
+    def export(self, request):
+        """Stream the filtered users as CSV or NDJSON"""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({"error": "file_format must be csv or ndjson"}, status=400)
+        
+        users = self.filter_queryset(self.get_queryset()).order_by('id')
+        return stream_export(users, self.export_fields, file_format, 'users')
@@ -0,0 +1,255 @@
+"""
+Read-through response cache for API views, invalidated by generation counters.
+
+The same counters validate conditional GETs: ETag and Last-Modified are
+derived from them, so an unchanged poll gets a 304 without touching the
+database or a serializer.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from utils.metrics import CACHE_REQUESTS
+
+GENERATION_KEY = 'api-cache:gen:{}'
+MODIFIED_KEY = 'api-cache:modified:{}'
+RESPONSE_KEY = 'api-cache:resp:{view}:{action}:{generations}:{scope}:{params}'
+
+# Prometheus result label of each counted event
+CACHE_RESULTS = {'hits': 'hit', 'misses': 'miss', 'not_modified': 'not_modified'}
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(event, namespace):
+    with _stats_lock:
+        _stats[(event, namespace)] += 1
+    CACHE_REQUESTS.labels(namespace, CACHE_RESULTS[event]).inc()
+
+
+def cache_stats():
+    """Return hit/miss/304 counters of this process, grouped by view"""
+    with _stats_lock:
+        stats = {}
+        for (event, namespace), count in _stats.items():
+            stats.setdefault(namespace, dict.fromkeys(CACHE_RESULTS, 0))[event] = count
+        return stats
+
+
+def reset_cache_stats():
+    """Reset the hit/miss counters of this process"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def _fresh_generation():
+    # Time based, so a counter evicted from Redis never restarts at a value
+    # that older response keys were built with.
+    return time.time_ns() // 1000
+
+
+def get_versions(namespaces):
+    """
+    Return `(generations, last_modified)` for `namespaces` in a single round trip.
+
+    `last_modified` is the Unix time of the latest change to any of them. It
+    starts at the current time when unknown (cold or evicted cache), which
+    only costs clients a full response.
+    """
+    generation_keys = [GENERATION_KEY.format(namespace) for namespace in namespaces]
+    modified_keys = [MODIFIED_KEY.format(namespace) for namespace in namespaces]
+    values = cache.get_many(generation_keys + modified_keys)
+    for key in generation_keys:
+        if key not in values:
+            cache.add(key, _fresh_generation(), timeout=None)
+            values[key] = cache.get(key)
+    for key in modified_keys:
+        if key not in values:
+            cache.add(key, time.time(), timeout=None)
+            values[key] = cache.get(key)
+    generations = [values[key] for key in generation_keys]
+    return generations, max(values[key] for key in modified_keys)
+
+
+def get_generations(namespaces):
+    """Return the current generation of each namespace"""
+    return get_versions(namespaces)[0]
+
+
+def bump_generation(namespace):
+    """Invalidate every cached response that depends on `namespace`"""
+    # Written before the generation, so a reader never pairs the new
+    # generation with the previous modification time
+    cache.set(MODIFIED_KEY.format(namespace), time.time(), timeout=None)
+    key = GENERATION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), timeout=None)
+
+
+def bump_generation_on_commit(namespace):
+    """
+    `bump_generation` once the current transaction commits (at once outside one).
+
+    Bumping before the commit would let a concurrent read cache the rows it
+    still sees under the new generation, and serve them until the next write.
+    """
+    transaction.on_commit(functools.partial(bump_generation, namespace))
+
+
+def normalize_query_params(query_params):
+    """Return a stable digest of the query string, independent of parameter order"""
+    normalized = '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(query_params.lists())
+        for value in values
+    )
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _closed_second(last_modified):
+    """
+    Return `last_modified` in whole seconds once that second has ended, else None.
+
+    HTTP dates have second granularity: a Last-Modified sent while its second
+    is still running would also match a change made later in that second.
+    """
+    if int(last_modified) < int(time.time()):
+        return int(last_modified)
+    return None
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    last_modified = _closed_second(last_modified)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Authenticated data: browsers may keep it, but must revalidate each time
+    response['Cache-Control'] = 'private, no-cache'
+
+
+def _validators(view, request, kwargs, generations):
+    """Return the cache key and the ETag of a read, for the given generations"""
+    key = RESPONSE_KEY.format(
+        view=view.basename,
+        action=view.action,
+        generations='.'.join(str(generation) for generation in generations),
+        scope=view.get_cache_scope(request),
+        params=normalize_query_params(request.query_params)
+        + ''.join(f':{value}' for _, value in sorted(kwargs.items())),
+    )
+    # Weak: the same data rendered by another renderer is equivalent
+    etag = 'W/"{}"'.format(
+        hashlib.sha1(f'{key}:{request.accepted_renderer.format}'.encode('utf-8')).hexdigest()
+    )
+    return key, etag
+
+
+def _not_modified(view, request, etag, last_modified):
+    response = get_conditional_response(request, etag=etag, last_modified=_closed_second(last_modified))
+    if response is not None:
+        _record('not_modified', view.basename)
+        _set_validators(response, etag, last_modified)
+    return response
+
+
+def _hit(view, data, etag, last_modified):
+    _record('hits', view.basename)
+    response = Response(data)
+    response['X-Cache'] = 'HIT'
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def cache_response(view_method):
+    """
+    Serve successful reads of a viewset action from the cache.
+
+    The view must define `cache_namespaces`, the generation counters its
+    responses depend on. Only the response data is cached, so content
+    negotiation and rendering still happen per request. Requests carrying
+    a matching If-None-Match (or, without it, If-Modified-Since) get a 304.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        generations, last_modified = get_versions(self.cache_namespaces)
+        key, etag = _validators(self, request, kwargs, generations)
+
+        not_modified = _not_modified(self, request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = cache.get(key)
+        if data is not None:
+            return _hit(self, data, etag, last_modified)
+
+        _record('misses', self.basename)
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=settings.API_CACHE_TIMEOUT)
+            _set_validators(response, etag, last_modified)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def acache_response(view_method):
+    """`cache_response` for the async actions of a viewset"""
+    @functools.wraps(view_method)
+    async def wrapper(self, request, *args, **kwargs):
+        generations, last_modified = await sync_to_async(get_versions)(self.cache_namespaces)
+        key, etag = _validators(self, request, kwargs, generations)
+
+        not_modified = _not_modified(self, request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = await cache.aget(key)
+        if data is not None:
+            return _hit(self, data, etag, last_modified)
+
+        _record('misses', self.basename)
+        response = await view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data, timeout=settings.API_CACHE_TIMEOUT)
+            _set_validators(response, etag, last_modified)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+class CachedReadMixin:
+    """
+    Cache `list` and `retrieve` of a viewset.
+
+    Responses are keyed on the normalized query params and the permission
+    scope of the requester; writes invalidate them by bumping the generation
+    counters listed in `cache_namespaces`.
+    """
+    cache_namespaces = ()
+
+    def get_cache_scope(self, request):
+        if getattr(request.user, 'is_admin', False):
+            return 'admin'
+        return 'user'
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
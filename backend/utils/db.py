@@ -0,0 +1,16 @@
+"""
+Database helpers
+"""
+from django.db import connections
+
+
+def pool_stats(alias='default'):
+    """
+    Return the psycopg connection pool statistics of this process.
+
+    Returns None when pooling is disabled for the connection.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+    return pool.get_stats()
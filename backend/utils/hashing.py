@@ -0,0 +1,210 @@
+"""
+Password hashing under a concurrency limit shared by every web worker
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+SLOTS_KEY = 'password-hashing:slots'
+
+# A slot is taken back after this long, in case its worker died mid-hash
+SLOT_LEASE_MS = 60_000
+
+# Seconds between two attempts of a caller waiting for a slot, doubling up
+# to MAX_POLL_INTERVAL so waiters do not flood Redis
+POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.2
+
+# Slots are members of a sorted set scored by when they were taken: expired
+# leases are dropped, then a slot is taken if fewer than `limit` remain.
+# Returns 1 when the slot was taken, 0 when the limit is reached.
+ACQUIRE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], lease)
+return 1
+"""
+
+_scripts = {}
+_scripts_lock = threading.Lock()
+
+# Used when the shared cache is not Redis or is unreachable: the limit then
+# applies per process
+_local_slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_CONCURRENCY)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many password checks in progress, try again shortly.'
+    default_code = 'hashing_unavailable'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+def _record(event, amount=1):
+    with _stats_lock:
+        _stats[event] += amount
+        if event == 'in_flight':
+            _stats['peak_in_flight'] = max(_stats['peak_in_flight'], _stats['in_flight'])
+
+
+def _acquire_script():
+    alias = settings.THROTTLE_CACHE
+    if not settings.CACHES[alias]['BACKEND'].startswith('django_redis.'):
+        return None
+    with _scripts_lock:
+        script = _scripts.get(alias)
+        if script is None:
+            from django_redis import get_redis_connection
+            script = _scripts[alias] = get_redis_connection(alias).register_script(ACQUIRE_SCRIPT)
+        return script
+
+
+def shared_in_flight():
+    """Return the hashes running in every worker, or None without a shared cache"""
+    script = _acquire_script()
+    if script is None:
+        return None
+    try:
+        # Leases past their expiry are only dropped by the next acquire
+        return script.registered_client.zcount(SLOTS_KEY, time.time() * 1000 - SLOT_LEASE_MS, '+inf')
+    except Exception:
+        logger.exception('Hashing slots unavailable')
+        return None
+
+
+def hashing_stats():
+    """Return the concurrency limit and the in-flight and queue counters of this process"""
+    with _stats_lock:
+        stats = {
+            'concurrency': settings.PASSWORD_HASHING_CONCURRENCY,
+            'max_waiting': settings.PASSWORD_HASHING_MAX_WAITING,
+            'in_flight': _stats['in_flight'],
+            'waiting': _stats['waiting'],
+            'peak_in_flight': _stats['peak_in_flight'],
+            'completed': _stats['completed'],
+            'rejected': _stats['rejected'],
+        }
+    stats['shared_in_flight'] = shared_in_flight()
+    return stats
+
+
+def reset_hashing_stats():
+    """Reset the cumulative counters of this process"""
+    with _stats_lock:
+        for event in ('peak_in_flight', 'completed', 'rejected'):
+            _stats[event] = 0
+
+
+def _acquire():
+    """
+    Wait up to PASSWORD_HASHING_QUEUE_TIMEOUT for a slot.
+
+    Returns the function that frees it, or None when the wait timed out.
+    """
+    deadline = time.monotonic() + settings.PASSWORD_HASHING_QUEUE_TIMEOUT
+    script = _acquire_script()
+    if script is not None:
+        token = uuid.uuid4().hex
+        interval = POLL_INTERVAL
+        try:
+            while not script(keys=[SLOTS_KEY], args=[settings.PASSWORD_HASHING_CONCURRENCY, SLOT_LEASE_MS, token]):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+        except Exception:
+            logger.exception('Hashing slots unavailable, limiting per process')
+        else:
+            return lambda: _release(script.registered_client, token)
+
+    if _local_slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        return _local_slots.release
+    return None
+
+
+def _release(client, token):
+    try:
+        client.zrem(SLOTS_KEY, token)
+    except Exception:
+        # The lease frees it
+        logger.exception('Could not free a hashing slot')
+
+
+def run_limited(func, *args):
+    """
+    Run `func(*args)` once one of the PASSWORD_HASHING_CONCURRENCY slots is free.
+
+    The hash runs on the calling thread: the hashers release the GIL, so
+    the worker's other threads keep serving, while the shared limit keeps a
+    burst of logins from taking every core of the deployment. Waiting holds
+    a request thread too, so no more than PASSWORD_HASHING_MAX_WAITING
+    callers of this process wait; the others are turned away at once.
+    Raises HashingUnavailable when rejected or no slot frees up in time.
+    """
+    with _stats_lock:
+        admitted = _stats['waiting'] < settings.PASSWORD_HASHING_MAX_WAITING
+        if admitted:
+            _stats['waiting'] += 1
+    release = None
+    if admitted:
+        try:
+            release = _acquire()
+        finally:
+            _record('waiting', -1)
+    if release is None:
+        _record('rejected')
+        raise HashingUnavailable()
+
+    _record('in_flight')
+    try:
+        return func(*args)
+    finally:
+        _record('in_flight', -1)
+        _record('completed')
+        release()
+
+
+def _verify(raw_password, encoded):
+    upgraded = []
+    valid = hashers.check_password(raw_password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+def hash_password(raw_password):
+    """`make_password` under the hashing limit"""
+    return run_limited(hashers.make_password, raw_password)
+
+
+def verify_user_password(user, raw_password):
+    """
+    `user.check_password` under the hashing limit.
+
+    Like check_password, a hash made with outdated parameters is replaced
+    (and saved) when the password is correct.
+    """
+    valid, upgraded = run_limited(_verify, raw_password, user.password)
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=['password'])
+    return valid
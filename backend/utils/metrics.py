@@ -0,0 +1,138 @@
+"""
+Prometheus metrics shared by the API.
+
+With several gunicorn workers, PROMETHEUS_MULTIPROC_DIR points to a
+directory emptied when the server starts (see gunicorn.conf.py): every
+process writes its samples to memory-mapped files there, and /metrics
+aggregates them.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    'fleetsecure_request_duration_seconds',
+    'Time to produce a response, by route',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    'fleetsecure_requests_total',
+    'Responses, by route and status code',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'fleetsecure_request_db_queries',
+    'SQL queries per request, by route (sampled requests only)',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+CACHE_REQUESTS = Counter(
+    'fleetsecure_response_cache_requests_total',
+    'Response cache lookups and 304 revalidations, by view and result',
+    ['view', 'result'],
+)
+THROTTLED_REQUESTS = Counter(
+    'fleetsecure_throttled_requests_total',
+    'Requests rejected by rate limiting, by scope',
+    ['scope'],
+)
+AUTH_FAILURES = Counter(
+    'fleetsecure_jwt_auth_failures_total',
+    'Rejected JWT authentications, by reason',
+    ['reason'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'fleetsecure_db_pool_connections',
+    'Database pool connections of live workers',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+PASSWORD_HASHING = Gauge(
+    'fleetsecure_password_hashing_jobs',
+    'Password hashes running or waiting for a hashing slot, in live workers',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+EVENT_SUBSCRIBERS = Gauge(
+    'fleetsecure_event_subscribers',
+    'Clients connected to the change feed, in live workers',
+    multiprocess_mode='livesum',
+)
+EVENT_OVERFLOWS = Counter(
+    'fleetsecure_event_overflows_total',
+    'Change feed clients disconnected for falling behind',
+)
+
+# Pool gauges are refreshed at most this often per process (seconds)
+GAUGE_REFRESH_INTERVAL = 5
+
+_gauges_refreshed = 0.0
+_gauges_lock = threading.Lock()
+
+
+def refresh_gauges():
+    """Update the pool gauges of this process, unless done recently"""
+    global _gauges_refreshed
+    now = time.monotonic()
+    if now - _gauges_refreshed < GAUGE_REFRESH_INTERVAL or not _gauges_lock.acquire(blocking=False):
+        return
+    try:
+        _gauges_refreshed = now
+        from utils.db import pool_stats
+        from utils.hashing import hashing_stats
+
+        stats = pool_stats()
+        if stats is not None:
+            size = stats.get('pool_size', 0)
+            available = stats.get('pool_available', 0)
+            DB_POOL_CONNECTIONS.labels('in_use').set(size - available)
+            DB_POOL_CONNECTIONS.labels('idle').set(available)
+            DB_POOL_CONNECTIONS.labels('waiting').set(stats.get('requests_waiting', 0))
+
+        stats = hashing_stats()
+        PASSWORD_HASHING.labels('in_flight').set(stats['in_flight'])
+        PASSWORD_HASHING.labels('waiting').set(stats['waiting'])
+    finally:
+        _gauges_lock.release()
+
+
+class RedisCacheCollector:
+    """Keyspace hits and misses reported by the Redis server behind the default cache"""
+
+    def collect(self):
+        if not settings.CACHES['default']['BACKEND'].startswith('django_redis.'):
+            return
+        from django_redis import get_redis_connection
+        try:
+            info = get_redis_connection('default').info('stats')
+        except Exception:
+            return
+        yield CounterMetricFamily(
+            'fleetsecure_redis_keyspace_hits', 'Successful key lookups on the cache server',
+            value=info.get('keyspace_hits', 0),
+        )
+        yield CounterMetricFamily(
+            'fleetsecure_redis_keyspace_misses', 'Failed key lookups on the cache server',
+            value=info.get('keyspace_misses', 0),
+        )
+
+
+_redis_registry = CollectorRegistry()
+_redis_registry.register(RedisCacheCollector())
+
+
+def render_metrics():
+    """Return the exposition of every metric, aggregated across workers"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_redis_registry)
@@ -0,0 +1,77 @@
+"""
+Cold start profiling: import the app in a fresh interpreter under
+`python -X importtime` and break the time down by package.
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Imports before the marker belong to the interpreter's own startup
+MARKER = '-- fleetsecure startup --'
+
+# Imports the app and its URLconf: everything the first request needs.
+# importlib.import_module() imports are not timed, hence __import__()
+CHILD = f"""
+import sys, time
+sys.stderr.write({MARKER!r} + '\\n')
+start = time.perf_counter()
+__import__(sys.argv[1])
+from django.conf import settings
+__import__(settings.ROOT_URLCONF)
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def profile_import(module, settings_module=None):
+    """
+    Import `module` (e.g. 'fleetsecure.wsgi') and the URLconf in a fresh
+    interpreter; return the wall time (ms) and one (name, self ms,
+    cumulative ms, importer) tuple per module imported.
+    """
+    env = dict(os.environ)
+    if settings_module:
+        env['DJANGO_SETTINGS_MODULE'] = settings_module
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, module],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    lines = result.stderr.split(MARKER, 1)[1].splitlines()
+    return float(result.stdout.split()[-1]), parse_importtime(lines)
+
+
+def parse_importtime(lines):
+    """Parse `-X importtime` output into (name, self ms, cumulative ms, importer) tuples"""
+    modules = []
+    importers = {}
+    # Children are printed before their importer, two spaces deeper
+    pending = defaultdict(list)
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        for child in pending.pop(depth + 1, []):
+            importers[child] = name
+        pending[depth].append(name)
+        modules.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return [(name, self_ms, cumulative_ms, importers.get(name)) for name, self_ms, cumulative_ms in modules]
+
+
+def by_package(modules):
+    """
+    Self time (ms) and module count per top-level package, slowest first,
+    with the module outside it that pulled in most of it.
+    """
+    packages = {}
+    entry_ms = defaultdict(float)
+    for name, self_ms, cumulative_ms, importer in modules:
+        package = name.partition('.')[0]
+        entry = packages.setdefault(package, {'package': package, 'ms': 0.0, 'modules': 0, 'imported_by': None})
+        entry['ms'] += self_ms
+        entry['modules'] += 1
+        if importer and importer.partition('.')[0] != package and cumulative_ms > entry_ms[package]:
+            entry['imported_by'] = importer
+            entry_ms[package] = cumulative_ms
+    return sorted(packages.values(), key=lambda entry: entry['ms'], reverse=True)
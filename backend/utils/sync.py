@@ -0,0 +1,150 @@
+"""
+Delta sync: the rows changed and deleted since a client's last sync.
+
+Rows and tombstones carry `sync_xid`, the id of the transaction that last
+wrote them, set by a database trigger. Each stream is read in
+`(sync_xid, id)` order, only up to the oldest transaction still running,
+behind its own position in an opaque token: a transaction that commits
+late is reported by the next sync instead of being passed over, and a
+sync costs one index range scan per table whatever the size of the fleet.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from fleetsecure.middleware import serializer_data
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Sync token is older than the deletion history, sync again without `since`.'
+    default_code = 'sync_token_expired'
+
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def encode_token(changed, deleted, synced_at):
+    """Encode the `(sync_xid, id)` positions of both streams and when deletions were last read"""
+    position = [*changed, *deleted, _micros(synced_at)]
+    return urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    """Return the `(changed, deleted, synced_at)` of a token, raising ValidationError if invalid"""
+    try:
+        position = json.loads(urlsafe_b64decode(token.encode('ascii')))
+        if not (isinstance(position, list) and len(position) == 5 and all(isinstance(v, int) for v in position)):
+            raise ValueError(token)
+        return (position[0], position[1]), (position[2], position[3]), _from_micros(position[4])
+    except (TypeError, ValueError, OverflowError):
+        raise ValidationError({'since': ['Invalid sync token.']})
+
+
+def _after(position):
+    xid, pk = position
+    # The redundant lower bound lets Postgres start the index scan at `xid`
+    return Q(sync_xid__gte=xid) & (Q(sync_xid__gt=xid) | Q(sync_xid=xid, id__gt=pk))
+
+
+def oldest_running_xid(using='default'):
+    """Return the id of the oldest transaction still running: every one before it has ended"""
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def read_changes(queryset, tombstones, since, page_size):
+    """
+    Return `(changed_rows, deleted_ids, next_token, has_more)`.
+
+    `queryset` must yield dicts with `id` and `sync_xid`, and `tombstones`
+    rows with `object_id` and `sync_xid`. Rows written by transactions
+    still running, or younger than the oldest one still running, are left
+    for a later sync.
+    """
+    now = timezone.now()
+    until = oldest_running_xid(queryset.db)
+    if since:
+        changed_position, deleted_position, synced_at = decode_token(since)
+        retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if synced_at < now - retention:
+            raise SyncTokenExpired()
+    else:
+        # A full sync has nothing to delete yet, only what goes away from now on
+        changed_position, deleted_position, synced_at = (0, 0), (until, 0), now
+
+    changed = list(
+        queryset.filter(_after(changed_position), sync_xid__lt=until)
+        .order_by('sync_xid', 'id')[:page_size + 1]
+    )
+    deleted = list(
+        tombstones.filter(_after(deleted_position), sync_xid__lt=until)
+        .order_by('sync_xid', 'id')
+        .values('id', 'object_id', 'sync_xid')[:page_size + 1]
+    )
+    deleted_truncated = len(deleted) > page_size
+    has_more = len(changed) > page_size or deleted_truncated
+    changed, deleted = changed[:page_size], deleted[:page_size]
+
+    if changed:
+        changed_position = (changed[-1]['sync_xid'], changed[-1]['id'])
+    if deleted:
+        deleted_position = (deleted[-1]['sync_xid'], deleted[-1]['id'])
+    if not deleted_truncated:
+        # Every deletion up to `until` was returned: the token only expires
+        # once the tombstones pruned since then could have been missed
+        deleted_position = max(deleted_position, (until, 0))
+        synced_at = now
+    next_token = encode_token(changed_position, deleted_position, synced_at)
+    return changed, [row['object_id'] for row in deleted], next_token, has_more
+
+
+class DeltaSyncMixin:
+    """
+    Add a `changes` action to a viewset: `GET changes/?since=<token>`.
+
+    The viewset defines `tombstone_model` and returns `.values()` rows,
+    including `sync_xid`, from `get_queryset()` for this action. The
+    response lists the serialized rows inserted or updated and the ids
+    deleted since `since` (everything on the first call), plus the token
+    for the next call. Clients repeat while `has_more` is true.
+    """
+    tombstone_model = None
+
+    @action(detail=False)
+    def changes(self, request):
+        page_size = settings.SYNC_PAGE_SIZE
+        if 'page_size' in request.query_params:
+            try:
+                page_size = int(request.query_params['page_size'])
+            except ValueError:
+                raise ValidationError({'page_size': ['A valid integer is required.']})
+        page_size = min(max(page_size, 1), settings.API_MAX_PAGE_SIZE)
+
+        changed, deleted, next_token, has_more = read_changes(
+            self.get_queryset(), self.tombstone_model.objects.all(),
+            request.query_params.get('since'), page_size,
+        )
+        serializer = self.get_serializer(changed, many=True)
+        return Response({
+            'changed': serializer_data(serializer),
+            'deleted': deleted,
+            'next': next_token,
+            'has_more': has_more,
+        })